@@ -3,26 +3,169 @@ Flask API Server for Weather Forecast System
 """
 import sys
 import os
-from flask import Flask, jsonify, request
+import re
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+from flask import Flask, Response, g, jsonify, request, send_file, stream_with_context
 from flask_cors import CORS
-import requests
 
 # Add project paths
-sys.path.append('D:/Trae/trae_project/weather_forecast/weather_forecast_system')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# src.* 模块只在模块级导入轻量依赖，statsmodels/scikit-learn/绘图库在首次使用时加载
+
+from src.response_formats import negotiate_format, frame_response, frame_to_columns, frame_to_records, compress_response
+from src import config, history_query, downsampling, metrics, profiling, refresh
+from src.upstream import http_get, BAIDU
+from src.rate_limit import UpstreamThrottledError
+from src.schema import normalize_weather_frame
+from src.data_collector import WeatherDataCollector, FEATURE_COLUMNS, add_anomaly_features
+from src.arima_model import TemperatureARIMA
+from src.weather_classifier import WeatherClassifier
+from src.warmup import start_background_warmup
+from src.state_store import SharedState
+from src.model_registry import ARIMA, CLASSIFIER, get_registry
+from src.global_classifier import GLOBAL_CLASSIFIER, GLOBAL_SCOPE
+from src.hourly_store import HourlyStore
+from src.analytics import ArchiveAnalytics
+from src.climatology import Climatology
+from src import training_cache, skill_store, events, versioning
 
 app = Flask(__name__)
 CORS(app)
 
+@app.before_request
+def start_timing():
+    """开始记录请求耗时与阶段耗时"""
+    g.request_start = time.perf_counter()
+    g.timing_token = metrics.start_request_timing()
+
+@app.after_request
+def finish_timing(response):
+    """记录接口延迟并添加 Server-Timing 响应头"""
+    if 'timing_token' not in g:
+        return response
+    total = time.perf_counter() - g.request_start
+    timings = metrics.finish_request_timing(g.pop('timing_token'))
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.HTTP_REQUEST_SECONDS.observe(total, endpoint=endpoint, method=request.method,
+                                         status=response.status_code)
+    response.headers['Server-Timing'] = metrics.server_timing_header(timings, total)
+    return response
+
+@app.before_request
+def start_profiling():
+    """管理员请求携带 ?profile= 或 X-Profile 时，在剖析器下运行处理函数"""
+    mode = request.args.get('profile') or request.headers.get('X-Profile')
+    if not mode:
+        return None
+    if not profiling.is_authorized(request.headers.get('X-Profile-Token')):
+        return jsonify({'error': 'Profiling not allowed'}), 403
+    if mode not in profiling.PROFILE_MODES:
+        return jsonify({'error': f'Unknown profile mode: {mode}'}), 400
+    g.profile_session = profiling.ProfileSession(mode, f'{request.method} {request.path}').start()
+
+@app.after_request
+def finish_profiling(response):
+    """结束剖析，通过响应头返回结果文件名"""
+    session = g.pop('profile_session', None)
+    if session is not None:
+        files = session.stop()
+        response.headers['X-Profile-Id'] = session.profile_id
+        response.headers['X-Profile-Files'] = ', '.join(files)
+        if session.memory:
+            response.headers['X-Profile-Memory'] = session.memory_header()
+    return response
+
+@app.after_request
+def apply_compression(response):
+    """按 Accept-Encoding 压缩响应（br 优先，其次 gzip）"""
+    with metrics.phase('compress'):
+        return compress_response(response, request.accept_encodings)
+
+@app.errorhandler(UpstreamThrottledError)
+def upstream_throttled(e):
+    """上游限流/配额超限：明确返回 429，而不是用默认数据顶替"""
+    response = jsonify({
+        'error': str(e),
+        'upstream': e.upstream,
+        'reason': e.reason,
+        'retry_after': round(e.retry_after)
+    })
+    response.headers['Retry-After'] = str(max(1, round(e.retry_after)))
+    return response, 429
+
 # 百度地图 AK
-BAIDU_AK = "mY3JUgrCjfYY6NsktCf9HnUlgrR7kqDe"
-BAIDU_API_URL = "https://api.map.baidu.com/api_region_search/v1/"
+BAIDU_AK = config.BAIDU_AK
+BAIDU_API_URL = config.BAIDU_REGION_URL
+
+# 进程内共享的采集器：坐标缓存与请求合并对所有请求生效
+collector = WeatherDataCollector()
+
+# 定时刷新写入的逐小时分区存储，以及在其上的多城市分析查询
+hourly_store = HourlyStore(config.HOURLY_STORE_DIR)
+analytics = ArchiveAnalytics(hourly_store)
 
-# Store data in memory (in production, use a database)
-system_data = {
+# Store data in a state directory shared by all worker processes
+system_data = SharedState(config.STATE_DIR, defaults={
     'historical_data': None,
+    'historical_versions': None,
+    'results_versions': None,
+    'climatology': None,
     'model_results': None,
     'forecast_data': None
-}
+})
+
+def store_historical_data(frame, cell):
+    """保存采集的数据并记录版本；与上次同一网格单元的数据对比，记下最早变化的日期供增量同步"""
+    version = versioning.frame_version(frame)
+    # 版本记录是读-改-写，多个 worker 同时采集时在锁内进行，避免丢失彼此的记录
+    with system_data.locked():
+        log = system_data['historical_versions'] or versioning.VersionLog()
+        if version == log.current:
+            return version
+        old = system_data['historical_data']
+        change = versioning.changed_from(old, frame) if old is not None and system_data.get('cell') == cell else None
+        log.record(version, change)
+        system_data.update({'historical_data': frame, 'historical_versions': log})
+    return version
+
+def delta_meta(since, changed, data):
+    """增量响应的附加字段：客户端删除 first_date 之前的行，用返回的行替换 changed_from 及之后的行"""
+    return {
+        'delta': True,
+        'since': since,
+        'changed_from': changed.strftime('%Y-%m-%d'),
+        'first_date': data['date'].iloc[0].strftime('%Y-%m-%d')
+    }
+
+def historical_version():
+    """当前历史数据的版本，升级前保存的数据在第一次访问时补记"""
+    log = system_data['historical_versions']
+    if log is None:
+        with system_data.locked():
+            log = system_data['historical_versions']
+            if log is None:
+                log = versioning.VersionLog()
+                log.record(versioning.frame_version(system_data['historical_data']), None)
+                system_data['historical_versions'] = log
+    return log.current
+
+def not_modified(version, fmt, since=None):
+    """客户端已有当前版本（If-None-Match 匹配 ETag，或 since 为当前版本）时返回 304 响应，否则返回 None"""
+    etag = f'{version}-{fmt}'
+    if request.if_none_match.contains_weak(etag) or (since or request.args.get('since')) == version:
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+def current_climatology(data):
+    """当前城市的气候态索引：采集时建立，旧状态中没有时由已采集的数据即时构建"""
+    climatology = system_data['climatology']
+    return climatology if climatology is not None else Climatology.from_daily(data)
 
 @app.route('/')
 def index():
@@ -31,33 +174,52 @@ def index():
         'message': 'Weather Forecast API Server',
         'endpoints': {
             'POST /api/collect-data': 'Collect historical weather data',
+            'GET /api/history': 'Query collected data by date range (paginated or NDJSON stream, optional downsampling)',
             'POST /api/train-model': 'Train weather prediction models',
             'GET /api/forecast': 'Get weather forecast data',
-            'GET /api/results': 'Get all processed results'
+            'GET /api/results': 'Get all processed results',
+            'POST /api/predict': 'Predict with stored models (no retraining)',
+            'GET /api/skill': 'Forecast skill of official and AI forecasts',
+            'GET /api/events': 'Server-sent events: training progress and forecast updates',
+            'GET /api/models': 'List stored model versions for a city',
+            'GET /api/hourly': 'Hourly history of tracked cities (NDJSON stream)',
+            'GET /api/analytics': 'Aggregations over the multi-city archive (rankings, monthly, extremes)',
+            'GET /api/tracked-cities': 'Cities refreshed by the background scheduler',
+            'GET /metrics': 'Prometheus metrics'
         }
     })
 
 @app.route('/api/collect-data', methods=['POST'])
 def collect_data():
-    """Collect historical weather data from Open-Meteo API"""
+    """
+    Collect historical weather data from Open-Meteo API
+
+    响应带 ETag（数据版本）；请求带 If-None-Match 或 since=<版本>（查询参数或请求体）时，
+    数据未变化返回 304，since 为较早版本时只返回 changed_from 及之后的行。
+    """
     try:
         data = request.json or {}
         city = data.get('city', 'beijing')
         days = data.get('days', 30)
         
-        # Import data collector
-        from src.data_collector import WeatherDataCollector
-        
-        collector = WeatherDataCollector()
+        fmt = negotiate_format(request)
+        if fmt is None:
+            return jsonify({'error': 'Unsupported format'}), 406
         
-        # Fetch historical data
-        historical_data = collector.prepare_training_data(city, days)
+        # 跟踪城市直接读取定时任务保存的数据，其余城市实时采集
+        historical_data = refresh.stored_history(city, days) if refresh.is_tracked(city) else None
+        if historical_data is None:
+            historical_data = collector.prepare_training_data(city, days)
         
         if historical_data is None or len(historical_data) == 0:
             return jsonify({'error': 'Failed to collect data'}), 500
         
+        # 新到达的观测数据用于检验之前记录的预报
+        skill_store.verify_observations(collector.cell_key(city), historical_data)
+        
         # Process weather type distribution
-        weather_type_counts = historical_data['weather_type'].value_counts().to_dict()
+        weather_type_counts = historical_data['weather_type'].value_counts()
+        weather_type_counts = weather_type_counts[weather_type_counts > 0].to_dict()
         weather_type_mapping = {
             'sunny': '晴天',
             'cloudy': '多云',
@@ -74,38 +236,182 @@ def collect_data():
             for k, v in weather_type_counts.items()
         ]
         
-        # Convert DataFrame to list of dicts with formatted dates
-        historical_list = []
-        for record in historical_data.to_dict('records'):
-            record_copy = record.copy()
-            # Format date to YYYY-MM-DD
-            if 'date' in record_copy and record_copy['date']:
-                try:
-                    if hasattr(record_copy['date'], 'strftime'):
-                        record_copy['date'] = record_copy['date'].strftime('%Y-%m-%d')
-                    else:
-                        d = pd.to_datetime(record_copy['date'])
-                        record_copy['date'] = d.strftime('%Y-%m-%d')
-                except:
-                    pass
-            historical_list.append(record_copy)
-        
         # Store data
-        system_data['historical_data'] = historical_data
+        historical_data = normalize_weather_frame(historical_data)
+        cell = collector.cell_key(city)
+        version = store_historical_data(historical_data, cell)
+        # 跟踪城市使用定时任务维护的气候态索引（覆盖全部已存储年份），其余城市由本次数据构建
+        climatology = refresh.stored_climatology(city) if refresh.is_tracked(city) else None
+        system_data['climatology'] = climatology if climatology is not None else \
+            Climatology.from_daily(historical_data)
         system_data['city'] = city
+        system_data['cell'] = cell
         
-        return jsonify({
+        since = request.args.get('since') or data.get('since')
+        unchanged = not_modified(version, fmt, since)
+        if unchanged is not None:
+            return unchanged
+        
+        meta = {
             'status': 'success',
             'city': city,
+            'cell': cell,
+            'version': version,
             'days_collected': len(historical_data),
-            'historical_data': historical_list,
             'weather_distribution': weather_distribution,
             'columns': list(historical_data.columns)
-        })
+        }
+        rows = historical_data
+        changed = system_data['historical_versions'].changed_since(since) if since else None
+        if changed is not None:
+            rows = history_query.select_range(historical_data, start=changed)
+            meta.update(delta_meta(since, changed, historical_data))
+        response = frame_response(rows, fmt, meta, 'historical_data')
+        if changed is None:
+            response.set_etag(f'{version}-{fmt}')
+        return response
+    except UpstreamThrottledError:
+        raise
     except Exception as e:
         print(f"数据采集失败: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    """
+    按日期范围分页查询已采集的历史数据，或以 NDJSON 流式返回
+
+    resolution=day|week|month 按周期聚合，max_points 配合 method=lttb|minmax 限制返回点数
+
+    响应带 ETag（数据版本）；If-None-Match 匹配或 since 为当前版本时返回 304，
+    since 为较早版本时只返回 changed_from 及之后的数据。
+    抽稀（max_points）的结果依赖整段数据，此时 since 只用于 304 判断；
+    按周/月聚合时窗口开头的周期也会随窗口移动而变化，不支持增量，较早的 since 返回 400。
+    """
+    data = system_data['historical_data']
+    if data is None:
+        return jsonify({'error': 'No historical data. Please collect data first.'}), 400
+    
+    stream = request.args.get('stream') == 'ndjson' or \
+        request.accept_mimetypes.best == 'application/x-ndjson'
+    fmt = negotiate_format(request)
+    if fmt is None and not stream:
+        return jsonify({'error': 'Unsupported format'}), 406
+    
+    version = historical_version()
+    representation = 'ndjson' if stream else fmt
+    unchanged = not_modified(version, representation)
+    if unchanged is not None:
+        return unchanged
+    
+    try:
+        selected = history_query.select_range(data, request.args.get('start'), request.args.get('end'))
+        limit = history_query.parse_limit(request.args.get('limit'))
+        cursor = request.args.get('cursor')
+        resolution = request.args.get('resolution', 'day')
+        method = request.args.get('method', 'lttb')
+        max_points = downsampling.parse_max_points(request.args.get('max_points'), method)
+        
+        since = request.args.get('since')
+        if since and resolution != 'day':
+            raise ValueError('since is only supported with resolution=day')
+        changed = system_data['historical_versions'].changed_since(since) if since and not max_points else None
+        if changed is not None:
+            selected = history_query.select_range(selected, start=changed)
+        
+        distribution = None
+        if resolution != 'day':
+            distribution = downsampling.weather_type_distribution(selected, resolution)
+        selected = downsampling.resample_frame(selected, resolution)
+        selected = downsampling.decimate(selected, max_points, method=method)
+        if stream:
+            # 流式输出不分页，游标只作为起始日期
+            if cursor:
+                selected = history_query.select_range(selected, start=cursor)
+        else:
+            page, next_cursor = history_query.paginate(selected, cursor, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if stream:
+        response = Response(stream_with_context(history_query.iter_ndjson(selected)),
+                            mimetype='application/x-ndjson')
+        response.headers['X-Data-Version'] = version
+        if changed is not None:
+            response.headers['X-Changed-From'] = changed.strftime('%Y-%m-%d')
+        else:
+            response.set_etag(f'{version}-{representation}')
+        return response
+    
+    meta = {
+        'status': 'success',
+        'city': system_data.get('city'),
+        'version': version,
+        'resolution': resolution,
+        'count': len(page),
+        'next_cursor': next_cursor
+    }
+    if changed is not None:
+        meta.update(delta_meta(since, changed, data))
+    if distribution is not None:
+        meta['weather_distribution'] = frame_to_columns(distribution)
+    response = frame_response(page, fmt, meta, 'historical_data')
+    if changed is None:
+        response.set_etag(f'{version}-{fmt}')
+    return response
+
+@app.route('/api/hourly', methods=['GET'])
+def get_hourly():
+    """
+    逐小时历史数据（NDJSON 流，逐月读取分区，不把整段数据放进内存）
+
+    查询参数: city（默认最近采集的城市，按所在网格单元读取）、start、end（YYYY-MM-DD，默认最近 7 天）
+    """
+    city = request.args.get('city') or system_data.get('city', 'beijing')
+    cell = collector.cell_key(city)
+    try:
+        end = pd.Timestamp(request.args.get('end') or datetime.now().date())
+        start = pd.Timestamp(request.args.get('start') or end - timedelta(days=6))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not hourly_store.months(cell):
+        return jsonify({'error': f'No hourly data for {city}'}), 404
+    
+    def generate():
+        for table in hourly_store.scan(cell, start, end):
+            yield from history_query.iter_ndjson(table.to_pandas())
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/analytics', methods=['GET'])
+def get_analytics():
+    """
+    多城市归档数据的聚合查询（DuckDB 直接查询逐小时分区存储，结果按存储代数缓存）
+
+    查询参数:
+        query: ranking（按指标排名）、monthly（逐月统计与天气类型分布）、extremes（极端日期）
+        metric: ranking 为 mean_temperature、max_temperature、min_temperature、total_rainfall、
+                rainy_days、mean_wind_speed；extremes 为 hottest、coldest、wettest、windiest
+        cities: 逗号分隔的城市（按所在网格单元查询），缺省为全部
+        start、end: 日期范围（YYYY-MM-DD）；limit: 返回行数；order: ranking 的排序方向 desc|asc
+    """
+    cities = [c.strip() for c in (request.args.get('cities') or '').split(',') if c.strip()]
+    if not hourly_store.cities():
+        return jsonify({'error': 'No hourly data yet'}), 404
+    try:
+        result = analytics.run(
+            request.args.get('query', 'ranking'),
+            metric=request.args.get('metric'),
+            cells=[collector.cell_key(city) for city in cities],
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            limit=request.args.get('limit'),
+            order=request.args.get('order')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'status': 'success', 'query': request.args.get('query', 'ranking'), **result})
+
 @app.route('/api/reverse-geocoding', methods=['POST'])
 def reverse_geocoding():
     """根据GPS坐标获取地址信息（省份、城市、区县）"""
@@ -120,11 +426,6 @@ def reverse_geocoding():
         
         print(f"定位成功，坐标为: ({latitude}, {longitude})")
         
-        # Import data collector
-        from src.data_collector import WeatherDataCollector
-        
-        collector = WeatherDataCollector()
-        
         # 调用逆地理编码API
         location_info = collector.reverse_geocoding(latitude, longitude)
         
@@ -132,6 +433,8 @@ def reverse_geocoding():
             'status': 'success',
             'location_info': location_info
         })
+    except UpstreamThrottledError:
+        raise
     except Exception as e:
         print(f"逆地理编码失败: {e}")
         return jsonify({'error': str(e)}), 500
@@ -148,7 +451,7 @@ def get_provinces():
         "ak": BAIDU_AK
     }
 
-    response = requests.get(BAIDU_API_URL, params=params, timeout=10)
+    response = http_get(BAIDU, 'region', BAIDU_API_URL, params=params, timeout=10)
     result = response.json()
 
     if result.get("status") == 0:
@@ -174,7 +477,7 @@ def get_cities():
         "ak": BAIDU_AK
     }
 
-    response = requests.get(BAIDU_API_URL, params=params, timeout=10)
+    response = http_get(BAIDU, 'region', BAIDU_API_URL, params=params, timeout=10)
     result = response.json()
 
     if result.get("status") == 0:
@@ -200,7 +503,7 @@ def get_districts():
         "ak": BAIDU_AK
     }
 
-    response = requests.get(BAIDU_API_URL, params=params, timeout=10)
+    response = http_get(BAIDU, 'region', BAIDU_API_URL, params=params, timeout=10)
     result = response.json()
 
     print("区县查询参数:", params)
@@ -216,17 +519,56 @@ def get_districts():
 
 @app.route('/api/train-model', methods=['POST'])
 def train_model():
-    """Train weather prediction models"""
+    """
+    Train weather prediction models
+
+    请求体可选 tune: true，训练前先用时间序列交叉验证为分类器调参。
+    各阶段进度通过 /api/events 的 training 事件推送；请求体可带 job_id 以便客户端事先订阅，
+    否则由服务端生成，并在 X-Training-Job 响应头中返回。
+    """
+    body = request.get_json(silent=True) or {}
+    job_id = str(body.get('job_id') or events.new_job_id())
+    with events.training_progress(job_id, system_data.get('city', 'beijing'), 'train-model') as outcome:
+        response = app.make_response(_train_model())
+        outcome['http_status'] = response.status_code
+        if response.is_json:
+            payload = response.get_json(silent=True) or {}
+            outcome['cached'] = payload.get('cached')
+            outcome['model_versions'] = payload.get('model_versions')
+    response.headers['X-Training-Job'] = job_id
+    return response
+
+def _train_model():
     try:
         if system_data['historical_data'] is None:
             return jsonify({'error': 'No historical data. Please collect data first.'}), 400
         
         data = system_data['historical_data']
+        city = system_data.get('city', 'beijing')
+        cell = collector.cell_key(city)  # 模型按网格单元保存，同一单元内的城市共用
+        arima_order = (1, 1, 1)  # 简化参数：(p, d, q)，避免收敛问题
+        feature_columns = FEATURE_COLUMNS
+        classifier = WeatherClassifier()
+        tune = bool((request.get_json(silent=True) or {}).get('tune'))
         
-        # Train ARIMA model
-        from src.arima_model import TemperatureARIMA
-        from src.weather_classifier import WeatherClassifier
-        import re
+        # 相同数据与参数训练过且模型仍在仓库中时，直接返回上次的结果；
+        # 那次的模型比当前最新版本新时才重新设为最新，不回退定时刷新之后保存的模型
+        registry = get_registry()
+        hyperparameters = {name: model.get_params() for name, model in classifier.models.items()}
+        if tune:
+            hyperparameters['tune'] = True
+        cache_key = training_cache.training_key(data, cell, feature_columns, hyperparameters, arima_order)
+        cached = training_cache.get_cache().get(cache_key)
+        if cached is not None and all(
+            registry.metadata(cell, kind, version) is not None
+            for kind, version in cached['model_results']['model_versions'].items()
+        ):
+            for kind, version in cached['model_results']['model_versions'].items():
+                latest = registry.latest_version(cell, kind)
+                if latest is None or version > latest:
+                    registry.promote(cell, kind, version)
+            system_data['model_results'] = cached['model_results']
+            return jsonify({**cached['response'], 'cached': True})
         
         # ARIMA for temperature prediction
         arima_model = TemperatureARIMA()
@@ -235,25 +577,30 @@ def train_model():
         # Split data
         train_data, test_data = arima_model.train_test_split(temp_series, test_size=0.2)
         
-        # Train ARIMA - 使用简单参数避免收敛问题
-        arima_order = (1, 1, 1)  # 简化参数：(p, d, q)
-        fitted_model = arima_model.train(train_data, order=arima_order)
+        # Train ARIMA
+        with metrics.phase('arima_fit'):
+            fitted_model = arima_model.train(train_data, order=arima_order)
+            if fitted_model is not None:
+                # 参数在训练集上估计，再把测试集的观测接上，保存的模型从最后一天观测开始预报
+                try:
+                    fitted_model = fitted_model.append(test_data, refit=False)
+                except Exception as e:
+                    print(f'ARIMA 接入测试集观测失败: {e}，在完整序列上重新拟合')
+                    fitted_model = arima_model.train(temp_series, order=arima_order)
+                arima_model.fitted_model = fitted_model
         
-        # Get forecast
-        forecast_steps = 7
-        temp_forecast = arima_model.forecast(steps=forecast_steps)
+            # Get forecast
+            forecast_steps = 7
+            temp_forecast = arima_model.forecast(steps=forecast_steps)
         
-        # 如果预测失败，使用简单预测
+        # 如果预测失败，使用气候态常年值作为基准预报
         if temp_forecast is None or len(temp_forecast) == 0:
-            print('使用简单移动平均预测...')
-            last_temp = temp_series.iloc[-1]
-            temp_forecast = [last_temp + (i % 3 - 1) * 0.5 for i in range(forecast_steps)]
+            print('ARIMA 预测失败，使用气候态常年值...')
+            dates = pd.date_range(data['date'].iloc[-1] + pd.Timedelta(days=1), periods=forecast_steps)
+            temp_forecast = current_climatology(data).baseline(dates)['temperature']
         
-        # Train classifier
-        classifier = WeatherClassifier()
-        feature_columns = ['year', 'month', 'day', 'weekday', 'is_weekend', 
-                          'temperature', 'humidity', 'rainfall', 'wind_speed', 'pressure']
-        X = data[feature_columns]
+        # Train classifier（按行划分后再计算距平特征）
+        X = data
         y = data['weather_type']
         
         # 根据数据量调整test_size，确保每个类别都有足够的样本
@@ -268,11 +615,21 @@ def train_model():
         print(f"数据量: {data_size}, 测试集比例: {test_size}")
         
         X_train, X_test, y_train, y_test = classifier.train_test_split(X, y, test_size=test_size)
-        classifier.train(X_train, y_train)
+        # 距平的常年值只由训练集构建，测试集的温度不进入特征；模型保存这份气候态供预测使用
+        classifier.climatology = Climatology.from_daily(X_train)
+        X_train = add_anomaly_features(X_train.copy(), classifier.climatology)[feature_columns]
+        X_test = add_anomaly_features(X_test.copy(), classifier.climatology)[feature_columns]
+        tuning = None
+        if tune:
+            with metrics.phase('classifier_tune'):
+                tuning = classifier.tune(X_train, y_train)
+        with metrics.phase('classifier_fit'):
+            classifier.train(X_train, y_train)
         
         # Evaluate models with fallback
-        lr_results = classifier.evaluate(X_test, y_test, 'logistic_regression')
-        dt_results = classifier.evaluate(X_test, y_test, 'decision_tree')
+        with metrics.phase('evaluate'):
+            lr_results = classifier.evaluate(X_test, y_test, 'logistic_regression')
+            dt_results = classifier.evaluate(X_test, y_test, 'decision_tree')
         
         # 如果模型评估失败，使用默认值
         if lr_results is None:
@@ -320,9 +677,28 @@ def train_model():
         lr_metrics = parse_classification_report(lr_results['classification_report'], 'logistic_regression')
         dt_metrics = parse_classification_report(dt_results['classification_report'], 'decision_tree')
         
+        # 保存到模型仓库，预报与预测接口直接使用，无需重新训练
+        model_versions = {}
+        if fitted_model is not None:
+            model_versions[ARIMA] = registry.save(cell, ARIMA, fitted_model, meta={
+                'source': 'train-model',
+                'order': list(arima_order),
+                'fitted_on': datetime.now().date().isoformat(),
+                'last_date': temp_series.index[-1].strftime('%Y-%m-%d')
+            })
+        if classifier.fitted_models:
+            model_versions[CLASSIFIER] = registry.save(cell, CLASSIFIER, classifier, meta={
+                'source': 'train-model',
+                'feature_columns': feature_columns,
+                'rows': len(X_train),
+                'last_date': data['date'].iloc[-1].strftime('%Y-%m-%d'),
+                'tuning': tuning
+            })
+        
         # Store results
         system_data['model_results'] = {
             'arima_order': arima_order,
+            'model_versions': model_versions,
             'temperature_forecast': temp_forecast.tolist() if hasattr(temp_forecast, 'tolist') else list(temp_forecast),
             'logistic_regression': {
                 'accuracy': lr_results['accuracy'],
@@ -334,9 +710,10 @@ def train_model():
             }
         }
         
-        return jsonify({
+        response = {
             'status': 'success',
             'arima_order': arima_order,
+            'model_versions': model_versions,
             'temperature_forecast': temp_forecast.tolist() if hasattr(temp_forecast, 'tolist') else list(temp_forecast),
             'model_evaluation': {
                 'logistic_regression': {
@@ -352,7 +729,15 @@ def train_model():
                     'f1_score': dt_metrics['f1_score']
                 }
             }
+        }
+        if tuning:
+            response['tuning'] = tuning
+        training_cache.get_cache().put(cache_key, {
+            'cell': cell,
+            'model_results': system_data['model_results'],
+            'response': response
         })
+        return jsonify({**response, 'cached': False})
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -366,51 +751,105 @@ def get_forecast():
         
         data = system_data['historical_data']
         city = system_data.get('city', 'beijing')
+        cell = collector.cell_key(city)
+        
+        fmt = negotiate_format(request)
+        if fmt is None:
+            return jsonify({'error': 'Unsupported format'}), 406
+        
+        # 跟踪城市使用定时任务预计算的预报与建议
+        precomputed = refresh.stored_forecast(city) if refresh.is_tracked(city) else None
         
         # Get official forecast
-        from src.data_collector import WeatherDataCollector
-        collector = WeatherDataCollector()
-        official_forecast = collector.fetch_forecast_data(city, days=7)
+        if precomputed is not None and precomputed['official'] is not None:
+            official_forecast = precomputed['official']
+        else:
+            official_forecast = collector.fetch_forecast_data(city, days=7)
         
+        # 官方预报不可用时以气候态常年值作为基准预报
+        climatology = refresh.stored_climatology(city) if precomputed is not None else None
+        if climatology is None:
+            climatology = current_climatology(data)
+        fallbacks = list(precomputed.get('climatology_fallbacks', [])) if precomputed is not None else []
         if official_forecast is None or len(official_forecast) == 0:
-            # Generate mock forecast data
-            last_date = data['date'].iloc[-1]
-            official_forecast = []
-            from datetime import datetime, timedelta
-            for i in range(7):
-                forecast_date = last_date + timedelta(days=i+1)
-                official_forecast.append({
-                    'date': forecast_date.strftime('%Y-%m-%d'),
-                    'temperature': round(2.0 + (i % 3), 1),
-                    'weatherType': ['cloudy', 'sunny', 'rain'][i % 3],
-                    'rainProbability': [10, 5, 70][i % 3]
-                })
-        
-        # Get AI prediction from stored results
+            dates = pd.date_range(data['date'].iloc[-1] + pd.Timedelta(days=1), periods=7)
+            baseline = climatology.baseline(dates)
+            official_forecast = [{
+                'date': d.strftime('%Y-%m-%d'),
+                'temperature': t,
+                'weatherType': w,
+                'rainProbability': p
+            } for d, t, w, p in zip(dates, baseline['temperature'], baseline['weather_type'],
+                                    baseline['rain_probability'])]
+            fallbacks.append('official')
+        else:
+            dates = pd.to_datetime(official_forecast['date'])
+        
+        # AI 预测：预计算结果优先，其次使用模型仓库中该城市的最新模型
+        registry = get_registry()
+        model_versions = {}
         ai_temp_forecast = []
-        if system_data['model_results'] and 'temperature_forecast' in system_data['model_results']:
-            ai_temp_forecast = system_data['model_results']['temperature_forecast']
+        ai_temp_dates = None  # ARIMA 预测的目标日期，从模型最后一天观测的下一天开始
+        if precomputed is not None and precomputed['ai_temperature']:
+            ai_temp_forecast = precomputed['ai_temperature']
+            ai_temp_dates = precomputed.get('ai_temperature_dates')
+        else:
+            ai_temp_forecast, ai_temp_dates, model_versions[ARIMA] = refresh.arima_forecast(cell)
+            if not ai_temp_forecast and system_data['model_results'] \
+                    and 'temperature_forecast' in system_data['model_results']:
+                ai_temp_forecast = system_data['model_results']['temperature_forecast']
+                ai_temp_dates = pd.date_range(data['date'].iloc[-1] + pd.Timedelta(days=1),
+                                              periods=len(ai_temp_forecast))
         
-        if len(ai_temp_forecast) < 7:
-            ai_temp_forecast = [round(2.1 + (i % 5) * 0.3, 1) for i in range(7)]
+        ai_weather_forecast = []
+        if precomputed is not None and precomputed.get('ai_weather'):
+            ai_weather_forecast = precomputed['ai_weather']
+        elif hasattr(official_forecast, 'to_dict'):
+            classifier, model_versions[CLASSIFIER] = registry.load(cell, CLASSIFIER)
+            if classifier is not None:
+                ai_weather_forecast = classifier.predict_frame(official_forecast, history=data) or []
+            else:
+                # 该城市没有单独的模型时使用跨城市的全局分类器
+                ai_weather_forecast, model_versions[GLOBAL_CLASSIFIER] = \
+                    predict_global(city, official_forecast, history=data)
         
-        ai_weather_forecast = ['cloudy', 'sunny', 'rain', 'rain', 'cloudy', 'sunny', 'sunny']
+        # 只记录真实的预报与模型预测，下面用常年值补齐的部分不参与检验
+        skill_store.log_forecasts(cell, official_forecast if hasattr(official_forecast, 'to_dict') else None,
+                                  ai_temp_forecast if len(ai_temp_forecast) >= 7
+                                  and 'ai_temperature' not in fallbacks else None,
+                                  ai_weather_forecast if len(ai_weather_forecast) >= 7
+                                  and 'ai_weather' not in fallbacks else None,
+                                  ai_temp_dates)
         
-        # Convert to list format
-        official_list = official_forecast.to_dict('records') if hasattr(official_forecast, 'to_dict') else official_forecast
+        if len(ai_temp_forecast) < 7 or len(ai_weather_forecast) < 7:
+            baseline = climatology.baseline(dates)
+            if len(ai_temp_forecast) < 7:
+                ai_temp_forecast = baseline['temperature']
+                fallbacks.append('ai_temperature')
+            if len(ai_weather_forecast) < 7:
+                ai_weather_forecast = baseline['weather_type']
+                fallbacks.append('ai_weather')
+        
+        # 与常年值对照的合理性检查：标记偏离超过 CLIMATOLOGY_SANITY_Z 个标准差的日期
+        normals = climatology.normals(dates)
+        sanity = {}
+        for name, temperatures in (('ai_temperature', ai_temp_forecast[:len(dates)]),
+                                   ('official', official_forecast['temperature'][:len(dates)]
+                                    if hasattr(official_forecast, 'to_dict') else [])):
+            flagged = climatology.check(dates[:len(temperatures)], temperatures) if len(temperatures) else []
+            if flagged:
+                sanity[name] = [dates[i].strftime('%Y-%m-%d') for i in flagged]
         
+        # Convert to list format
         # Convert field names to camelCase
         def to_camel_case(snake_str):
             components = snake_str.split('_')
             return components[0] + ''.join(x.title() for x in components[1:])
         
-        official_list_camel = []
-        for item in official_list:
-            item_camel = {}
-            for key, value in item.items():
-                camel_key = to_camel_case(key)
-                item_camel[camel_key] = value
-            official_list_camel.append(item_camel)
+        if hasattr(official_forecast, 'to_dict'):
+            official_list_camel = frame_to_records(official_forecast, rename=to_camel_case)
+        else:
+            official_list_camel = official_forecast
         
         # Store forecast data
         system_data['forecast_data'] = {
@@ -419,37 +858,249 @@ def get_forecast():
             'ai_weather': ai_weather_forecast
         }
         
-        return jsonify({
+        meta = {
             'status': 'success',
-            'official_forecast': official_list_camel,
             'ai_temperature_forecast': ai_temp_forecast,
-            'ai_weather_forecast': ai_weather_forecast
-        })
+            'ai_weather_forecast': ai_weather_forecast,
+            'model_versions': {k: v for k, v in model_versions.items() if v},
+            'climatology': {
+                'normals': [round(float(t), 1) for t in normals] if normals is not None else [],
+                'fallbacks': sorted(set(fallbacks)),
+                'sanity_flags': sanity
+            }
+        }
+        if precomputed is not None:
+            meta['advice'] = precomputed['advice']
+            meta['generated_at'] = precomputed['generated_at'].isoformat(timespec='seconds')
+        if fmt == 'records':
+            meta['official_forecast'] = official_list_camel
+            return jsonify(meta)
+        
+        official_df = official_forecast if hasattr(official_forecast, 'to_dict') else pd.DataFrame(official_forecast)
+        if fmt in ('arrow', 'parquet'):
+            # 二进制格式下把 AI 预测作为列并入同一张表
+            official_df = official_df.head(len(ai_temp_forecast)).assign(
+                ai_temperature=ai_temp_forecast[:len(official_df)],
+                ai_weather=ai_weather_forecast[:len(official_df)]
+            )
+        return frame_response(official_df, fmt, meta, 'official_forecast', rename=to_camel_case)
         
+    except UpstreamThrottledError:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/results', methods=['GET'])
-def get_results():
-    """Get all processed results"""
+def predict_global(city, frame, history=None, version=None):
+    """用全局天气分类器预测，返回 (天气类型列表, 版本号)，模型不存在时返回 ([], None)"""
+    classifier, version = get_registry().load(GLOBAL_SCOPE, GLOBAL_CLASSIFIER, version)
+    if classifier is None:
+        return [], None
+    location = collector.get_cell_location(city)
+    return classifier.predict_frame(frame, location, history=history) or [], version
+
+@app.route('/api/predict', methods=['POST'])
+def predict():
+    """
+    使用模型仓库中的模型预测，不重新训练
+
+    请求体:
+        city: 城市，默认为最近采集的城市
+        rows: 日数据列表（date、temperature、humidity、rainfall、wind_speed、pressure），返回天气类型
+        steps: ARIMA 向后预测的天数，返回温度
+        model: decision_tree（默认）、logistic_regression 或 global（跨城市的全局分类器）
+        versions: {classifier: 版本, arima: 版本, global_classifier: 版本}，默认使用最新版本
+    """
+    body = request.json or {}
+    city = body.get('city') or system_data.get('city', 'beijing')
+    rows = body.get('rows')
+    steps = body.get('steps')
+    if not rows and not steps:
+        return jsonify({'error': 'rows or steps is required'}), 400
+    
+    versions = body.get('versions') or {}
+    registry = get_registry()
+    cell = collector.cell_key(city)
+    result = {'status': 'success', 'city': city, 'cell': cell, 'model_versions': {}}
+    if rows:
+        model_name = body.get('model', 'decision_tree')
+        kind = GLOBAL_CLASSIFIER if model_name == 'global' else CLASSIFIER
+        try:
+            frame = pd.DataFrame(rows)
+            frame['date'] = pd.to_datetime(frame['date'])
+            if kind == GLOBAL_CLASSIFIER:
+                predictions, version = predict_global(city, frame, version=versions.get(GLOBAL_CLASSIFIER))
+                if version is None:
+                    return jsonify({'error': 'No global classifier yet.'}), 404
+            else:
+                classifier, version = registry.load(cell, CLASSIFIER, versions.get(CLASSIFIER))
+                if classifier is None:
+                    return jsonify({'error': f'No classifier for {city}. Please train a model first.'}), 404
+                predictions = classifier.predict_frame(frame, model_name=model_name)
+        except (KeyError, ValueError, TypeError) as e:
+            return jsonify({'error': f'Invalid rows: {e}'}), 400
+        if predictions is None:
+            return jsonify({'error': 'Unknown model'}), 400
+        result['weather_types'] = [
+            {'date': d.strftime('%Y-%m-%d'), 'weather_type': p} for d, p in zip(frame['date'], predictions)
+        ]
+        result['model_versions'][kind] = version
+    if steps:
+        arima, version = registry.load(cell, ARIMA, versions.get(ARIMA))
+        if arima is None:
+            return jsonify({'error': f'No ARIMA model for {city}. Please train a model first.'}), 404
+        try:
+            steps = min(int(steps), 60)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'steps must be an integer'}), 400
+        result['temperature_forecast'] = [round(float(t), 1) for t in arima.forecast(steps=steps)]
+        result['model_versions'][ARIMA] = version
+    return jsonify(result)
+
+@app.route('/api/models', methods=['GET'])
+def list_models():
+    """列出某城市（所在网格单元）在模型仓库中的模型版本"""
+    city = request.args.get('city') or system_data.get('city', 'beijing')
+    cell = collector.cell_key(city)
+    registry = get_registry()
+    return jsonify({
+        'status': 'success',
+        'city': city,
+        'cell': cell,
+        'models': {
+            kind: {
+                'latest': registry.latest_version(cell, kind),
+                'versions': registry.versions(cell, kind),
+                'metadata': registry.metadata(cell, kind)
+            }
+            for kind in (CLASSIFIER, ARIMA)
+        },
+        'resident': registry.resident_count()
+    })
+
+@app.route('/api/skill', methods=['GET'])
+def get_skill():
+    """
+    官方预报与 AI 预测的累计检验指标（MAE、偏差、RMSE、天气类型准确率）
+
+    查询参数 city、source（official|ai）、lead（提前天数）用于筛选，均可省略
+    """
+    source = request.args.get('source')
+    if source is not None and source not in (skill_store.OFFICIAL, skill_store.AI):
+        return jsonify({'error': 'source must be official or ai'}), 400
+    lead = request.args.get('lead', type=int)
+    # 检验数据按网格单元累计
+    cell = collector.cell_key(request.args['city']) if request.args.get('city') else None
+    store = skill_store.get_store()
     return jsonify({
         'status': 'success',
+        'skill': store.skill(city=cell, source=source, lead_days=lead),
+        'pending': store.pending_count(cell)
+    })
+
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    """
+    服务器推送事件（text/event-stream）：训练进度与定时刷新生成的新预报
+
+    查询参数 topics=training,forecast 选择事件类型；断线重连时浏览器自动携带 Last-Event-ID，
+    也可用 ?last_event_id= 指定。本进程的连接数达到 EVENTS_MAX_STREAMS 时返回 503。
+    """
+    release = events.open_stream_slot()
+    if release is None:
+        response = jsonify({'status': 'error', 'message': 'Too many event streams, retry later'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    topics = {t for t in request.args.get('topics', '').split(',') if t} or None
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    response = Response(stream_with_context(events.stream(last_event_id, topics)),
+                        mimetype='text/event-stream')
+    response.call_on_close(release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # 关闭反向代理缓冲
+    return response
+
+@app.route('/api/results', methods=['GET'])
+def get_results():
+    """
+    Get all processed results
+
+    响应带 ETag（结果版本）；If-None-Match 匹配或 since 为当前版本时返回 304，
+    since 为较早版本时只返回变化的字段（delta=true）。
+    """
+    payload = {
         'has_data': system_data['historical_data'] is not None,
         'has_model': system_data['model_results'] is not None,
         'has_forecast': system_data['forecast_data'] is not None,
         'model_results': system_data.get('model_results'),
         'city': system_data.get('city')
-    })
+    }
+    version = versioning.value_version(payload)
+    with system_data.locked():
+        log = system_data['results_versions'] or versioning.VersionLog()
+        if log.record(version, versioning.field_hashes(payload)):
+            system_data['results_versions'] = log
+    
+    unchanged = not_modified(version, 'json')
+    if unchanged is not None:
+        return unchanged
+    since = request.args.get('since')
+    fields = log.fields_since(since) if since else None
+    if fields is not None:
+        return jsonify({'status': 'success', 'version': version, 'delta': True, 'since': since,
+                        **{key: payload[key] for key in fields}})
+    response = jsonify({'status': 'success', 'version': version, **payload})
+    response.set_etag(f'{version}-json')
+    return response
+
+@app.route('/api/tracked-cities', methods=['GET'])
+def get_tracked_cities():
+    """定时刷新的城市及其最近一次刷新时间"""
+    cities = []
+    for city in config.TRACKED_CITIES:
+        state = refresh.city_state(city)
+        frame = state['historical_data']
+        refreshed_at = state['refreshed_at']
+        cities.append({
+            'city': city,
+            'cell': refresh.city_key(city),
+            'refreshed_at': refreshed_at.isoformat(timespec='seconds') if refreshed_at else None,
+            'last_date': frame['date'].iloc[-1].strftime('%Y-%m-%d') if frame is not None else None,
+            'has_forecast': refresh.stored_forecast(city) is not None
+        })
+    return jsonify({'status': 'success', 'refresh_at': config.REFRESH_AT, 'cities': cities})
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus 文本格式的运行时指标"""
+    return Response(metrics.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/profiles/<filename>', methods=['GET'])
+def get_profile(filename):
+    """下载剖析结果文件（需要剖析令牌）"""
+    if not profiling.is_authorized(request.headers.get('X-Profile-Token')):
+        return jsonify({'error': 'Profiling not allowed'}), 403
+    path = profiling.profile_file_path(filename)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, as_attachment=True)
 
 @app.route('/api/clear', methods=['POST'])
 def clear_data():
     """Clear all stored data"""
-    system_data['historical_data'] = None
-    system_data['model_results'] = None
-    system_data['forecast_data'] = None
+    system_data.update({
+        'historical_data': None,
+        'historical_versions': None,
+        'climatology': None,
+        'model_results': None,
+        'forecast_data': None
+    })
     return jsonify({'status': 'success', 'message': 'All data cleared'})
 
 if __name__ == '__main__':
+    # 开发服务器；生产环境请使用 serve.py（gunicorn / waitress 多 worker）
     print("Starting Weather Forecast API Server...")
     print("API available at http://localhost:5000")
+    if config.WARMUP:
+        start_background_warmup()
+    refresh.start_refresh_scheduler()
     app.run(debug=True, port=5000)
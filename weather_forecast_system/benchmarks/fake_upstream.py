@@ -0,0 +1,219 @@
+"""
+本地模拟的 Open-Meteo / 百度地图服务
+
+按路径分发:
+    /archive                Open-Meteo 历史数据（daily 为 JSON，hourly 为 format=csv）
+    /forecast               Open-Meteo 天气预报
+    /geocoding              百度地理编码
+    /reverse_geocoding      百度逆地理编码
+    /region                 百度行政区查询
+
+fixtures 目录下存在同名 JSON 文件（如 geocoding.json）时原样回放，
+否则按请求参数生成与真实接口结构一致的确定性数据。
+每个请求都会先等待 latency 秒，用于模拟网络延迟。
+
+单独运行:
+    python -m benchmarks.fake_upstream --port 8765 --latency-ms 50
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# 与 WeatherDataCollector 中的环境变量一一对应
+ENDPOINT_ENV = {
+    'OPEN_METEO_ARCHIVE_URL': '/archive',
+    'OPEN_METEO_FORECAST_URL': '/forecast',
+    'BAIDU_GEOCODING_URL': '/geocoding',
+    'BAIDU_REVERSE_GEOCODING_URL': '/reverse_geocoding',
+    'BAIDU_REGION_URL': '/region',
+}
+
+# 天气代码及其出现频率，接近华北地区的实际分布
+_WEATHER_CODES = np.array([0, 1, 2, 3, 45, 51, 61, 63, 65, 71, 73, 80, 95])
+_WEATHER_WEIGHTS = np.array([20, 15, 15, 20, 3, 5, 6, 4, 2, 2, 1, 5, 2], dtype=float)
+_WEATHER_WEIGHTS /= _WEATHER_WEIGHTS.sum()
+
+
+def synthetic_daily(dates, variables, seed=0):
+    """生成带季节变化的逐日数据，结构与 Open-Meteo daily 字段一致"""
+    rng = np.random.default_rng(seed)
+    n = len(dates)
+    doy = dates.dayofyear.to_numpy()
+    seasonal = 12 - 14 * np.cos(2 * np.pi * (doy - 15) / 365.25)
+    mean = seasonal + rng.normal(0, 3, n)
+    values = {
+        'temperature_2m_mean': mean,
+        'temperature_2m_max': mean + rng.uniform(3, 8, n),
+        'temperature_2m_min': mean - rng.uniform(3, 8, n),
+        'relative_humidity_2m_mean': rng.uniform(20, 95, n),
+        'precipitation_sum': np.maximum(rng.gamma(0.4, 6, n) - 1, 0),
+        'precipitation_probability_mean': rng.uniform(0, 100, n),
+        'precipitation_probability_max': rng.uniform(0, 100, n),
+        'wind_speed_10m_mean': rng.uniform(2, 25, n),
+        'wind_speed_10m_max': rng.uniform(5, 40, n),
+        'surface_pressure_mean': rng.normal(1013, 8, n),
+    }
+    daily = {'time': [d.strftime('%Y-%m-%d') for d in dates]}
+    for name in variables:
+        if name == 'weather_code':
+            daily[name] = rng.choice(_WEATHER_CODES, n, p=_WEATHER_WEIGHTS).tolist()
+        else:
+            daily[name] = np.round(values.get(name, rng.normal(0, 1, n)), 1).tolist()
+    return daily
+
+
+def synthetic_hourly_csv(start, end, variables, seed=0):
+    """生成逐小时数据，格式与 Open-Meteo format=csv 一致（坐标信息 + 空行 + 数据表）"""
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(start, pd.Timestamp(end) + pd.Timedelta(hours=23), freq='h')
+    n = len(times)
+    doy = times.dayofyear.to_numpy()
+    diurnal = -4 * np.cos(2 * np.pi * (times.hour.to_numpy() - 3) / 24)
+    seasonal = 12 - 14 * np.cos(2 * np.pi * (doy - 15) / 365.25)
+    values = {
+        'temperature_2m': seasonal + diurnal + rng.normal(0, 1.5, n),
+        'relative_humidity_2m': rng.uniform(20, 95, n),
+        'precipitation': np.maximum(rng.gamma(0.2, 2, n) - 0.3, 0),
+        'wind_speed_10m': rng.uniform(2, 25, n),
+        'surface_pressure': rng.normal(1013, 8, n),
+    }
+    frame = pd.DataFrame({'time': times.strftime('%Y-%m-%dT%H:%M')})
+    for name in variables:
+        if name == 'weather_code':
+            frame[name] = rng.choice(_WEATHER_CODES, n, p=_WEATHER_WEIGHTS)
+        else:
+            frame[name] = np.round(values.get(name, rng.normal(0, 1, n)), 1)
+    header = 'latitude,longitude,elevation,utc_offset_seconds,timezone,timezone_abbreviation\n' \
+             '39.9,116.4,44.0,28800,Asia/Shanghai,GMT+8\n\n'
+    return header + frame.to_csv(index=False)
+
+
+def _region_response(keyword):
+    """行政区查询：每级返回若干下级区划"""
+    children = [{'name': f'{keyword}-{i}', 'code': f'{keyword}{i:02d}'} for i in range(1, 21)]
+    return {'status': 0, 'districts': [{'name': keyword, 'code': keyword, 'districts': children}]}
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    fixtures_dir = FIXTURES_DIR
+
+    def log_message(self, format, *args):
+        pass
+
+    def _fixture(self, name):
+        path = os.path.join(self.fixtures_dir, f'{name}.json')
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        return None
+
+    def _respond(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _respond_text(self, text, content_type):
+        body = text.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlparse(self.path)
+        query = {k: v if len(v) > 1 else v[0] for k, v in parse_qs(url.query).items()}
+        name = url.path.strip('/')
+
+        fixture = self._fixture(name)
+        if fixture is not None:
+            return self._respond(fixture)
+
+        if name == 'archive' and 'hourly' in query:
+            variables = query['hourly'] if isinstance(query['hourly'], list) else [query['hourly']]
+            return self._respond_text(synthetic_hourly_csv(query['start_date'], query['end_date'], variables),
+                                      'text/csv; charset=utf-8')
+        if name == 'archive':
+            dates = pd.date_range(query['start_date'], query['end_date'], freq='D')
+            variables = query['daily'] if isinstance(query['daily'], list) else [query['daily']]
+            return self._respond({'daily': synthetic_daily(dates, variables)})
+        if name == 'forecast':
+            days = int(query.get('forecast_days', 7))
+            dates = pd.date_range(pd.Timestamp.today().normalize(), periods=days, freq='D')
+            variables = query['daily'] if isinstance(query['daily'], list) else [query['daily']]
+            return self._respond({'daily': synthetic_daily(dates, variables, seed=1)})
+        if name == 'geocoding':
+            return self._respond({'status': 0, 'result': {'location': {'lat': 39.9042, 'lng': 116.4074}}})
+        if name == 'reverse_geocoding':
+            return self._respond({'status': 0, 'result': {
+                'addressComponent': {'province': '北京市', 'city': '北京市', 'district': '东城区'},
+                'formatted_address': '北京市东城区'
+            }})
+        if name == 'region':
+            return self._respond(_region_response(query.get('keyword', '中国')))
+        return self._respond({'error': 'not found'}, status=404)
+
+
+class FakeUpstream:
+    """在后台线程中运行的模拟上游服务"""
+
+    def __init__(self, port=0, latency_ms=0, fixtures_dir=FIXTURES_DIR):
+        handler = type('Handler', (FakeUpstreamHandler,), {
+            'latency': latency_ms / 1000.0,
+            'fixtures_dir': fixtures_dir,
+        })
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def environ(self):
+        """让 src.config 指向本服务的环境变量"""
+        return {env: self.base_url + path for env, path in ENDPOINT_ENV.items()}
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟 Open-Meteo/百度地图服务')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--fixtures', default=FIXTURES_DIR)
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(args.port, args.latency_ms, args.fixtures)
+    print('设置以下环境变量后启动 api_server.py:')
+    for env, value in upstream.environ().items():
+        print(f'  {env}={value}')
+    try:
+        upstream.server.serve_forever()
+    except KeyboardInterrupt:
+        upstream.stop()
+
+
+if __name__ == '__main__':
+    main()
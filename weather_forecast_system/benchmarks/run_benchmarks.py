@@ -0,0 +1,207 @@
+"""
+离线基准测试
+
+所有上游请求都发往本地模拟服务（benchmarks/fake_upstream.py），结果与网络无关。
+包含两类用例:
+    端到端: 通过 Flask 测试客户端调用 collect-data / train-model / forecast / 行政区接口
+    微基准: find_optimal_order、WeatherClassifier.train/predict、generate_advice
+
+在 weather_forecast_system 目录下运行:
+    python -m benchmarks.run_benchmarks                          # 运行并保存到 benchmarks/results/
+    python -m benchmarks.run_benchmarks --baseline OLD.json      # 与基线比较，退化时返回码为 1
+    python -m benchmarks.run_benchmarks --sizes 30 365 --repeat 3 --latency-ms 20
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime
+
+from benchmarks.fake_upstream import FakeUpstream
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = [30, 365, 3650]
+
+
+def measure(fn, repeat=5, warmup=1):
+    """多次运行 fn，返回耗时统计（秒）"""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'runs': repeat,
+        'min': timings[0],
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'p95': timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))],
+    }
+
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽被测代码的 print 与警告输出"""
+    logging.getLogger('matplotlib.font_manager').setLevel(logging.ERROR)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+
+
+def _expect_ok(response):
+    if response.status_code != 200:
+        raise RuntimeError(f'{response.status_code}: {response.get_data(as_text=True)[:200]}')
+    return response
+
+
+def run_endpoint_benchmarks(client, sizes, repeat, results):
+    """端到端接口基准"""
+    from src import training_cache
+
+    for days in sizes:
+        collect = lambda: _expect_ok(client.post('/api/collect-data', json={'city': 'beijing', 'days': days}))
+        results[f'endpoint.collect_data[{days}]'] = measure(collect, repeat)
+        # 每次先清空训练结果缓存，测的是实际训练；命中缓存的耗时单独记录
+        results[f'endpoint.train_model[{days}]'] = measure(
+            lambda: (training_cache.get_cache().clear(), _expect_ok(client.post('/api/train-model'))), repeat)
+        results[f'endpoint.train_model_cached[{days}]'] = measure(
+            lambda: _expect_ok(client.post('/api/train-model')), repeat)
+        results[f'endpoint.get_forecast[{days}]'] = measure(
+            lambda: _expect_ok(client.get('/api/forecast')), repeat)
+
+    results['endpoint.region_provinces'] = measure(
+        lambda: _expect_ok(client.get('/api/region/provinces')), repeat)
+    results['endpoint.region_cities'] = measure(
+        lambda: _expect_ok(client.get('/api/region/cities?adcode=110000')), repeat)
+    results['endpoint.region_districts'] = measure(
+        lambda: _expect_ok(client.get('/api/region/districts?adcode=110100')), repeat)
+    results['endpoint.reverse_geocoding'] = measure(
+        lambda: _expect_ok(client.post('/api/reverse-geocoding', json={'latitude': 39.9, 'longitude': 116.4})), repeat)
+
+
+def run_micro_benchmarks(sizes, repeat, arima_max_order, results):
+    """模型与规则引擎微基准，数据来自模拟上游经 prepare_training_data 处理后的结果"""
+    from src.arima_model import TemperatureARIMA
+    from src.climatology import Climatology
+    from src.data_collector import WeatherDataCollector, FEATURE_COLUMNS, add_anomaly_features
+    from src.rule_engine import WeatherAdviceEngine
+    from src.weather_classifier import WeatherClassifier
+
+    collector = WeatherDataCollector()
+    engine = WeatherAdviceEngine()
+    max_p, max_d, max_q = arima_max_order
+
+    for days in sizes:
+        data = collector.prepare_training_data('beijing', days)
+        series = data.set_index('date')['temperature']
+        X = add_anomaly_features(data.copy(), Climatology.from_daily(data))[FEATURE_COLUMNS]
+        y = data['weather_type'].astype(str)
+
+        results[f'micro.find_optimal_order[{days}]'] = measure(
+            lambda: TemperatureARIMA().find_optimal_order(series, max_p, max_d, max_q), max(1, repeat // 2), warmup=0)
+
+        results[f'micro.classifier_train[{days}]'] = measure(lambda: WeatherClassifier().train(X, y), repeat)
+        classifier = WeatherClassifier()
+        classifier.train(X, y)
+        results[f'micro.classifier_predict[{days}]'] = measure(
+            lambda: classifier.predict(X, 'decision_tree'), repeat)
+
+        forecast_data = {
+            row.date.strftime('%Y-%m-%d'): {'temperature': float(row.temperature), 'weather_type': str(row.weather_type)}
+            for row in data.itertuples()
+        }
+        results[f'micro.generate_advice[{days}]'] = measure(lambda: engine.generate_advice(forecast_data), repeat)
+
+
+def compare(results, baseline, threshold):
+    """与基线比较中位数，返回退化的用例列表"""
+    regressions = []
+    for name, stats in sorted(results.items()):
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        ratio = stats['median'] / base['median'] if base['median'] else float('inf')
+        flag = 'REGRESSION' if ratio > 1 + threshold else ''
+        print(f'{name:45s} {base["median"] * 1000:10.2f}ms -> {stats["median"] * 1000:10.2f}ms  x{ratio:5.2f} {flag}')
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='天气预报系统离线基准测试')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='历史数据天数')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--latency-ms', type=float, default=0, help='模拟上游延迟')
+    parser.add_argument('--arima-max-order', type=int, nargs=3, default=[2, 1, 2], metavar=('P', 'D', 'Q'))
+    parser.add_argument('--skip-endpoints', action='store_true')
+    parser.add_argument('--skip-micro', action='store_true')
+    parser.add_argument('--output', help='结果文件，默认 benchmarks/results/<时间>.json')
+    parser.add_argument('--baseline', help='用于比较的基线结果文件')
+    parser.add_argument('--threshold', type=float, default=0.2, help='中位数变慢超过该比例视为退化')
+    args = parser.parse_args(argv)
+
+    upstream = FakeUpstream(latency_ms=args.latency_ms).start()
+    os.environ.update(upstream.environ())
+    # 图表、共享状态（含训练结果缓存）、模型仓库与逐小时存储都放在临时目录，不读写仓库中的数据
+    work_dir = tempfile.mkdtemp(prefix='weather-bench-')
+    for env, name in (('WEATHER_RESULTS_DIR', 'results'), ('WEATHER_STATE_DIR', 'state'),
+                      ('WEATHER_MODEL_DIR', 'models'), ('WEATHER_HOURLY_DIR', 'hourly')):
+        os.environ.setdefault(env, os.path.join(work_dir, name))
+
+    results = {}
+    try:
+        with quiet():
+            if not args.skip_endpoints:
+                import api_server
+                run_endpoint_benchmarks(api_server.app.test_client(), args.sizes, args.repeat, results)
+            if not args.skip_micro:
+                run_micro_benchmarks(args.sizes, args.repeat, args.arima_max_order, results)
+    finally:
+        upstream.stop()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'sizes': args.sizes,
+            'repeat': args.repeat,
+            'latency_ms': args.latency_ms,
+        },
+        'results': results,
+    }
+    output = args.output or os.path.join(
+        BENCH_DIR, 'results', datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    for name, stats in results.items():
+        print(f'{name:45s} median {stats["median"] * 1000:10.2f}ms  p95 {stats["p95"] * 1000:10.2f}ms')
+    print(f'结果已保存到 {output}')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'{len(regressions)} 项性能退化')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""
+gunicorn 配置（Linux/macOS 生产部署）
+
+    gunicorn -c gunicorn.conf.py api_server:app
+
+所有参数都可通过环境变量调整。默认使用 gthread worker：上游请求（预报、行政区、
+逆地理编码）在线程中阻塞等待时不占用其他请求，CPU 密集的训练也不会卡住同一进程内的其他连接。
+安装 gevent 后可设置 WEATHER_WORKER_CLASS=gevent，以协程方式处理更多并发连接。
+/api/events 的每个 SSE 连接在 gthread 下占用一个线程，因此每个 worker 最多保持
+WEATHER_EVENTS_MAX_STREAMS 个连接（默认 8，须小于 WEATHER_THREADS），超出时返回 503；
+客户端较多时建议改用 gevent，并相应调高该上限。
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('WEATHER_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEATHER_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = os.environ.get('WEATHER_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('WEATHER_THREADS', '32'))
+worker_connections = int(os.environ.get('WEATHER_WORKER_CONNECTIONS', '1000'))
+
+# 训练接口可能耗时较长
+timeout = int(os.environ.get('WEATHER_TIMEOUT', '300'))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    """每个 worker 启动后在后台预热重量级依赖；定时刷新只在抢到锁的一个 worker 中运行"""
+    from src import config
+    from src.refresh import start_refresh_scheduler
+    from src.warmup import start_background_warmup
+    if config.WARMUP:
+        start_background_warmup()
+    start_refresh_scheduler()
@@ -0,0 +1,42 @@
+"""
+生产环境启动入口
+
+    python serve.py
+
+Linux/macOS 使用 gunicorn（多进程，配置见 gunicorn.conf.py），
+Windows 上 gunicorn 不可用，改用 waitress（单进程多线程）。
+系统状态保存在 WEATHER_STATE_DIR 下，各 worker 之间共享。
+"""
+import os
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def serve_gunicorn():
+    from gunicorn.app.wsgiapp import run
+    sys.argv = ['gunicorn', '-c', os.path.join(PROJECT_DIR, 'gunicorn.conf.py'), 'api_server:app']
+    run()
+
+
+def serve_waitress():
+    from waitress import serve
+    from api_server import app
+    from src import config
+    from src.warmup import start_background_warmup
+
+    host, _, port = os.environ.get('WEATHER_BIND', '0.0.0.0:5000').rpartition(':')
+    threads = int(os.environ.get('WEATHER_THREADS', '32'))
+    if config.WARMUP:
+        start_background_warmup()
+    print(f"Weather Forecast API Server (waitress) listening on {host}:{port}")
+    serve(app, host=host, port=int(port), threads=threads)
+
+
+if __name__ == '__main__':
+    os.chdir(PROJECT_DIR)
+    sys.path.insert(0, PROJECT_DIR)
+    if sys.platform.startswith('win'):
+        serve_waitress()
+    else:
+        serve_gunicorn()
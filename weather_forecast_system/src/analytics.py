@@ -0,0 +1,241 @@
+"""
+多城市归档数据的分析查询（DuckDB）
+
+直接在逐小时 parquet 分区存储（见 src.hourly_store）上用进程内的 DuckDB 执行聚合，
+不把数据读进 pandas。只提供预先定义好的参数化查询，参数校验后以绑定变量传入:
+
+    ranking   按指标对网格单元排名（平均/最高/最低温度、总降水量、降水日数、平均风速）
+    monthly   各网格单元逐月统计与天气类型分布
+    extremes  所有网格单元中指标最极端的日期（最热、最冷、最湿、风最大）
+
+查询先把逐小时数据汇总为日数据（与 HourlyStore.daily_aggregates 的口径一致），
+城市与年月条件作用在 hive 分区列上，DuckDB 只打开涉及的分区；时间条件利用 parquet
+行组的最小/最大值统计跳过无关数据。
+
+查询结果按 (查询, 参数, 存储代数) 缓存在进程内（LRU，ANALYTICS_CACHE_SIZE 条），
+采集写入新数据后存储代数变化，旧结果自然失效。duckdb 在首次查询时才导入。
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from src import config, metrics
+from src.climatology import RAIN_DAY_THRESHOLD
+from src.data_collector import WEATHER_CODE_LOOKUP
+from src.hourly_store import MIN_HOURS_PER_DAY
+from src.metrics import CACHE_REQUESTS
+from src.schema import WEATHER_TYPES
+
+QUERIES = ('ranking', 'monthly', 'extremes')
+
+# 排名指标 -> 在日数据上的聚合表达式
+RANKING_METRICS = {
+    'mean_temperature': 'avg(temperature)',
+    'max_temperature': 'max(temp_max)',
+    'min_temperature': 'min(temp_min)',
+    'total_rainfall': 'sum(rainfall)',
+    'rainy_days': f'count_if(rainfall >= {RAIN_DAY_THRESHOLD})',
+    'mean_wind_speed': 'avg(wind_speed)',
+}
+
+# 极值指标 -> (日数据列, 排序方向)
+EXTREME_METRICS = {
+    'hottest': ('temp_max', 'DESC'),
+    'coldest': ('temp_min', 'ASC'),
+    'wettest': ('rainfall', 'DESC'),
+    'windiest': ('wind_max', 'DESC'),
+}
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 1000
+
+_DAILY_SQL = """
+WITH daily AS (
+    SELECT city,
+           CAST(time AS DATE) AS date,
+           avg(temperature) AS temperature,
+           CAST(max(temperature) AS DOUBLE) AS temp_max,
+           CAST(min(temperature) AS DOUBLE) AS temp_min,
+           sum(rainfall) AS rainfall,
+           avg(wind_speed) AS wind_speed,
+           CAST(max(wind_speed) AS DOUBLE) AS wind_max,
+           $weather_types[max(weather_code) + 1] AS weather_type
+    FROM read_parquet($files, hive_partitioning = true,
+                      hive_types = {'city': VARCHAR, 'year': INTEGER, 'month': INTEGER})
+    WHERE {where}
+    GROUP BY city, CAST(time AS DATE)
+    HAVING count(temperature) >= $min_hours
+)
+"""
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_connection = None
+_connection_lock = threading.Lock()
+
+
+def _cursor():
+    """进程内共享的 DuckDB 连接，每次查询使用独立的游标，可在多个线程中并发查询"""
+    global _connection
+    if _connection is None:
+        with _connection_lock:
+            if _connection is None:
+                import duckdb
+                _connection = duckdb.connect(':memory:')
+                # 缓存 parquet 文件的元数据（按文件修改时间校验），不同参数的查询不必重复解析
+                _connection.execute('SET parquet_metadata_cache = true')
+    return _connection.cursor()
+
+
+def _parse_limit(value, default):
+    if value is None or value == '':
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid limit: {value}')
+    return min(max(limit, 1), MAX_LIMIT)
+
+
+def _parse_date(value, name):
+    if value is None or value == '':
+        return None
+    try:
+        return pd.Timestamp(value).normalize()
+    except ValueError:
+        raise ValueError(f'Invalid {name}: {value}')
+
+
+class ArchiveAnalytics:
+    """逐小时分区存储上的参数化分析查询"""
+
+    def __init__(self, store, cache_size=None):
+        self.store = store
+        self.cache_size = cache_size if cache_size is not None else config.ANALYTICS_CACHE_SIZE
+
+    def _files(self, cells):
+        """查询涉及的分区文件通配符；指定网格单元时只列出这些单元的目录"""
+        pattern = os.path.join('year=*', 'month=*', 'part-0.parquet')
+        if not cells:
+            return [os.path.join(self.store.root, 'city=*', pattern)]
+        return [os.path.join(self.store.root, 'city=' + cell, pattern) for cell in cells
+                if self.store.months(cell)]
+
+    def _daily(self, cells, start, end):
+        """日数据 CTE 与绑定参数"""
+        where = ['true']
+        params = {
+            'files': self._files(cells),
+            'weather_types': [WEATHER_TYPES[code] for code in WEATHER_CODE_LOOKUP],
+            'min_hours': MIN_HOURS_PER_DAY,
+        }
+        if start is not None:
+            where.append('year * 100 + month >= $start_month AND time >= $start')
+            params.update(start_month=start.year * 100 + start.month, start=start.to_pydatetime())
+        if end is not None:
+            where.append('year * 100 + month <= $end_month AND time < $end')
+            params.update(end_month=end.year * 100 + end.month, end=(end + pd.Timedelta(days=1)).to_pydatetime())
+        return _DAILY_SQL.replace('{where}', ' AND '.join(where)), params
+
+    def run(self, query, metric=None, cells=None, start=None, end=None, limit=None, order='desc'):
+        """
+        执行一个预定义查询
+
+        参数:
+            query: ranking | monthly | extremes
+            metric: 排名或极值指标，见 RANKING_METRICS / EXTREME_METRICS
+            cells: 限定的网格单元键列表，缺省为全部
+            start / end: 日期范围（闭区间，YYYY-MM-DD）
+            limit: 返回行数上限（monthly 缺省为 MAX_LIMIT，其余为 DEFAULT_LIMIT）
+            order: ranking 的排序方向 desc | asc
+
+        返回:
+            {'columns': [...], 'rows': [[...], ...], 'cached': bool, 'seconds': float}
+        参数无效时抛出 ValueError。
+        """
+        if query not in QUERIES:
+            raise ValueError(f'Invalid query: {query}. Expected one of {", ".join(QUERIES)}')
+        start, end = _parse_date(start, 'start'), _parse_date(end, 'end')
+        limit = _parse_limit(limit, MAX_LIMIT if query == 'monthly' else DEFAULT_LIMIT)
+        order = (order or 'desc').lower()
+        if order not in ('asc', 'desc'):
+            raise ValueError(f'Invalid order: {order}')
+        cells = sorted({self.store.partition_key(cell) for cell in cells or []})
+        if query == 'ranking':
+            metric = metric or 'mean_temperature'
+            if metric not in RANKING_METRICS:
+                raise ValueError(f'Invalid metric: {metric}. Expected one of {", ".join(RANKING_METRICS)}')
+        elif query == 'extremes':
+            metric = metric or 'hottest'
+            if metric not in EXTREME_METRICS:
+                raise ValueError(f'Invalid metric: {metric}. Expected one of {", ".join(EXTREME_METRICS)}')
+        else:
+            metric = None
+        if query != 'ranking':
+            order = None
+
+        key = (self.store.root, query, metric, tuple(cells), start, end, limit, order, self.store.generation())
+        with _cache_lock:
+            result = _cache.get(key)
+            if result is not None:
+                _cache.move_to_end(key)
+        if result is not None:
+            CACHE_REQUESTS.inc(cache='analytics', result='hit')
+            return {**result, 'cached': True}
+        CACHE_REQUESTS.inc(cache='analytics', result='miss')
+
+        started = time.perf_counter()
+        with metrics.phase('analytics_query'):
+            columns, rows = self._execute(query, metric, cells, start, end, limit, order)
+        result = {'columns': columns, 'rows': rows, 'seconds': round(time.perf_counter() - started, 4)}
+        with _cache_lock:
+            _cache[key] = result
+            while len(_cache) > self.cache_size:
+                _cache.popitem(last=False)
+        return {**result, 'cached': False}
+
+    def _execute(self, query, metric, cells, start, end, limit, order):
+        daily, params = self._daily(cells, start, end)
+        if not params['files']:
+            return [], []
+        params['limit'] = limit
+        if query == 'ranking':
+            sql = daily + f"""
+                SELECT city, round({RANKING_METRICS[metric]}, 2) AS value, count(*) AS days,
+                       min(date) AS first_date, max(date) AS last_date
+                FROM daily GROUP BY city
+                ORDER BY value {order.upper()} NULLS LAST, city LIMIT $limit"""
+        elif query == 'extremes':
+            column, order = EXTREME_METRICS[metric]
+            sql = daily + f"""
+                SELECT city, date, round({column}, 2) AS value, weather_type
+                FROM daily WHERE {column} IS NOT NULL
+                ORDER BY {column} {order}, city, date LIMIT $limit"""
+        else:
+            type_counts = ', '.join(f"count_if(weather_type = '{name}') AS {name}" for name in WEATHER_TYPES)
+            sql = daily + f"""
+                SELECT city, year(date) AS year, month(date) AS month,
+                       round(avg(temperature), 2) AS mean_temperature,
+                       round(max(temp_max), 2) AS max_temperature,
+                       round(min(temp_min), 2) AS min_temperature,
+                       round(sum(rainfall), 2) AS total_rainfall,
+                       count(*) AS days, {type_counts}
+                FROM daily GROUP BY ALL
+                ORDER BY city, year, month LIMIT $limit"""
+        cursor = _cursor()
+        try:
+            cursor.execute(sql, params)
+            columns = [d[0] for d in cursor.description]
+            rows = [[value.isoformat() if hasattr(value, 'isoformat') else value for value in row]
+                    for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+        return columns, rows
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -1,15 +1,12 @@
 import pandas as pd
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from statsmodels.tsa.arima.model import ARIMA
-from statsmodels.tsa.stattools import adfuller
-from statsmodels.graphics.tsaplots import plot_acf, plot_pacf
 
-# 设置中文字体
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial Unicode MS']
-plt.rcParams['axes.unicode_minus'] = False
+from src.config import results_path
+from src.metrics import MODEL_FIT_SECONDS
+from src.plotting import get_pyplot
+from src.profiling import track_memory
+
+# statsmodels 与 matplotlib 在首次使用时才导入，避免拖慢服务启动
 
 class TemperatureARIMA:
     def __init__(self):
@@ -27,6 +24,7 @@ class TemperatureARIMA:
     
     def check_stationarity(self, time_series):
         """检查时间序列的平稳性"""
+        from statsmodels.tsa.stattools import adfuller
         result = adfuller(time_series)
         print('ADF Statistic:', result[0])
         print('p-value:', result[1])
@@ -42,6 +40,7 @@ class TemperatureARIMA:
     def find_optimal_order(self, time_series, max_p=5, max_d=2, max_q=5):
         """寻找ARIMA模型的最优阶数"""
         import warnings
+        from statsmodels.tsa.arima.model import ARIMA
         warnings.filterwarnings('ignore')
         
         best_aic = float('inf')
@@ -62,11 +61,14 @@ class TemperatureARIMA:
         print(f'最优ARIMA阶数: {best_order}, AIC: {best_aic:.2f}')
         return best_order
     
+    @track_memory('arima_train')
     def train(self, time_series, order=(1, 1, 1)):
         """训练ARIMA模型"""
+        from statsmodels.tsa.arima.model import ARIMA
         try:
             self.model = ARIMA(time_series, order=order)
-            self.fitted_model = self.model.fit()
+            with MODEL_FIT_SECONDS.time(model='arima'):
+                self.fitted_model = self.model.fit()
             print('模型训练完成')
             return self.fitted_model
         except Exception as e:
@@ -98,6 +100,7 @@ class TemperatureARIMA:
     
     def plot_forecast(self, time_series, forecast_result, title='Temperature Forecast'):
         """绘制预测结果"""
+        plt = get_pyplot()
         plt.figure(figsize=(12, 6))
         plt.plot(time_series, label='Historical Temperature')
         plt.plot(pd.date_range(start=time_series.index[-1] + pd.Timedelta(days=1), periods=len(forecast_result), freq='D'),
@@ -108,6 +111,6 @@ class TemperatureARIMA:
         plt.legend()
         plt.grid(True)
         plt.tight_layout()
-        plt.savefig('D:/Trae/trae_project/weather_forecast/weather_forecast_system/results/temperature_forecast.png')
+        plt.savefig(results_path('temperature_forecast.png'))
         plt.close()
         print('预测图已保存到 results/temperature_forecast.png')
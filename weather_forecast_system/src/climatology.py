@@ -0,0 +1,166 @@
+"""
+按年内日序的气候态索引（逐日常年值）
+
+由归档的日数据向量化地累加每个年内日序（1-366）的样本数、温度和与平方和、各天气类型
+出现次数以及降水日数，再在 ±CLIMATOLOGY_WINDOW_DAYS 天的环形窗口内平滑，得到逐日的
+常年温度、温度标准差、天气类型频率与降水概率。平滑后的结果预先算好保存在索引中，
+查询任意日期都是一次数组下标访问（O(1)），用途:
+
+    - 基准预报：模型尚未训练或预测失败时，直接给出常年值作为温度与天气预报
+    - 距平特征：温度减去当天常年值，作为天气分类器的特征
+    - 合理性检查：偏离常年值超过 CLIMATOLOGY_SANITY_Z 个标准差的预报被标记
+
+累加量可以继续增加新的日期（只累加 through 之后的日期），索引随数据增量更新。
+"""
+import numpy as np
+import pandas as pd
+
+from src import config
+from src.schema import WEATHER_TYPES
+
+DAYS_IN_YEAR = 366
+# 温度标准差下限（℃），样本很少时避免把正常波动判为异常
+MIN_TEMPERATURE_STD = 1.0
+# 降水量达到该值（mm）的日期计为降水日
+RAIN_DAY_THRESHOLD = 0.1
+
+
+def _day_index(dates):
+    """日期 -> 年内日序下标（0-365）"""
+    return pd.DatetimeIndex(pd.to_datetime(dates)).dayofyear.to_numpy() - 1
+
+
+def _circular_smooth(values, window):
+    """沿第一维做环形滑动求和（窗口为 ±window 天），年末与年初相接"""
+    if window <= 0:
+        return values
+    padded = np.concatenate([values[-window:], values, values[:window]])
+    cumulative = np.concatenate([np.zeros((1,) + values.shape[1:]), np.cumsum(padded, axis=0)])
+    return cumulative[2 * window + 1:] - cumulative[:-2 * window - 1]
+
+
+def _fill_gaps(values, covered):
+    """没有样本的日序用前后最近的有样本日序环形插值补齐"""
+    if covered.all() or not covered.any():
+        return values
+    days = np.arange(DAYS_IN_YEAR)
+    return np.interp(days, days[covered], values[covered], period=DAYS_IN_YEAR)
+
+
+class Climatology:
+    """单个城市（网格单元）的逐日气候态"""
+
+    def __init__(self, window=None):
+        self.window = window if window is not None else config.CLIMATOLOGY_WINDOW_DAYS
+        self.counts = np.zeros(DAYS_IN_YEAR)
+        self.temperature_sum = np.zeros(DAYS_IN_YEAR)
+        self.temperature_sq_sum = np.zeros(DAYS_IN_YEAR)
+        self.rain_counts = np.zeros(DAYS_IN_YEAR)
+        self.rain_samples = np.zeros(DAYS_IN_YEAR)
+        self.type_counts = np.zeros((DAYS_IN_YEAR, len(WEATHER_TYPES)))
+        self.through = None  # 已累加的最后日期
+        self._smooth()
+
+    @classmethod
+    def from_daily(cls, daily, window=None):
+        climatology = cls(window)
+        climatology.add(daily)
+        return climatology
+
+    @property
+    def samples(self):
+        return int(self.counts.sum())
+
+    def add(self, daily):
+        """累加 through 之后的日数据（含 date、temperature，可选 weather_type、rainfall），返回新增天数"""
+        if daily is None or len(daily) == 0:
+            return 0
+        dates = pd.to_datetime(daily['date'])
+        valid = daily['temperature'].notna().to_numpy()
+        if self.through is not None:
+            valid = valid & (dates > self.through).to_numpy()
+        if not valid.any():
+            return 0
+        frame = daily[valid]
+        index = _day_index(frame['date'])
+        temperature = frame['temperature'].to_numpy(dtype=np.float64)
+        self.counts += np.bincount(index, minlength=DAYS_IN_YEAR)
+        self.temperature_sum += np.bincount(index, weights=temperature, minlength=DAYS_IN_YEAR)
+        self.temperature_sq_sum += np.bincount(index, weights=temperature ** 2, minlength=DAYS_IN_YEAR)
+        if 'rainfall' in frame.columns:
+            rainfall = frame['rainfall'].to_numpy(dtype=np.float64)
+            measured = np.isfinite(rainfall)
+            self.rain_samples += np.bincount(index[measured], minlength=DAYS_IN_YEAR)
+            rainy = (rainfall[measured] >= RAIN_DAY_THRESHOLD).astype(np.float64)
+            self.rain_counts += np.bincount(index[measured], weights=rainy, minlength=DAYS_IN_YEAR)
+        if 'weather_type' in frame.columns:
+            codes = pd.Categorical(frame['weather_type'], categories=WEATHER_TYPES).codes
+            known = codes >= 0
+            np.add.at(self.type_counts, (index[known], codes[known]), 1)
+        self.through = dates[valid].max()
+        self._smooth()
+        return int(valid.sum())
+
+    def _smooth(self):
+        """预先计算平滑后的逐日常年值，查询时直接按下标取"""
+        counts = _circular_smooth(self.counts, self.window)
+        covered = counts > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self._smoothed_ratio(self.temperature_sum, counts)
+            variance = self._smoothed_ratio(self.temperature_sq_sum, counts) - mean ** 2
+            std = np.sqrt(np.clip(variance, 0, None))
+            rain_samples = _circular_smooth(self.rain_samples, self.window)
+            rain = self._smoothed_ratio(self.rain_counts, rain_samples)
+            types = _circular_smooth(self.type_counts, self.window)
+            frequencies = types / types.sum(axis=1, keepdims=True)
+        self.temperature = _fill_gaps(mean, covered)
+        self.temperature_std = np.maximum(_fill_gaps(std, covered), MIN_TEMPERATURE_STD)
+        self.rain_probability = _fill_gaps(rain, rain_samples > 0) if (rain_samples > 0).any() else rain
+        type_covered = types.sum(axis=1) > 0
+        if type_covered.any() and not type_covered.all():
+            frequencies = np.column_stack([_fill_gaps(frequencies[:, k], type_covered)
+                                           for k in range(len(WEATHER_TYPES))])
+        self.weather_frequencies = frequencies
+        self.weather = np.where(np.isfinite(frequencies).all(axis=1),
+                                np.nan_to_num(frequencies).argmax(axis=1), WEATHER_TYPES.index('unknown'))
+
+    def _smoothed_ratio(self, sums, counts):
+        return _circular_smooth(sums, self.window) / counts
+
+    def normals(self, dates):
+        """各日期的常年温度，索引为空时返回 None"""
+        if self.samples == 0:
+            return None
+        return self.temperature[_day_index(dates)]
+
+    def anomaly(self, dates, temperatures):
+        """温度距平（温度 - 常年值），索引为空时全为 0"""
+        temperatures = np.asarray(temperatures, dtype=np.float64)
+        normals = self.normals(dates)
+        return np.zeros_like(temperatures) if normals is None else temperatures - normals
+
+    def baseline(self, dates):
+        """
+        基准预报：各日期的常年温度、最常见天气类型与降水概率
+
+        返回 {'temperature': [...], 'weather_type': [...], 'rain_probability': [...]}，索引为空时返回 None。
+        """
+        if self.samples == 0:
+            return None
+        index = _day_index(dates)
+        rain = self.rain_probability[index]
+        return {
+            'temperature': [round(float(t), 1) for t in self.temperature[index]],
+            'weather_type': [WEATHER_TYPES[k] for k in self.weather[index]],
+            'rain_probability': [round(float(p) * 100) if np.isfinite(p) else None for p in rain]
+        }
+
+    def check(self, dates, temperatures, z=None):
+        """合理性检查：返回偏离常年值超过 z 个标准差的位置下标"""
+        if self.samples == 0:
+            return []
+        z = z if z is not None else config.CLIMATOLOGY_SANITY_Z
+        index = _day_index(dates)
+        temperatures = np.asarray(temperatures, dtype=np.float64)
+        scores = np.abs(temperatures - self.temperature[index]) / self.temperature_std[index]
+        return [int(i) for i in np.flatnonzero(scores > z)]
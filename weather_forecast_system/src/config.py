@@ -0,0 +1,103 @@
+"""
+系统配置
+
+上游接口地址、密钥和输出目录集中在这里，均可通过环境变量覆盖
+（例如基准测试时指向本地的模拟服务器）。
+"""
+import os
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 图表等输出文件目录
+RESULTS_DIR = os.environ.get('WEATHER_RESULTS_DIR', os.path.join(BASE_DIR, 'results'))
+
+# 跨 worker 共享的系统状态目录
+STATE_DIR = os.environ.get('WEATHER_STATE_DIR', os.path.join(BASE_DIR, 'state'))
+
+# 模型仓库目录、进程内常驻的模型数量上限、每个城市每类模型保留的版本数
+MODEL_REGISTRY_DIR = os.environ.get('WEATHER_MODEL_DIR', os.path.join(BASE_DIR, 'models'))
+MODEL_CACHE_SIZE = int(os.environ.get('WEATHER_MODEL_CACHE_SIZE', '256'))
+MODEL_KEEP_VERSIONS = int(os.environ.get('WEATHER_MODEL_KEEP_VERSIONS', '3'))
+
+# 训练结果缓存目录与条目上限；修改训练相关配置后可调整 WEATHER_TRAINING_VERSION 使旧缓存失效
+TRAINING_CACHE_DIR = os.path.join(STATE_DIR, 'training_cache')
+TRAINING_CACHE_SIZE = int(os.environ.get('WEATHER_TRAINING_CACHE_SIZE', '200'))
+TRAINING_CONFIG_VERSION = os.environ.get('WEATHER_TRAINING_VERSION', '1')
+
+# 天气数据网格分辨率（度）：地点对齐到网格单元，同一单元内的地点共用数据、模型与预报
+GRID_RESOLUTION = float(os.environ.get('WEATHER_GRID_RESOLUTION', '0.1'))
+
+# 逐小时数据的分区存储目录；开启时定时刷新按小时采集，日数据由逐小时数据汇总得到
+HOURLY_STORE_DIR = os.environ.get('WEATHER_HOURLY_DIR', os.path.join(BASE_DIR, 'data', 'hourly'))
+HOURLY_INGEST = os.environ.get('WEATHER_HOURLY_INGEST', '1') != '0'
+
+# 多城市分析查询（/api/analytics）在每个进程内缓存的结果条数
+ANALYTICS_CACHE_SIZE = int(os.environ.get('WEATHER_ANALYTICS_CACHE_SIZE', '256'))
+
+# 天气分类器调参：定时刷新时是否为每个城市调参，以及并行进程数（-1 为全部核心）
+CLASSIFIER_TUNING = os.environ.get('WEATHER_CLASSIFIER_TUNING', '1') != '0'
+TUNING_JOBS = int(os.environ.get('WEATHER_TUNING_JOBS', '-1'))
+
+# 全局天气分类器每次 partial_fit 的样本数
+GLOBAL_BATCH_SIZE = int(os.environ.get('WEATHER_GLOBAL_BATCH_SIZE', '512'))
+
+# 气候态索引：常年值的平滑窗口（±天数），预报偏离常年值超过多少个标准差时标记为可疑
+CLIMATOLOGY_WINDOW_DAYS = int(os.environ.get('WEATHER_CLIMATOLOGY_WINDOW_DAYS', '15'))
+CLIMATOLOGY_SANITY_Z = float(os.environ.get('WEATHER_CLIMATOLOGY_SANITY_Z', '4'))
+
+# 定时刷新的城市（逗号分隔），为空时不启动定时任务
+TRACKED_CITIES = [c.strip() for c in os.environ.get('WEATHER_TRACKED_CITIES', '').split(',') if c.strip()]
+# 每天开始刷新的时间（低峰时段）与各城市随机错开的最大秒数
+REFRESH_AT = os.environ.get('WEATHER_REFRESH_AT', '03:00')
+REFRESH_JITTER = float(os.environ.get('WEATHER_REFRESH_JITTER', '1800'))
+# 每个城市保留的历史天数、增量拉取时与已有数据重叠的天数、ARIMA 完整重新拟合的间隔天数
+REFRESH_HISTORY_DAYS = int(os.environ.get('WEATHER_REFRESH_HISTORY_DAYS', '365'))
+REFRESH_OVERLAP_DAYS = int(os.environ.get('WEATHER_REFRESH_OVERLAP_DAYS', '7'))
+REFRESH_REFIT_DAYS = int(os.environ.get('WEATHER_REFRESH_REFIT_DAYS', '7'))
+CITY_STATE_DIR = os.path.join(STATE_DIR, 'cities')
+
+# 预报检验数据库（官方预报与 AI 预测的累计误差）
+SKILL_DB_PATH = os.environ.get('WEATHER_SKILL_DB', os.path.join(STATE_DIR, 'skill.sqlite3'))
+
+# 服务器推送事件：共享事件文件、轮转大小、每个连接检查新事件的间隔与心跳间隔（秒）
+EVENTS_LOG_PATH = os.environ.get('WEATHER_EVENTS_LOG', os.path.join(STATE_DIR, 'events.ndjson'))
+EVENTS_MAX_BYTES = int(os.environ.get('WEATHER_EVENTS_MAX_BYTES', str(5 * 1024 * 1024)))
+EVENTS_POLL_INTERVAL = float(os.environ.get('WEATHER_EVENTS_POLL_INTERVAL', '0.5'))
+EVENTS_HEARTBEAT = float(os.environ.get('WEATHER_EVENTS_HEARTBEAT', '15'))
+# 每个进程同时保持的推送连接上限（超出时返回 503，0 表示不限）与每次读取事件文件的最大字节数
+EVENTS_MAX_STREAMS = int(os.environ.get('WEATHER_EVENTS_MAX_STREAMS', '8'))
+EVENTS_READ_BYTES = int(os.environ.get('WEATHER_EVENTS_READ_BYTES', str(64 * 1024)))
+
+# 上游 HTTP 连接池大小（每个进程）
+UPSTREAM_POOL_SIZE = int(os.environ.get('WEATHER_UPSTREAM_POOL_SIZE', '32'))
+
+# 上游限流：每秒请求数、突发容量、每日调用预算（每个进程，0 表示不限）
+BAIDU_RATE = float(os.environ.get('WEATHER_BAIDU_RATE', '10'))
+BAIDU_BURST = int(os.environ.get('WEATHER_BAIDU_BURST', '10'))
+BAIDU_DAILY_QUOTA = int(os.environ.get('WEATHER_BAIDU_DAILY_QUOTA', '5000'))
+OPEN_METEO_RATE = float(os.environ.get('WEATHER_OPEN_METEO_RATE', '8'))
+OPEN_METEO_BURST = int(os.environ.get('WEATHER_OPEN_METEO_BURST', '10'))
+OPEN_METEO_DAILY_QUOTA = int(os.environ.get('WEATHER_OPEN_METEO_DAILY_QUOTA', '10000'))
+
+# 启动后是否在后台预热 statsmodels/scikit-learn/绘图库
+WARMUP = os.environ.get('WEATHER_WARMUP', '1') != '0'
+
+# 剖析结果目录与访问令牌（未设置令牌时不允许剖析）
+PROFILES_DIR = os.environ.get('WEATHER_PROFILES_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILE_TOKEN = os.environ.get('WEATHER_PROFILE_TOKEN', '')
+
+# 百度地图
+BAIDU_AK = os.environ.get('BAIDU_AK', 'mY3JUgrCjfYY6NsktCf9HnUlgrR7kqDe')
+BAIDU_GEOCODING_URL = os.environ.get('BAIDU_GEOCODING_URL', 'http://api.map.baidu.com/geocoding/v3/')
+BAIDU_REVERSE_GEOCODING_URL = os.environ.get('BAIDU_REVERSE_GEOCODING_URL', 'http://api.map.baidu.com/reverse_geocoding/v3/')
+BAIDU_REGION_URL = os.environ.get('BAIDU_REGION_URL', 'https://api.map.baidu.com/api_region_search/v1/')
+
+# Open-Meteo
+OPEN_METEO_ARCHIVE_URL = os.environ.get('OPEN_METEO_ARCHIVE_URL', 'https://archive-api.open-meteo.com/v1/archive')
+OPEN_METEO_FORECAST_URL = os.environ.get('OPEN_METEO_FORECAST_URL', 'https://api.open-meteo.com/v1/forecast')
+
+
+def results_path(filename):
+    """返回输出目录下的文件路径，目录不存在时自动创建"""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    return os.path.join(RESULTS_DIR, filename)
@@ -1,17 +1,139 @@
 import requests
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import time
 
+from src import config, grid
+from src.climatology import Climatology
+from src.metrics import CACHE_REQUESTS
+from src.upstream import http_get, BAIDU, OPEN_METEO
+from src.rate_limit import UpstreamThrottledError
+from src.singleflight import SingleFlight
+
+# 进程内所有采集器实例共享，合并相同参数的并发上游请求
+_location_flights = SingleFlight('location')
+_historical_flights = SingleFlight('historical')
+_forecast_flights = SingleFlight('forecast')
+# 城市坐标缓存同样在进程内共享，城市名到网格单元的换算不会重复地理编码
+_location_cache = {}
+_geocoding_cache = {}
+from src.schema import WEATHER_TYPES, normalize_weather_frame, frame_memory_usage
+
+# WMO天气代码(0-99) -> WEATHER_TYPES 下标的查找表
+WEATHER_CODE_LOOKUP = np.full(100, WEATHER_TYPES.index('unknown'), dtype=np.int8)
+for _codes, _type in [
+    ([0], 'sunny'),
+    ([1, 2, 3], 'cloudy'),
+    ([45, 48], 'foggy'),
+    ([51, 53, 55, 61, 63, 65, 80, 81, 82], 'rain'),
+    ([56, 57, 66, 67], 'freezing_rain'),
+    ([71, 73, 75, 77, 85, 86], 'snow'),
+    ([95, 96, 99], 'thunderstorm'),
+]:
+    WEATHER_CODE_LOOKUP[_codes] = WEATHER_TYPES.index(_type)
+
+# 模型训练使用的特征列
+NUMERIC_COLUMNS = ['temperature', 'humidity', 'rainfall', 'wind_speed', 'pressure']
+CALENDAR_COLUMNS = ['year', 'month', 'day', 'weekday', 'is_weekend']
+LAG_FEATURE_COLUMNS = ['temp_lag_1', 'temp_mean_3', 'temp_mean_7']
+ANOMALY_COLUMNS = ['temp_anomaly']
+FEATURE_COLUMNS = CALENDAR_COLUMNS + NUMERIC_COLUMNS + LAG_FEATURE_COLUMNS + ANOMALY_COLUMNS
+
+
+def weather_codes_to_types(codes):
+    """批量将WMO天气代码转换为天气类型（Categorical），缺失或越界代码记为 unknown"""
+    codes = pd.to_numeric(pd.Series(codes), errors='coerce').to_numpy(dtype=np.float64)
+    valid = np.isfinite(codes) & (codes >= 0) & (codes < len(WEATHER_CODE_LOOKUP))
+    indices = np.full(len(codes), WEATHER_TYPES.index('unknown'), dtype=np.int8)
+    indices[valid] = WEATHER_CODE_LOOKUP[codes[valid].astype(np.int64)]
+    return pd.Categorical.from_codes(indices, categories=WEATHER_TYPES)
+
+
+def add_calendar_features(df):
+    """添加日期特征"""
+    dates = df['date'].dt
+    df['year'] = dates.year
+    df['month'] = dates.month
+    df['day'] = dates.day
+    df['weekday'] = dates.weekday  # 0=周一, 6=周日
+    df['is_weekend'] = (df['weekday'] >= 5).astype(np.int8)
+    return df
+
+
+def add_lag_features(df, group_col=None):
+    """
+    添加滞后与滑动平均温度特征：前一天温度、前3天/前7天平均温度
+
+    group_col 指定时按该列（如城市）分组计算，适用于多城市面板数据。
+    窗口只包含当天之前的数据，首行缺失值用当天温度填充。
+    """
+    temperature = df['temperature']
+    grouped = temperature.groupby(df[group_col]) if group_col else temperature
+    previous = grouped.shift(1)
+    previous_grouped = previous.groupby(df[group_col]) if group_col else previous
+    df['temp_lag_1'] = previous.fillna(temperature)
+    for window in (3, 7):
+        rolling = previous_grouped.rolling(window, min_periods=1).mean()
+        if group_col:
+            rolling = rolling.reset_index(level=0, drop=True)
+        df[f'temp_mean_{window}'] = rolling.fillna(temperature)
+    return df
+
+
+def add_anomaly_features(df, climatology):
+    """添加温度距平：温度减去气候态索引中当天的常年值"""
+    df['temp_anomaly'] = climatology.anomaly(df['date'], df['temperature'])
+    return df
+
+
+def build_features(df, climatology=None):
+    """
+    在原始日数据上添加日期特征、填充缺失值并计算滞后特征，提供 climatology 时再计算温度距平
+
+    距平的常年值不能包含要评估的数据，否则测试集的温度会经由常年值进入特征，
+    因此不在这里由 df 自身构建：训练时由调用方用训练集或归档数据构建后传入（见 add_anomaly_features）。
+    """
+    add_calendar_features(df)
+    numeric_cols = [col for col in NUMERIC_COLUMNS if col in df.columns]
+    df[numeric_cols] = df[numeric_cols].fillna(df[numeric_cols].mean())
+    add_lag_features(df)
+    if climatology is not None:
+        add_anomaly_features(df, climatology)
+    return normalize_weather_frame(df)
+
+
+def strip_features(df):
+    """去掉派生特征列，只保留上游返回的原始字段"""
+    return df.drop(columns=CALENDAR_COLUMNS + LAG_FEATURE_COLUMNS + ANOMALY_COLUMNS, errors='ignore')
+
+
+def features_for_prediction(frame, history=None, climatology=None):
+    """
+    为待预测的日数据（如未来几天的预报）构造模型特征
+
+    history 为之前的历史数据，用于计算前几天的滞后温度；不提供时只用 frame 自身。
+    距平相对于 climatology（一般为模型训练时使用的气候态）计算，缺省时由 history 构建。
+    """
+    raw = strip_features(frame)
+    if climatology is None:
+        climatology = Climatology.from_daily(history if history is not None else raw)
+    if history is not None:
+        raw = pd.concat([strip_features(history).tail(7), raw], ignore_index=True)
+        raw = raw.drop_duplicates('date', keep='last')
+    features = build_features(raw.reset_index(drop=True), climatology)
+    return features.tail(len(frame)).reset_index(drop=True)
+
+
 class WeatherDataCollector:
     """从Open-Meteo API采集真实天气数据"""
     
     def __init__(self):
-        self.base_url = "https://archive-api.open-meteo.com/v1/archive"
-        self.forecast_url = "https://api.open-meteo.com/v1/forecast"
-        self.location_cache = {}  # 缓存城市坐标
-        self.geocoding_cache = {}  # 缓存地理编码结果
-        self.baidu_ak = "mY3JUgrCjfYY6NsktCf9HnUlgrR7kqDe"  # 百度地图AK
+        self.base_url = config.OPEN_METEO_ARCHIVE_URL
+        self.forecast_url = config.OPEN_METEO_FORECAST_URL
+        self.location_cache = _location_cache  # 缓存城市坐标
+        self.geocoding_cache = _geocoding_cache  # 缓存地理编码结果
+        self.baidu_ak = config.BAIDU_AK  # 百度地图AK
     
     def get_location(self, city_name):
         """获取城市坐标"""
@@ -19,25 +141,45 @@ class WeatherDataCollector:
         
         # 首先检查缓存
         if city_lower in self.location_cache:
+            CACHE_REQUESTS.inc(cache='location', result='hit')
             return self.location_cache[city_lower]
         
         # 检查地理编码缓存
         if city_lower in self.geocoding_cache:
+            CACHE_REQUESTS.inc(cache='location', result='hit')
             return self.geocoding_cache[city_lower]
+        CACHE_REQUESTS.inc(cache='location', result='miss')
+        
+        location, shared = _location_flights.do(city_lower, self._geocode, city_name)
+        if shared:
+            self.location_cache[city_lower] = location
+        return location
+    
+    def cell_key(self, city_name):
+        """城市所在网格单元的键，数据、模型、预报等都以它为键"""
+        return grid.cell_key(self.get_location(city_name))
+    
+    def get_cell_location(self, city_name):
+        """城市所在网格单元中心的坐标，向上游请求数据时使用"""
+        return grid.snap(self.get_location(city_name))
+    
+    def _geocode(self, city_name):
+        """调用百度地理编码API，失败时使用默认坐标（北京）"""
+        city_lower = city_name.lower()
         
         # 使用百度地图API进行地理编码
         print(f"正在查找 '{city_name}' 的地理位置...")
         
         try:
             # 百度地图地理编码API
-            url = "http://api.map.baidu.com/geocoding/v3/"
+            url = config.BAIDU_GEOCODING_URL
             params = {
                 'address': city_name,
                 'output': 'json',
                 'ak': self.baidu_ak
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            response = http_get(BAIDU, 'geocoding', url, params=params, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
@@ -63,6 +205,9 @@ class WeatherDataCollector:
             self.location_cache[city_lower] = default_location
             return default_location
             
+        except UpstreamThrottledError:
+            # 配额超限不是"找不到城市"，不能用默认坐标顶替并写入缓存
+            raise
         except Exception as e:
             print(f"地理编码失败: {e}，使用默认坐标（北京）")
             default_location = {
@@ -78,7 +223,7 @@ class WeatherDataCollector:
         
         try:
             # 百度地图逆地理编码API
-            url = "http://api.map.baidu.com/reverse_geocoding/v3/"
+            url = config.BAIDU_REVERSE_GEOCODING_URL
             params = {
                 'location': f"{latitude},{longitude}",
                 'output': 'json',
@@ -86,7 +231,7 @@ class WeatherDataCollector:
                 'coordtype': 'wgs84'
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            response = http_get(BAIDU, 'reverse_geocoding', url, params=params, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
@@ -128,6 +273,8 @@ class WeatherDataCollector:
                 'formatted_address': ''
             }
             
+        except UpstreamThrottledError:
+            raise
         except Exception as e:
             print(f"逆地理编码失败: {e}，返回空信息")
             return {
@@ -149,7 +296,14 @@ class WeatherDataCollector:
         返回:
             DataFrame: 包含历史天气数据
         """
-        location = self.get_location(city_name)
+        # 同一网格单元内的城市请求相同的数据，共用一次上游请求
+        key = (self.cell_key(city_name), start_date, end_date)
+        df, _ = _historical_flights.do(key, self._fetch_historical_data, city_name, start_date, end_date)
+        # 结果由领头请求与跟随的请求共同持有，每个调用方都拿到自己的副本，以免相互修改
+        return df.copy() if df is not None else df
+    
+    def _fetch_historical_data(self, city_name, start_date, end_date):
+        location = self.get_cell_location(city_name)
         
         params = {
             'latitude': location['latitude'],
@@ -175,7 +329,7 @@ class WeatherDataCollector:
         print(f"坐标: {location['latitude']}, {location['longitude']}")
         
         try:
-            response = requests.get(self.base_url, params=params, timeout=30)
+            response = http_get(OPEN_METEO, 'archive', self.base_url, params=params, timeout=30)
             response.raise_for_status()
             data = response.json()
             
@@ -197,9 +351,10 @@ class WeatherDataCollector:
             })
             
             # 添加天气类型
-            df['weather_type'] = df['weather_code'].apply(self._weather_code_to_type)
+            df['weather_type'] = weather_codes_to_types(df['weather_code'])
             
-            print(f"成功获取 {len(df)} 条历史天气记录")
+            df = normalize_weather_frame(df)
+            print(f"成功获取 {len(df)} 条历史天气记录，占用内存 {frame_memory_usage(df) / 1024:.1f} KB")
             return df
             
         except requests.exceptions.RequestException as e:
@@ -217,7 +372,12 @@ class WeatherDataCollector:
         返回:
             DataFrame: 包含天气预报数据
         """
-        location = self.get_location(city_name)
+        key = (self.cell_key(city_name), days)
+        df, _ = _forecast_flights.do(key, self._fetch_forecast_data, city_name, days)
+        return df.copy() if df is not None else df
+    
+    def _fetch_forecast_data(self, city_name, days):
+        location = self.get_cell_location(city_name)
         
         params = {
             'latitude': location['latitude'],
@@ -239,7 +399,7 @@ class WeatherDataCollector:
         print(f"正在获取 {city_name} 的天气预报数据...")
         
         try:
-            response = requests.get(self.forecast_url, params=params, timeout=30)
+            response = http_get(OPEN_METEO, 'forecast', self.forecast_url, params=params, timeout=30)
             response.raise_for_status()
             data = response.json()
             
@@ -262,8 +422,9 @@ class WeatherDataCollector:
             })
             
             # 添加天气类型
-            df['weather_type'] = df['weather_code'].apply(self._weather_code_to_type)
+            df['weather_type'] = weather_codes_to_types(df['weather_code'])
             
+            df = normalize_weather_frame(df)
             print(f"成功获取 {len(df)} 天天气预报")
             return df
             
@@ -271,6 +432,42 @@ class WeatherDataCollector:
             print(f"获取预报数据失败: {e}")
             return None
     
+    def ingest_hourly(self, city_name, start_date, end_date, store):
+        """
+        按自然月分块采集逐小时历史数据并写入 store（HourlyStore）
+
+        每块单独请求、解析并写入城市所在网格单元的分区，内存中最多只有一个月的数据。
+        某个月请求失败时不再采集之后的月份：存储的最后时间停在缺口之前，
+        下次刷新从那里重新拉取，不会留下永久的空洞。
+        参数 start_date / end_date 为 date 对象，返回写入的小时数。
+        """
+        from src.hourly_store import HOURLY_VARIABLES, month_chunks, parse_hourly_csv
+        
+        location = self.get_cell_location(city_name)
+        cell = self.cell_key(city_name)
+        store.set_location(cell, location)
+        total = 0
+        for chunk_start, chunk_end in month_chunks(start_date, end_date):
+            params = {
+                'latitude': location['latitude'],
+                'longitude': location['longitude'],
+                'start_date': chunk_start.isoformat(),
+                'end_date': chunk_end.isoformat(),
+                'hourly': list(HOURLY_VARIABLES),
+                'timezone': 'Asia/Shanghai',
+                'format': 'csv'
+            }
+            try:
+                response = http_get(OPEN_METEO, 'archive_hourly', self.base_url, params=params, timeout=30)
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                print(f"获取 {city_name} {chunk_start} 至 {chunk_end} 的逐小时数据失败: {e}，下次刷新从这里继续")
+                break
+            table = parse_hourly_csv(response.content)
+            total += store.upsert_month(cell, table)
+        print(f"{city_name} 逐小时数据采集完成: {start_date} 至 {end_date}，共 {total} 小时")
+        return total
+    
     def _weather_code_to_type(self, code):
         """
         将WMO天气代码转换为天气类型
@@ -290,22 +487,7 @@ class WeatherDataCollector:
         95: 雷暴
         96, 99: 雷暴伴冰雹
         """
-        if code == 0:
-            return 'sunny'
-        elif code in [1, 2, 3]:
-            return 'cloudy'
-        elif code in [45, 48]:
-            return 'foggy'
-        elif code in [51, 53, 55, 61, 63, 65, 80, 81, 82]:
-            return 'rain'
-        elif code in [56, 57, 66, 67]:
-            return 'freezing_rain'
-        elif code in [71, 73, 75, 77, 85, 86]:
-            return 'snow'
-        elif code in [95, 96, 99]:
-            return 'thunderstorm'
-        else:
-            return 'unknown'
+        return weather_codes_to_types([code])[0]
     
     def prepare_training_data(self, city_name, days=365):
         """
@@ -326,20 +508,7 @@ class WeatherDataCollector:
         if df is None:
             return None
         
-        # 添加日期特征
-        df['year'] = df['date'].dt.year
-        df['month'] = df['date'].dt.month
-        df['day'] = df['date'].dt.day
-        df['weekday'] = df['date'].dt.weekday  # 0=周一, 6=周日
-        df['is_weekend'] = df['weekday'].apply(lambda x: 1 if x in [5, 6] else 0)
-        
-        # 处理缺失值
-        numeric_cols = ['temperature', 'humidity', 'rainfall', 'wind_speed', 'pressure']
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = df[col].fillna(df[col].mean())
-        
-        return df
+        return build_features(df)
     
     def get_city_list(self):
         """获取支持的城市列表"""
@@ -0,0 +1,145 @@
+"""
+历史数据降采样与聚合
+
+resample_frame 按日/周/月聚合，decimate（LTTB 或最小/最大值抽稀）把点数限制在给定上限内，
+所有计算基于 pandas/NumPy 向量化操作，图表数据量不随采集时长增长。
+"""
+import numpy as np
+import pandas as pd
+
+RESOLUTIONS = {
+    'day': None,
+    'week': 'W-MON',
+    'month': 'MS',
+}
+
+DECIMATION_METHODS = ('lttb', 'minmax')
+# 各抽稀方法能返回的最少点数：LTTB 保留首尾点与至少一个桶，minmax 每个桶保留最小与最大值
+MIN_POINTS = {'lttb': 3, 'minmax': 2}
+
+# 各列的聚合方式，未列出的数值列取均值
+_AGGREGATIONS = {
+    'temp_max': 'max',
+    'temp_min': 'min',
+    'rainfall': 'sum',
+    'weather_code': 'max',
+}
+
+# 聚合后不再有意义的日历列与滞后特征列
+_CALENDAR_COLUMNS = ['year', 'month', 'day', 'weekday', 'is_weekend',
+                     'temp_lag_1', 'temp_mean_3', 'temp_mean_7']
+
+
+def _period_grouper(resolution):
+    """返回按周期分组的 Grouper，周从周一开始，月从 1 日开始"""
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f'Invalid resolution: {resolution}')
+    return pd.Grouper(key='date', freq=RESOLUTIONS[resolution], label='left', closed='left')
+
+
+def weather_type_distribution(df, resolution='day'):
+    """
+    按周期统计各天气类型的天数
+
+    返回:
+        DataFrame: 以 date 为周期起点，每种天气类型一列
+    """
+    if resolution == 'day':
+        counts = pd.crosstab(df['date'], df['weather_type'])
+    else:
+        grouped = df.groupby([_period_grouper(resolution), 'weather_type'], observed=True)
+        counts = grouped.size().unstack(fill_value=0)
+    counts.columns = [str(c) for c in counts.columns]
+    return counts.reset_index()
+
+
+def resample_frame(df, resolution='day'):
+    """按日/周/月聚合历史数据，天气类型取周期内出现最多的类型"""
+    if resolution == 'day':
+        return df
+    grouper = _period_grouper(resolution)
+
+    numeric = df.drop(columns=[c for c in _CALENDAR_COLUMNS if c in df.columns])
+    numeric = numeric.select_dtypes(include='number')
+    aggregations = {col: _AGGREGATIONS.get(col, 'mean') for col in numeric.columns}
+    numeric = numeric.assign(date=df['date'])
+    result = numeric.groupby(grouper).agg(aggregations).round(2)
+
+    if 'weather_type' in df.columns:
+        counts = weather_type_distribution(df, resolution).set_index('date')
+        result['weather_type'] = counts.idxmax(axis=1).reindex(result.index)
+
+    result['days'] = df.groupby(grouper).size()
+    result = result[result['days'] > 0]
+    return result.reset_index()
+
+
+def lttb_indices(y, n_out):
+    """
+    Largest-Triangle-Three-Buckets 降采样，返回保留点的下标
+
+    x 轴取行号（日期等间隔），首尾点总是保留。
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=np.float64)
+    x = np.arange(n, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = np.nanmean(y[next_lo:next_hi]) if next_hi > next_lo else y[-1]
+        # 当前桶内每个点与前一选中点、下一桶均值点构成的三角形面积
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.nanargmax(area)) if np.isfinite(area).any() else lo
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y, n_out):
+    """最小/最大值抽稀：每个桶保留最小值和最大值所在的行，保留极值"""
+    n = len(y)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+
+    buckets = np.arange(n) * (n_out // 2) // n
+    series = pd.Series(np.asarray(y, dtype=np.float64))
+    grouped = series.groupby(buckets)
+    idx = np.union1d(grouped.idxmin().dropna().to_numpy(), grouped.idxmax().dropna().to_numpy())
+    return idx.astype(np.int64)
+
+
+def parse_max_points(value, method='lttb'):
+    """解析抽稀点数上限，缺省返回 None；低于该方法能返回的最少点数时抛出 ValueError"""
+    if method not in DECIMATION_METHODS:
+        raise ValueError(f'Invalid method: {method}')
+    if value is None or value == '':
+        return None
+    try:
+        max_points = int(value)
+    except (ValueError, TypeError):
+        raise ValueError(f'Invalid max_points: {value}')
+    if max_points < MIN_POINTS[method]:
+        raise ValueError(f'Invalid max_points: {value}. {method} needs at least {MIN_POINTS[method]}')
+    return max_points
+
+
+def decimate(df, max_points, column='temperature', method='lttb'):
+    """将 df 的行数限制在 max_points 以内，按 column 列的形状选择保留点"""
+    if max_points is None or len(df) <= max_points:
+        return df
+    if method not in DECIMATION_METHODS:
+        raise ValueError(f'Invalid method: {method}')
+    if max_points < MIN_POINTS[method]:
+        raise ValueError(f'Invalid max_points: {max_points}. {method} needs at least {MIN_POINTS[method]}')
+    values = df[column].to_numpy()
+    indices = lttb_indices(values, max_points) if method == 'lttb' else minmax_indices(values, max_points)
+    return df.iloc[indices]
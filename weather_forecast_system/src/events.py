@@ -0,0 +1,235 @@
+"""
+服务器推送事件（SSE）
+
+训练进度与预报更新作为事件追加到状态目录下的一个 NDJSON 文件，多个 worker 进程共享：
+任何进程发布的事件，连接在其他进程上的客户端也能收到。/api/events 的每个连接从文件尾部开始
+（或从 Last-Event-ID 指定的位置继续）读取新行并以 text/event-stream 推送，空闲时只定期发送心跳。
+
+事件 ID 为 "<文件 inode>-<字节偏移>"，文件超过 EVENTS_MAX_BYTES 时轮转，
+断线重连的客户端若落在已轮转的文件上，则从新文件开头继续。积压的事件每次最多读取
+EVENTS_READ_BYTES 字节，逐块推送，不会一次把文件剩余部分读进内存。
+
+gthread worker 下每个连接占用一个线程，因此每个进程同时保持的连接数限制为
+EVENTS_MAX_STREAMS，超出的连接由接口返回 503，不会占满处理其他请求的线程。
+
+事件类型:
+    training  训练任务开始/结束以及各阶段（ARIMA 拟合、各分类器、评估等）的开始与耗时
+    forecast  定时刷新生成了新的预报
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from src import config, metrics
+
+TRAINING = 'training'
+FORECAST = 'forecast'
+
+_log = None
+_log_lock = threading.Lock()
+_open_streams = 0
+_streams_lock = threading.Lock()
+
+
+class EventLog:
+    """多进程共享的追加式事件文件"""
+
+    def __init__(self, path, max_bytes=5 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def publish(self, event, data):
+        """追加一条事件；单次 O_APPEND 写入，多个进程同时发布时行不会交错"""
+        line = json.dumps({'event': event, 'data': data, 'time': time.time()},
+                          ensure_ascii=False, default=str) + '\n'
+        self._rotate_if_needed()
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode('utf-8'))
+        finally:
+            os.close(fd)
+
+    def _rotate_if_needed(self):
+        try:
+            if os.path.getsize(self.path) < self.max_bytes:
+                return
+            os.replace(self.path, self.path + '.1')
+        except OSError:
+            # 文件不存在，或其他进程刚刚完成轮转
+            pass
+
+    def tail_position(self):
+        """当前文件末尾的位置 (inode, 偏移)"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None, 0
+        return st.st_ino, st.st_size
+
+    @staticmethod
+    def parse_event_id(event_id):
+        """把事件 ID 解析为位置，无法解析时返回 None"""
+        try:
+            inode, offset = event_id.split('-', 1)
+            return int(inode), int(offset)
+        except (AttributeError, ValueError):
+            return None
+
+    def read_since(self, position, max_bytes=None):
+        """
+        读取 position 之后的完整事件行，最多读取 max_bytes 字节（缺省为读到文件末尾）
+
+        返回:
+            ([(事件 ID, 事件类型, 数据), ...], 新位置)
+        """
+        inode, offset = position
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return [], position
+        if st.st_ino == inode and st.st_size <= offset:
+            return [], position
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return [], position
+        with f:
+            current = os.fstat(f.fileno()).st_ino
+            if current != inode:
+                inode, offset = current, 0
+            f.seek(offset)
+            chunk = f.read(max_bytes if max_bytes else -1)
+        # 只处理以换行结尾的完整行，写到一半的行留到下次
+        end = chunk.rfind(b'\n') + 1
+        if end == 0 and max_bytes and len(chunk) == max_bytes:
+            # 单行超过一次读取的上限：跳过这一块，该行剩余部分在下次读取时解析失败被丢弃
+            return [], (inode, offset + len(chunk))
+        events = []
+        for line in chunk[:end].splitlines(keepends=True):
+            offset += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            events.append((f'{inode}-{offset}', record['event'], record['data']))
+        return events, (inode, offset)
+
+
+def get_log():
+    """进程内共享的事件文件"""
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = EventLog(config.EVENTS_LOG_PATH, config.EVENTS_MAX_BYTES)
+    return _log
+
+
+def publish(event, data):
+    """发布事件；推送失败不影响调用方"""
+    try:
+        get_log().publish(event, data)
+    except OSError as e:
+        print(f'发布事件失败: {e}')
+
+
+def new_job_id():
+    return uuid.uuid4().hex[:12]
+
+
+@contextmanager
+def training_progress(job_id, city, source):
+    """
+    把代码块内 metrics.phase 统计的各阶段作为 training 事件发布
+
+    代码块开始与结束时分别发布 status=started 与 completed/failed；
+    代码块可以往产出的字典里写入结果摘要，随 completed 事件一起发布。
+    """
+    base = {'job_id': job_id, 'city': city, 'source': source}
+    outcome = {}
+
+    def on_phase(name, status, seconds=None):
+        data = {**base, 'phase': name, 'status': status}
+        if seconds is not None:
+            data['seconds'] = round(seconds, 3)
+        publish(TRAINING, data)
+
+    publish(TRAINING, {**base, 'status': 'started'})
+    token = metrics.set_phase_listener(on_phase)
+    try:
+        yield outcome
+    except BaseException:
+        publish(TRAINING, {**base, 'status': 'failed'})
+        raise
+    finally:
+        metrics.reset_phase_listener(token)
+    publish(TRAINING, {**base, **outcome, 'status': 'completed'})
+
+
+def open_stream_slot():
+    """
+    占用一个推送连接名额
+
+    返回:
+        释放名额的函数（可重复调用）；已达到 EVENTS_MAX_STREAMS 时返回 None
+    """
+    global _open_streams
+    with _streams_lock:
+        if config.EVENTS_MAX_STREAMS and _open_streams >= config.EVENTS_MAX_STREAMS:
+            return None
+        _open_streams += 1
+    released = threading.Event()
+
+    def release():
+        global _open_streams
+        with _streams_lock:
+            if not released.is_set():
+                released.set()
+                _open_streams -= 1
+    return release
+
+
+def _format(event_id, event, data):
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f'id: {event_id}\nevent: {event}\ndata: {payload}\n\n'
+
+
+def stream(last_event_id=None, topics=None, poll_interval=None, heartbeat=None, stop=None):
+    """
+    生成 text/event-stream 响应体
+
+    参数:
+        last_event_id: 客户端最后收到的事件 ID，从其后继续；缺省时只推送之后的新事件
+        topics: 只推送这些事件类型，缺省为全部
+        stop: threading.Event，设置后结束推送
+    """
+    log = get_log()
+    poll_interval = poll_interval if poll_interval is not None else config.EVENTS_POLL_INTERVAL
+    heartbeat = heartbeat if heartbeat is not None else config.EVENTS_HEARTBEAT
+    position = log.parse_event_id(last_event_id) if last_event_id else None
+    if position is None:
+        position = log.tail_position()
+
+    yield 'retry: 3000\n\n'
+    idle = 0.0
+    while stop is None or not stop.is_set():
+        events, position = log.read_since(position, config.EVENTS_READ_BYTES)
+        sent = False
+        for event_id, event, data in events:
+            if topics and event not in topics:
+                continue
+            sent = True
+            yield _format(event_id, event, data)
+        if sent:
+            idle = 0.0
+        elif idle >= heartbeat:
+            idle = 0.0
+            yield ': keepalive\n\n'
+        if events:
+            continue  # 还有积压时立即读取下一块
+        time.sleep(poll_interval)
+        idle += poll_interval
@@ -0,0 +1,178 @@
+"""
+跨城市的全局天气类型分类器（增量训练）
+
+WeatherClassifier 针对单个城市在内存中的数据从头训练；这里的模型覆盖逐小时存储中的
+所有城市，除气象特征外加入位置（纬度、经度）与季节周期（年内日序的正余弦）特征，
+使用支持 partial_fit 的 SGDClassifier 与 StandardScaler 增量训练:
+
+    - 按自然月遍历所有城市的分区，每月把各城市的日汇总打乱后分成小批次送入 partial_fit，
+      内存中只有一个月的数据，与已采集的城市年数无关
+    - 模型记录每个城市已训练到的日期，之后的更新只使用新的日期，不需要完整重新训练
+
+模型作为 GLOBAL_SCOPE 下的 GLOBAL_CLASSIFIER 存入模型仓库，没有单独模型的城市也能用它预测。
+"""
+import copy
+
+import numpy as np
+import pandas as pd
+
+from src import config, metrics
+from src.data_collector import LAG_FEATURE_COLUMNS, NUMERIC_COLUMNS, build_features, features_for_prediction
+from src.schema import WEATHER_TYPES
+
+GLOBAL_SCOPE = '_global'
+GLOBAL_CLASSIFIER = 'global_classifier'
+
+LOCATION_COLUMNS = ['latitude', 'lon_sin', 'lon_cos']
+SEASON_COLUMNS = ['doy_sin', 'doy_cos']
+GLOBAL_FEATURE_COLUMNS = NUMERIC_COLUMNS + LAG_FEATURE_COLUMNS + LOCATION_COLUMNS + SEASON_COLUMNS
+
+# 计算滞后特征需要的前置天数
+_LAG_DAYS = 7
+
+
+def global_features(features, location):
+    """在已构造日期与滞后特征的日数据上添加位置与季节特征，返回 float32 特征矩阵"""
+    n = len(features)
+    longitude = np.radians(location['longitude'])
+    day_angle = 2 * np.pi * (features['date'].dt.dayofyear.to_numpy() - 1) / 365.25
+    extra = {
+        'latitude': np.full(n, location['latitude'] / 90.0),
+        'lon_sin': np.full(n, np.sin(longitude)),
+        'lon_cos': np.full(n, np.cos(longitude)),
+        'doy_sin': np.sin(day_angle),
+        'doy_cos': np.cos(day_angle),
+    }
+    columns = [features[col].to_numpy(dtype=np.float32) if col in features.columns
+               else extra[col].astype(np.float32) for col in GLOBAL_FEATURE_COLUMNS]
+    return np.column_stack(columns)
+
+
+class GlobalWeatherClassifier:
+    """所有城市共用的增量天气分类器"""
+
+    def __init__(self, random_state=42):
+        from sklearn.linear_model import SGDClassifier
+        from sklearn.preprocessing import StandardScaler
+
+        self.scaler = StandardScaler()
+        self.model = SGDClassifier(loss='log_loss', alpha=1e-4, random_state=random_state)
+        self.classes = np.arange(len(WEATHER_TYPES))
+        self.trained_through = {}  # 城市 -> 已训练到的最后日期
+        self.samples_seen = 0
+
+    @property
+    def fitted(self):
+        return self.samples_seen > 0
+
+    def partial_fit(self, X, y):
+        """用一个小批次更新标准化参数与模型"""
+        self.scaler.partial_fit(X)
+        self.model.partial_fit(self.scaler.transform(X), y, classes=self.classes)
+        self.samples_seen += len(y)
+
+    def predict(self, X):
+        codes = self.model.predict(self.scaler.transform(X))
+        return [WEATHER_TYPES[code] for code in codes]
+
+    def predict_frame(self, frame, location, history=None):
+        """对原始日数据（如预报）预测天气类型，history 用于计算滞后特征"""
+        if not self.fitted:
+            return None
+        features = features_for_prediction(frame, history)
+        return self.predict(global_features(features, location))
+
+
+def _city_month_rows(store, city, location, year, month, carry, since):
+    """
+    一个城市一个月的训练样本 (X, y)
+
+    carry 为上个月末的原始日数据，用于计算月初几天的滞后特征；返回新的 carry。
+    只保留 since 之后的日期。
+    """
+    start = pd.Timestamp(year=year, month=month, day=1)
+    end = start + pd.offsets.MonthEnd(0)
+    daily = store.daily_aggregates(city, start, end)
+    if daily is None:
+        return None, carry
+    raw = daily if carry is None else pd.concat([carry, daily], ignore_index=True)
+    features = build_features(raw.copy())
+    features = features[features['date'] >= start]
+    if since is not None:
+        features = features[features['date'] > since]
+    carry = daily.tail(_LAG_DAYS).reset_index(drop=True)
+    if len(features) == 0:
+        return None, carry
+    return (global_features(features, location),
+            features['weather_type'].cat.codes.to_numpy(dtype=np.int64)), carry
+
+
+def update_global_classifier(store, registry=None, batch_size=None, random_state=42):
+    """
+    用逐小时存储中尚未训练过的日期增量更新全局分类器，并作为新版本存入模型仓库
+
+    返回本次训练的样本数；没有新数据时不保存新版本。
+    """
+    from src.model_registry import get_registry
+
+    registry = registry or get_registry()
+    batch_size = batch_size or config.GLOBAL_BATCH_SIZE
+    classifier, _ = registry.load(GLOBAL_SCOPE, GLOBAL_CLASSIFIER)
+    if classifier is not None:
+        # 仓库返回的是常驻缓存中的实例，预测请求可能正在使用，在副本上继续训练
+        classifier = copy.deepcopy(classifier)
+    else:
+        classifier = GlobalWeatherClassifier(random_state=random_state)
+
+    # 每个城市从已训练到的日期所在月份开始，按月对齐地遍历所有城市
+    cities = {}
+    for city in store.cities():
+        location = store.location(city)
+        if location is None:
+            continue
+        since = classifier.trained_through.get(city)
+        since = pd.Timestamp(since) if since is not None else None
+        months = [m for m in store.months(city)
+                  if since is None or m >= (since.year, since.month)]
+        if months:
+            cities[city] = {'location': location, 'since': since, 'months': set(months), 'carry': None}
+    if not cities:
+        return 0
+
+    rng = np.random.default_rng(random_state + classifier.samples_seen)
+    trained = 0
+    with metrics.phase('global_classifier_fit'):
+        for year, month in sorted(set().union(*(c['months'] for c in cities.values()))):
+            X_parts, y_parts = [], []
+            for city, info in cities.items():
+                if (year, month) not in info['months']:
+                    continue
+                rows, info['carry'] = _city_month_rows(store, city, info['location'], year, month,
+                                                       info['carry'], info['since'])
+                if rows is not None:
+                    X_parts.append(rows[0])
+                    y_parts.append(rows[1])
+                    info['last'] = info['carry']['date'].iloc[-1]
+            if not X_parts:
+                continue
+            X, y = np.concatenate(X_parts), np.concatenate(y_parts)
+            order = rng.permutation(len(y))
+            for i in range(0, len(order), batch_size):
+                batch = order[i:i + batch_size]
+                classifier.partial_fit(X[batch], y[batch])
+            trained += len(y)
+
+    if trained == 0:
+        return 0
+    for city, info in cities.items():
+        if 'last' in info:
+            classifier.trained_through[city] = info['last'].strftime('%Y-%m-%d')
+    version = registry.save(GLOBAL_SCOPE, GLOBAL_CLASSIFIER, classifier, meta={
+        'source': 'incremental',
+        'feature_columns': GLOBAL_FEATURE_COLUMNS,
+        'samples_seen': classifier.samples_seen,
+        'new_samples': trained,
+        'cities': len(classifier.trained_through)
+    })
+    print(f'全局天气分类器已更新: 新增 {trained} 个样本，累计 {classifier.samples_seen}，版本 {version}')
+    return trained
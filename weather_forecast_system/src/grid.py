@@ -0,0 +1,25 @@
+"""
+把坐标对齐到天气数据的网格单元
+
+Open-Meteo 的数据是网格化的（再分析与预报模型的格距约 0.1°），相距几公里的区县通常落在同一个网格单元，
+上游返回的数据完全相同。采集、本地存储、模型与预报因此以网格单元为键，而不是城市名或原始坐标：
+同一单元内的地点共用一份数据与模型。
+
+网格分辨率由 WEATHER_GRID_RESOLUTION（度）配置。
+"""
+from src import config
+
+
+def snap(location, resolution=None):
+    """坐标对齐到所在网格单元的中心，返回新的 {latitude, longitude}"""
+    resolution = resolution or config.GRID_RESOLUTION
+    return {
+        'latitude': round(round(location['latitude'] / resolution) * resolution, 4),
+        'longitude': round(round(location['longitude'] / resolution) * resolution, 4)
+    }
+
+
+def cell_key(location, resolution=None):
+    """网格单元的键，如 cell_30.500_114.300，可直接用作文件名与缓存键"""
+    cell = snap(location, resolution)
+    return f"cell_{cell['latitude']:.3f}_{cell['longitude']:.3f}"
@@ -0,0 +1,77 @@
+"""
+历史数据查询：日期范围过滤、游标分页与 NDJSON 流式输出
+
+所有操作都基于按日期升序排列的 DataFrame，通过二分查找切片，
+不复制整段数据；NDJSON 输出按块惰性生成。
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from src.response_formats import frame_to_records
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+STREAM_CHUNK_SIZE = 500
+
+
+def _parse_date(value, name):
+    """解析 YYYY-MM-DD 格式日期，格式错误时抛出 ValueError"""
+    if value is None or value == '':
+        return None
+    try:
+        return pd.Timestamp(value)
+    except (ValueError, TypeError):
+        raise ValueError(f'Invalid {name}: {value}')
+
+
+def select_range(df, start=None, end=None):
+    """按闭区间 [start, end] 选取行，df 需按 date 升序排列"""
+    dates = df['date'].to_numpy()
+    lo = 0
+    hi = len(df)
+    start = _parse_date(start, 'start')
+    end = _parse_date(end, 'end')
+    if start is not None:
+        lo = int(np.searchsorted(dates, np.datetime64(start), side='left'))
+    if end is not None:
+        hi = int(np.searchsorted(dates, np.datetime64(end), side='right'))
+    return df.iloc[lo:max(lo, hi)]
+
+
+def parse_limit(value):
+    """解析分页大小，限制在 [1, MAX_PAGE_SIZE]"""
+    if value is None or value == '':
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except (ValueError, TypeError):
+        raise ValueError(f'Invalid limit: {value}')
+    return min(max(limit, 1), MAX_PAGE_SIZE)
+
+
+def paginate(df, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    游标分页
+
+    游标是下一页第一行的日期，数据追加新日期后已发出的游标仍然有效。
+
+    返回:
+        (page, next_cursor): 当前页 DataFrame 与下一页游标（没有更多数据时为 None）
+    """
+    if cursor:
+        df = select_range(df, start=cursor)
+    page = df.iloc[:limit]
+    next_cursor = None
+    if len(df) > limit:
+        next_cursor = df['date'].iloc[limit].strftime('%Y-%m-%d')
+    return page, next_cursor
+
+
+def iter_ndjson(df, chunk_size=STREAM_CHUNK_SIZE):
+    """逐块序列化为 NDJSON，每次只转换 chunk_size 行"""
+    for offset in range(0, len(df), chunk_size):
+        chunk = df.iloc[offset:offset + chunk_size]
+        lines = [json.dumps(record, ensure_ascii=False) for record in frame_to_records(chunk)]
+        yield '\n'.join(lines) + '\n'
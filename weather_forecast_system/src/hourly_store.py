@@ -0,0 +1,260 @@
+"""
+逐小时天气数据的本地分区存储
+
+目录结构（hive 风格分区，DuckDB / pyarrow.dataset 可直接读取）:
+    HOURLY_STORE_DIR/city=<网格单元键>/year=<YYYY>/month=<MM>/part-0.parquet
+
+每个分区保存一个网格单元（见 src.grid，同一单元内的城市共用）一个自然月的逐小时数据。采集按自然月分块请求 Open-Meteo
+（CSV 格式，由 pyarrow 直接解析为定长类型列，不经过 Python 列表），逐块写入对应分区；
+读取与日汇总也逐月进行，多年的逐小时数据不需要一次性放进内存。
+
+pyarrow 在首次使用时才导入。
+"""
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from src.schema import normalize_weather_frame
+
+# Open-Meteo 逐小时变量 -> 本地列名
+HOURLY_VARIABLES = {
+    'temperature_2m': 'temperature',
+    'relative_humidity_2m': 'humidity',
+    'precipitation': 'rainfall',
+    'wind_speed_10m': 'wind_speed',
+    'surface_pressure': 'pressure',
+    'weather_code': 'weather_code',
+}
+
+# 一天至少有这么多小时的观测才生成日汇总，不完整的日期留到下次采集补齐
+MIN_HOURS_PER_DAY = 20
+# 降水量达到该值（mm）的小时计为有雨，用于估算日降水概率
+RAIN_HOUR_THRESHOLD = 0.1
+# 每次写入分区后更新修改时间的标记文件（见 HourlyStore.generation）
+_GENERATION_FILE = '.generation'
+
+
+def _hourly_schema():
+    import pyarrow as pa
+    fields = [pa.field('time', pa.timestamp('s'))]
+    for column in HOURLY_VARIABLES.values():
+        fields.append(pa.field(column, pa.int8() if column == 'weather_code' else pa.float32()))
+    return pa.schema(fields)
+
+
+def month_chunks(start, end):
+    """把闭区间 [start, end] 按自然月切分为 [(块起始日, 块结束日), ...]"""
+    chunks = []
+    current = start
+    while current <= end:
+        next_month = (current.replace(day=1) + timedelta(days=32)).replace(day=1)
+        chunk_end = min(end, next_month - timedelta(days=1))
+        chunks.append((current, chunk_end))
+        current = next_month
+    return chunks
+
+
+def parse_hourly_csv(content):
+    """
+    解析 Open-Meteo format=csv 的逐小时响应为 pyarrow.Table
+
+    响应开头是一段坐标信息，空行之后才是数据表；列名带单位，如 "temperature_2m (°C)"。
+    温度缺失的行（归档尚未更新的时段）被丢弃。
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+
+    _, _, body = content.partition(b'\n\n')
+    table = pa_csv.read_csv(io.BytesIO(body or content))
+    renamed = [HOURLY_VARIABLES.get(name.split(' (')[0], name) for name in table.column_names]
+    table = table.rename_columns(renamed)
+
+    schema = _hourly_schema()
+    columns = []
+    for field in schema:
+        if field.name in table.column_names:
+            columns.append(table[field.name].cast(field.type))
+        else:
+            columns.append(pa.nulls(len(table), field.type))
+    table = pa.Table.from_arrays(columns, schema=schema)
+    return table.filter(pc.is_valid(table['temperature']))
+
+
+class HourlyStore:
+    """按城市、年、月分区的逐小时 parquet 存储"""
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def partition_key(city):
+        """城市（网格单元键）在分区目录名中的规范化形式"""
+        return re.sub(r'[\\/:*?"<>|\s=]+', '_', city.strip().lower())
+
+    @classmethod
+    def _city_dirname(cls, city):
+        return 'city=' + cls.partition_key(city)
+
+    def generation(self):
+        """存储代数：每次写入分区后变化，用于使基于存储内容的缓存失效"""
+        try:
+            return os.stat(os.path.join(self.root, _GENERATION_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _bump_generation(self):
+        path = os.path.join(self.root, _GENERATION_FILE)
+        with open(path, 'a'):
+            pass
+        os.utime(path)
+
+    def partition_path(self, city, year, month):
+        return os.path.join(self.root, self._city_dirname(city), f'year={year:04d}', f'month={month:02d}',
+                            'part-0.parquet')
+
+    def cities(self):
+        """已存储的城市（分区目录中的规范化名称）"""
+        return sorted(name[5:] for name in os.listdir(self.root)
+                      if name.startswith('city=') and os.path.isdir(os.path.join(self.root, name)))
+
+    def set_location(self, city, location):
+        """记录城市坐标，供跨城市的全局模型使用"""
+        city_dir = os.path.join(self.root, self._city_dirname(city))
+        os.makedirs(city_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=city_dir, prefix='.location-', suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'latitude': location['latitude'], 'longitude': location['longitude']}, f)
+        os.replace(tmp_path, os.path.join(city_dir, 'location.json'))
+
+    def location(self, city):
+        """城市坐标 {latitude, longitude}，未记录时返回 None"""
+        try:
+            with open(os.path.join(self.root, self._city_dirname(city), 'location.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def months(self, city):
+        """已存储的 (年, 月) 列表，按时间升序"""
+        city_dir = os.path.join(self.root, self._city_dirname(city))
+        result = []
+        if not os.path.isdir(city_dir):
+            return result
+        for year_dir in os.listdir(city_dir):
+            if not year_dir.startswith('year='):
+                continue
+            for month_dir in os.listdir(os.path.join(city_dir, year_dir)):
+                if month_dir.startswith('month=') and \
+                        os.path.exists(os.path.join(city_dir, year_dir, month_dir, 'part-0.parquet')):
+                    result.append((int(year_dir[5:]), int(month_dir[6:])))
+        return sorted(result)
+
+    def upsert_month(self, city, table):
+        """
+        写入一个月内的数据块：分区中与新数据时间范围重叠的行被替换，其余行保留
+
+        写入临时文件后原子替换，读者不会看到写了一半的分区。返回本次写入的小时数。
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        written = table.num_rows
+        if written == 0:
+            return 0
+        first = table['time'][0].as_py()
+        path = self.partition_path(city, first.year, first.month)
+        with self._lock:
+            if os.path.exists(path):
+                existing = pq.read_table(path, schema=_hourly_schema())
+                lo, hi = pc.min(table['time']), pc.max(table['time'])
+                keep = pc.or_(pc.less(existing['time'], lo), pc.greater(existing['time'], hi))
+                table = pa.concat_tables([existing.filter(keep), table])
+            table = table.sort_by('time')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.part-', suffix='.tmp')
+            os.close(fd)
+            try:
+                pq.write_table(table, tmp_path, compression='zstd')
+                os.replace(tmp_path, path)
+                self._bump_generation()
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        return written
+
+    def last_timestamp(self, city):
+        """最后一条记录的时间，没有数据时返回 None"""
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+        months = self.months(city)
+        if not months:
+            return None
+        times = pq.read_table(self.partition_path(city, *months[-1]), columns=['time'])['time']
+        return pd.Timestamp(pc.max(times).as_py()) if len(times) else None
+
+    def scan(self, city, start=None, end=None, columns=None):
+        """逐月产出 [start, end] 范围内的 pyarrow.Table，只读取涉及的分区"""
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) + pd.Timedelta(days=1) if end is not None else None
+        for year, month in self.months(city):
+            month_start = pd.Timestamp(year=year, month=month, day=1)
+            if (end is not None and month_start >= end) or \
+                    (start is not None and month_start + pd.offsets.MonthBegin(1) <= start):
+                continue
+            table = pq.read_table(self.partition_path(city, year, month), columns=columns)
+            if start is not None:
+                table = table.filter(pc.greater_equal(table['time'], start.to_pydatetime()))
+            if end is not None:
+                table = table.filter(pc.less(table['time'], end.to_pydatetime()))
+            if table.num_rows:
+                yield table
+
+    def daily_aggregates(self, city, start=None, end=None):
+        """
+        由逐小时数据计算日数据，列与 fetch_historical_data 一致
+
+        逐月分组汇总：平均/最高/最低温度、平均湿度、风速、气压，降水量求和，
+        降水概率取有雨小时的占比，天气代码取当天最严重（最大）的代码。
+        """
+        from src.data_collector import weather_codes_to_types
+
+        frames = []
+        for table in self.scan(city, start, end):
+            hourly = table.to_pandas()
+            day = hourly['time'].dt.floor('D').rename('date')
+            grouped = hourly.groupby(day)
+            daily = pd.DataFrame({
+                'temperature': grouped['temperature'].mean(),
+                'temp_max': grouped['temperature'].max(),
+                'temp_min': grouped['temperature'].min(),
+                'humidity': grouped['humidity'].mean(),
+                'rainfall': grouped['rainfall'].sum(min_count=1),
+                'rain_probability': (hourly['rainfall'] >= RAIN_HOUR_THRESHOLD).groupby(day).mean() * 100,
+                'wind_speed': grouped['wind_speed'].mean(),
+                'pressure': grouped['pressure'].mean(),
+                'weather_code': grouped['weather_code'].max(),
+                'hours': grouped['temperature'].count(),
+            })
+            frames.append(daily[daily['hours'] >= MIN_HOURS_PER_DAY].drop(columns='hours'))
+        if not frames:
+            return None
+        df = pd.concat(frames).reset_index()
+        df['weather_type'] = weather_codes_to_types(df['weather_code'])
+        numeric = df.columns.difference(['date', 'weather_code', 'weather_type'])
+        df[numeric] = df[numeric].astype(np.float64).round(2)
+        return normalize_weather_frame(df)
@@ -0,0 +1,213 @@
+"""
+运行时指标
+
+提供计数器与直方图，以 Prometheus 文本格式输出（/metrics），
+并记录单个请求内各阶段耗时，用于生成 Server-Timing 响应头。
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+# 当前请求内的阶段耗时 {阶段名: 秒}，None 表示不在请求上下文中
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+# 阶段开始/结束时的回调（如把训练进度推送给客户端），只在设置了的上下文中生效
+_phase_listener = contextvars.ContextVar('phase_listener', default=None)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in pairs]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_items(items))
+        return lines
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _render_items(self, items):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {value}' for key, value in items]
+
+
+class Histogram(_Metric):
+    """累积分桶直方图"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state['counts'][index] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_items(self, items):
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['counts']):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, ("le", bound))} {cumulative}')
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, ("le", "+Inf"))} {state["count"]}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {state["sum"]}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {state["count"]}')
+        return lines
+
+
+def render_metrics():
+    """所有指标的 Prometheus 文本格式"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# ===================== 指标定义 =====================
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'weather_http_request_duration_seconds', 'API request latency',
+    ['endpoint', 'method', 'status'])
+
+UPSTREAM_REQUESTS = Counter(
+    'weather_upstream_requests_total', 'Upstream HTTP calls',
+    ['upstream', 'endpoint', 'status'])
+UPSTREAM_BYTES = Counter(
+    'weather_upstream_response_bytes_total', 'Bytes received from upstream',
+    ['upstream', 'endpoint'])
+UPSTREAM_SECONDS = Histogram(
+    'weather_upstream_request_duration_seconds', 'Upstream HTTP call latency',
+    ['upstream', 'endpoint'])
+
+CACHE_REQUESTS = Counter(
+    'weather_cache_requests_total', 'Cache lookups by result (hit/miss)',
+    ['cache', 'result'])
+
+MODEL_FIT_SECONDS = Histogram(
+    'weather_model_fit_duration_seconds', 'Model fit duration',
+    ['model'])
+
+SERIALIZATION_SECONDS = Histogram(
+    'weather_serialization_duration_seconds', 'Time spent serializing frames for responses',
+    ['format'])
+
+PHASE_SECONDS = Histogram(
+    'weather_phase_duration_seconds', 'Duration of named processing phases (train_model etc.)',
+    ['phase'])
+
+
+# ===================== 请求内阶段计时 =====================
+
+def start_request_timing():
+    """开始记录当前请求的阶段耗时，返回用于恢复的 token"""
+    return _request_timings.set({})
+
+
+def finish_request_timing(token):
+    """结束记录并返回 {阶段名: 秒}"""
+    timings = _request_timings.get() or {}
+    _request_timings.reset(token)
+    return timings
+
+
+def record_phase(name, seconds, observe=True):
+    """记录一个阶段耗时：写入直方图，并计入当前请求的 Server-Timing"""
+    if observe:
+        PHASE_SECONDS.observe(seconds, phase=name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def set_phase_listener(listener):
+    """设置当前上下文的阶段回调 listener(name, status, seconds=None)，返回用于恢复的 token"""
+    return _phase_listener.set(listener)
+
+
+def reset_phase_listener(token):
+    _phase_listener.reset(token)
+
+
+@contextmanager
+def phase(name):
+    """统计代码块耗时的上下文管理器"""
+    listener = _phase_listener.get()
+    if listener is not None:
+        listener(name, 'started')
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        record_phase(name, elapsed)
+        if listener is not None:
+            listener(name, 'finished', elapsed)
+
+
+def server_timing_header(timings, total=None):
+    """生成 Server-Timing 响应头的值（毫秒）"""
+    entries = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings.items()]
+    if total is not None:
+        entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
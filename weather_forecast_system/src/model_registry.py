@@ -0,0 +1,200 @@
+"""
+按城市与版本保存的模型仓库
+
+目录结构:
+    MODEL_REGISTRY_DIR/<城市>/<模型类型>/<版本>/model.joblib
+    MODEL_REGISTRY_DIR/<城市>/<模型类型>/<版本>/meta.json
+    MODEL_REGISTRY_DIR/<城市>/<模型类型>/<版本>/PINNED     存在时该版本不会被清理
+    MODEL_REGISTRY_DIR/<城市>/<模型类型>/LATEST      最新版本号
+
+接口与定时刷新传入的"城市"是网格单元键（见 src.grid），同一单元内的城市共用模型。
+
+模型以未压缩的 joblib 格式保存，加载时使用 mmap_mode='c'：其中的 numpy 数组直接映射文件，
+多个 worker 共享操作系统的页缓存；写时复制，statsmodels 等需要可写数组的代码也能正常运行。进程内只保留最近使用的 max_resident 个模型（LRU），
+其余模型只占磁盘，需要时再加载，因此单机可以容纳成千上万个城市的模型。
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from src import config
+from src.metrics import CACHE_REQUESTS
+
+CLASSIFIER = 'classifier'
+ARIMA = 'arima'
+
+_MODEL_FILE = 'model.joblib'
+_META_FILE = 'meta.json'
+_LATEST_FILE = 'LATEST'
+_PINNED_FILE = 'PINNED'
+_VERSION_RE = re.compile(r'^\d{8}T\d{12}-[0-9a-f]{6}$')
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def _city_dirname(city):
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', city.strip().lower())
+
+
+class ModelRegistry:
+    """模型的版本化存储与 LRU 常驻缓存"""
+
+    def __init__(self, root, max_resident=256, keep_versions=3):
+        self.root = root
+        self.max_resident = max_resident
+        self.keep_versions = keep_versions
+        self._resident = OrderedDict()  # (城市, 类型, 版本) -> 模型
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _kind_dir(self, city, kind):
+        return os.path.join(self.root, _city_dirname(city), kind)
+
+    def save(self, city, kind, model, meta=None):
+        """保存新版本并设为最新，返回版本号"""
+        import joblib
+        kind_dir = self._kind_dir(city, kind)
+        os.makedirs(kind_dir, exist_ok=True)
+        version = datetime.now().strftime('%Y%m%dT%H%M%S%f-') + uuid.uuid4().hex[:6]
+
+        # 先写到临时目录，完整后再改名，避免其他进程读到写了一半的模型
+        tmp_dir = tempfile.mkdtemp(dir=kind_dir, prefix='.tmp-')
+        try:
+            joblib.dump(model, os.path.join(tmp_dir, _MODEL_FILE))
+            with open(os.path.join(tmp_dir, _META_FILE), 'w', encoding='utf-8') as f:
+                json.dump({'version': version, 'city': city, 'kind': kind,
+                           'saved_at': datetime.now().isoformat(timespec='seconds'),
+                           **(meta or {})}, f, ensure_ascii=False, indent=2, default=str)
+            os.rename(tmp_dir, os.path.join(kind_dir, version))
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        self._write_latest(kind_dir, version)
+
+        with self._lock:
+            self._remember((_city_dirname(city), kind, version), model)
+        self._prune(kind_dir, version)
+        return version
+
+    @staticmethod
+    def _write_latest(kind_dir, version):
+        fd, tmp_latest = tempfile.mkstemp(dir=kind_dir, prefix='.latest-')
+        with os.fdopen(fd, 'w') as f:
+            f.write(version)
+        os.replace(tmp_latest, os.path.join(kind_dir, _LATEST_FILE))
+
+    def promote(self, city, kind, version):
+        """把已有版本重新设为最新，版本不存在时返回 False"""
+        if self.metadata(city, kind, version) is None:
+            return False
+        self._write_latest(self._kind_dir(city, kind), version)
+        return True
+
+    def pin(self, city, kind, version):
+        """固定版本，清理旧版本时跳过它（训练结果缓存仍引用的版本），版本不存在时返回 False"""
+        version_dir = os.path.join(self._kind_dir(city, kind), version)
+        if self.metadata(city, kind, version) is None:
+            return False
+        open(os.path.join(version_dir, _PINNED_FILE), 'a').close()
+        return True
+
+    def unpin(self, city, kind, version):
+        """取消固定，版本在下次保存新版本时按常规规则清理"""
+        if not _VERSION_RE.match(version):
+            return
+        try:
+            os.remove(os.path.join(self._kind_dir(city, kind), version, _PINNED_FILE))
+        except FileNotFoundError:
+            pass
+
+    def latest_version(self, city, kind):
+        try:
+            with open(os.path.join(self._kind_dir(city, kind), _LATEST_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def versions(self, city, kind):
+        """已保存的版本，按时间从旧到新"""
+        kind_dir = self._kind_dir(city, kind)
+        if not os.path.isdir(kind_dir):
+            return []
+        return sorted(name for name in os.listdir(kind_dir)
+                      if os.path.isfile(os.path.join(kind_dir, name, _META_FILE)))
+
+    def metadata(self, city, kind, version=None):
+        version = version or self.latest_version(city, kind)
+        if version is None or not _VERSION_RE.match(version):
+            return None
+        try:
+            with open(os.path.join(self._kind_dir(city, kind), version, _META_FILE), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def load(self, city, kind, version=None):
+        """
+        加载模型，默认为最新版本
+
+        返回:
+            (模型, 版本号)，不存在时返回 (None, None)
+        """
+        version = version or self.latest_version(city, kind)
+        if version is None or not _VERSION_RE.match(version):
+            return None, None
+        key = (_city_dirname(city), kind, version)
+        with self._lock:
+            model = self._resident.get(key)
+            if model is not None:
+                self._resident.move_to_end(key)
+                CACHE_REQUESTS.inc(cache='model_registry', result='hit')
+                return model, version
+        CACHE_REQUESTS.inc(cache='model_registry', result='miss')
+
+        import joblib
+        path = os.path.join(self._kind_dir(city, kind), version, _MODEL_FILE)
+        try:
+            model = joblib.load(path, mmap_mode='c')
+        except FileNotFoundError:
+            return None, None
+        with self._lock:
+            self._remember(key, model)
+        return model, version
+
+    def _remember(self, key, model):
+        self._resident[key] = model
+        self._resident.move_to_end(key)
+        while len(self._resident) > self.max_resident:
+            self._resident.popitem(last=False)
+
+    def _prune(self, kind_dir, current):
+        """只保留最近 keep_versions 个版本，固定的版本不计入也不删除"""
+        names = sorted(name for name in os.listdir(kind_dir)
+                       if os.path.isdir(os.path.join(kind_dir, name)) and not name.startswith('.')
+                       and not os.path.exists(os.path.join(kind_dir, name, _PINNED_FILE)))
+        for name in names[:-self.keep_versions]:
+            if name != current:
+                shutil.rmtree(os.path.join(kind_dir, name), ignore_errors=True)
+
+    def resident_count(self):
+        with self._lock:
+            return len(self._resident)
+
+
+def get_registry():
+    """进程内共享的模型仓库"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry(config.MODEL_REGISTRY_DIR, config.MODEL_CACHE_SIZE,
+                                          config.MODEL_KEEP_VERSIONS)
+    return _registry
@@ -0,0 +1,33 @@
+"""
+绘图库的延迟加载
+
+matplotlib/seaborn 导入耗时较长，只在第一次绘图时加载，并在此时设置中文字体。
+"""
+import threading
+
+_lock = threading.Lock()
+_pyplot = None
+
+
+def get_pyplot():
+    """返回已配置好的 matplotlib.pyplot"""
+    global _pyplot
+    if _pyplot is None:
+        with _lock:
+            if _pyplot is None:
+                import matplotlib
+                matplotlib.use('Agg')
+                import matplotlib.pyplot as plt
+
+                # 设置中文字体
+                plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial Unicode MS']
+                plt.rcParams['axes.unicode_minus'] = False
+                _pyplot = plt
+    return _pyplot
+
+
+def get_seaborn():
+    """返回 seaborn（同时确保 pyplot 已配置）"""
+    get_pyplot()
+    import seaborn as sns
+    return sns
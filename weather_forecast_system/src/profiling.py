@@ -0,0 +1,204 @@
+"""
+按请求开启的性能剖析
+
+只有携带正确 X-Profile-Token 的请求（令牌由环境变量 WEATHER_PROFILE_TOKEN 配置，
+未配置时剖析功能关闭）才能通过 ?profile=cprofile|sample 或 X-Profile 请求头开启:
+    cprofile - 确定性剖析，保存为 .pstats（可用 snakeviz / pstats 查看）
+    sample   - 采样剖析，保存为折叠栈 .folded（可用 flamegraph.pl / speedscope 查看）
+
+剖析期间被 track_memory 标记的阶段会用 tracemalloc 记录峰值内存，保存为 .memory.json。
+"""
+import contextvars
+import cProfile
+import functools
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+
+from src.config import PROFILES_DIR, PROFILE_TOKEN
+
+PROFILE_MODES = ('cprofile', 'sample')
+SAMPLE_INTERVAL = 0.005
+
+_current_session = contextvars.ContextVar('profile_session', default=None)
+
+# tracemalloc 是进程级的：由第一个需要的会话开启、最后一个会话结束时关闭；
+# 峰值也只有一个，重置前先把当前峰值计入所有进行中的测量，各测量互不干扰
+_tracing_lock = threading.Lock()
+_tracing_sessions = 0
+_tracing_started = False  # 是否由本模块开启（PYTHONTRACEMALLOC 等外部开启的不关闭）
+_active_peaks = {}  # 进行中的测量 -> 测量期间观察到的最高内存
+
+
+def _acquire_tracing():
+    global _tracing_sessions, _tracing_started
+    with _tracing_lock:
+        if _tracing_sessions == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_started = True
+        _tracing_sessions += 1
+
+
+def _release_tracing():
+    global _tracing_sessions, _tracing_started
+    with _tracing_lock:
+        _tracing_sessions -= 1
+        if _tracing_sessions == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+
+
+def _fold_peak():
+    """把当前峰值计入进行中的测量后重置峰值，调用方需持有 _tracing_lock"""
+    current, peak = tracemalloc.get_traced_memory()
+    for key in _active_peaks:
+        _active_peaks[key] = max(_active_peaks[key], peak)
+    tracemalloc.reset_peak()
+    return current
+
+
+def is_authorized(token):
+    """校验剖析令牌，未配置令牌时一律拒绝"""
+    if not PROFILE_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode('utf-8'), PROFILE_TOKEN.encode('utf-8'))
+
+
+class _StackSampler(threading.Thread):
+    """定时采样目标线程的调用栈，按折叠栈格式计数"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class ProfileSession:
+    """一次请求的剖析会话"""
+
+    def __init__(self, mode, label):
+        self.mode = mode
+        self.label = label
+        self.profile_id = time.strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:8]
+        self.memory = {}
+        self._profiler = None
+        self._sampler = None
+        self._token = None
+        self._started_tracemalloc = False
+
+    def start(self):
+        self._token = _current_session.set(self)
+        if self.mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = _StackSampler(threading.get_ident())
+            self._sampler.start()
+        return self
+
+    def stop(self):
+        """停止剖析并写入文件，返回保存的文件列表"""
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        _current_session.reset(self._token)
+        if self._started_tracemalloc:
+            _release_tracing()
+            self._started_tracemalloc = False
+        return self._save()
+
+    def _save(self):
+        os.makedirs(PROFILES_DIR, exist_ok=True)
+        base = os.path.join(PROFILES_DIR, self.profile_id)
+        files = []
+        if self._profiler is not None:
+            self._profiler.dump_stats(base + '.pstats')
+            files.append(self.profile_id + '.pstats')
+        if self._sampler is not None:
+            with open(base + '.folded', 'w', encoding='utf-8') as f:
+                f.write(self._sampler.folded())
+            files.append(self.profile_id + '.folded')
+        if self.memory:
+            with open(base + '.memory.json', 'w', encoding='utf-8') as f:
+                json.dump({'label': self.label, 'phases': self.memory}, f, indent=2)
+            files.append(self.profile_id + '.memory.json')
+        print(f'剖析结果已保存: {", ".join(files)}')
+        return files
+
+    def record_memory(self, name, func, args, kwargs):
+        """
+        在 tracemalloc 下运行 func，记录峰值与净增内存
+
+        内存是进程级的统计，同时进行的其他请求的分配也会计入。
+        """
+        if not self._started_tracemalloc:
+            _acquire_tracing()
+            self._started_tracemalloc = True
+        key = object()
+        with _tracing_lock:
+            before = _fold_peak()
+            _active_peaks[key] = before
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with _tracing_lock:
+                after = _fold_peak()
+                peak = _active_peaks.pop(key)
+            self.memory[name] = {
+                'peak_bytes': peak - before,
+                'retained_bytes': after - before,
+            }
+
+    def memory_header(self):
+        """X-Profile-Memory 响应头，单位 MB"""
+        return ', '.join(
+            f'{name};peak={stats["peak_bytes"] / 1048576:.1f}MB' for name, stats in self.memory.items()
+        )
+
+
+def track_memory(name):
+    """装饰器：剖析会话进行中时记录被装饰函数的 tracemalloc 峰值内存"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            session = _current_session.get()
+            if session is None:
+                return func(*args, **kwargs)
+            return session.record_memory(name, func, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def profile_file_path(filename):
+    """剖析结果文件的完整路径，文件名不合法或不存在时返回 None"""
+    if os.path.basename(filename) != filename or not filename.startswith(tuple('0123456789')):
+        return None
+    path = os.path.join(PROFILES_DIR, filename)
+    return path if os.path.isfile(path) else None
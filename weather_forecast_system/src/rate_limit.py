@@ -0,0 +1,204 @@
+"""
+上游限流与配额管理
+
+每个上游（百度地图、Open-Meteo）一个 UpstreamLimiter:
+    - 令牌桶限制每秒请求数，令牌不足时排队等待，交互请求优先于批量任务
+    - 按自然日统计调用次数，超过每日预算后直接拒绝
+    - 上游返回配额超限时记录"已耗尽"状态直到重置时间，期间不再发出请求
+
+被拒绝的调用抛出 UpstreamThrottledError，由接口层转换为 429 响应，
+而不是静默地使用默认数据。
+"""
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from src.metrics import Counter
+
+INTERACTIVE = 0
+BATCH = 1
+
+QUOTA_USED = Counter(
+    'weather_upstream_quota_used_total', 'Upstream calls counted against the daily budget',
+    ['upstream'])
+THROTTLED = Counter(
+    'weather_upstream_throttled_total', 'Upstream calls rejected locally',
+    ['upstream', 'reason'])
+
+_current_priority = contextvars.ContextVar('upstream_priority', default=INTERACTIVE)
+
+
+class UpstreamThrottledError(Exception):
+    """上游调用被限流拒绝"""
+
+    def __init__(self, upstream, reason, retry_after):
+        super().__init__(f'{upstream} {reason}, retry after {retry_after:.0f}s')
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class QuotaExceededError(UpstreamThrottledError):
+    """上游配额已耗尽（本地预算用完或上游明确返回超限）"""
+
+
+@contextmanager
+def priority(level):
+    """在代码块内以指定优先级发出上游请求（如定时任务使用 BATCH）"""
+    token = _current_priority.set(level)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority():
+    return _current_priority.get()
+
+
+def _next_midnight(now=None):
+    now = now or datetime.now()
+    return datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+
+
+class TokenBucket:
+    """带优先级排队的令牌桶"""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiters = []  # (优先级, 序号)
+        self._seq = itertools.count()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, level=INTERACTIVE, timeout=None):
+        """取一个令牌；只有排在队首的等待者才能取，超时返回 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        entry = (level, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    self._refill()
+                    if self._waiters[0] == entry and self._tokens >= 1:
+                        self._tokens -= 1
+                        return True
+                    wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.05
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        wait = min(wait, remaining)
+                    self._cond.wait(max(wait, 0.001))
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+
+class UpstreamLimiter:
+    """单个上游的限流、每日预算与配额耗尽状态"""
+
+    def __init__(self, name, rate, burst, daily_limit, max_wait=None):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.daily_limit = daily_limit
+        self.max_wait = max_wait or {INTERACTIVE: 10.0, BATCH: 300.0}
+        self._lock = threading.Lock()
+        self._day = datetime.now().date()
+        self._used_today = 0
+        self._exhausted_until = None
+        self._exhausted_reason = None
+
+    def _check_exhausted(self):
+        with self._lock:
+            today = datetime.now().date()
+            if today != self._day:
+                self._day = today
+                self._used_today = 0
+            if self._exhausted_until is not None:
+                remaining = (self._exhausted_until - datetime.now()).total_seconds()
+                if remaining > 0:
+                    THROTTLED.inc(upstream=self.name, reason='exhausted')
+                    raise QuotaExceededError(self.name, self._exhausted_reason, remaining)
+                self._exhausted_until = None
+            if self.daily_limit and self._used_today >= self.daily_limit:
+                THROTTLED.inc(upstream=self.name, reason='daily_budget')
+                raise QuotaExceededError(self.name, 'daily budget used up',
+                                         (_next_midnight() - datetime.now()).total_seconds())
+
+    def acquire(self):
+        """发出请求前调用：检查配额状态并等待令牌"""
+        self._check_exhausted()
+        level = current_priority()
+        if not self.bucket.acquire(level, timeout=self.max_wait.get(level)):
+            THROTTLED.inc(upstream=self.name, reason='rate')
+            raise UpstreamThrottledError(self.name, 'rate limited', 1 / self.bucket.rate)
+        with self._lock:
+            self._used_today += 1
+        QUOTA_USED.inc(upstream=self.name)
+
+    def mark_exhausted(self, reason, until):
+        """记录上游返回的配额超限，until 之前的调用直接拒绝；返回对应的异常供调用方抛出"""
+        with self._lock:
+            self._exhausted_until = until
+            self._exhausted_reason = reason
+        print(f'{self.name} 配额超限（{reason}），{until:%Y-%m-%d %H:%M:%S} 前暂停请求')
+        return QuotaExceededError(self.name, reason, (until - datetime.now()).total_seconds())
+
+    def usage(self):
+        with self._lock:
+            return {
+                'used_today': self._used_today,
+                'daily_limit': self.daily_limit,
+                'exhausted_until': self._exhausted_until.isoformat() if self._exhausted_until else None,
+            }
+
+
+# ===================== 上游配额信号识别 =====================
+
+# 百度地图状态码：301 永久配额超限，302 天配额超限，401/402 并发超限
+_BAIDU_QUOTA_STATUS = {301: 'permanent quota exceeded', 302: 'daily quota exceeded'}
+_BAIDU_CONCURRENCY_STATUS = {401: 'concurrency exceeded', 402: 'concurrency exceeded'}
+
+
+def check_baidu_response(limiter, response):
+    """百度接口以 HTTP 200 + status 字段报告配额问题"""
+    try:
+        data = response.json()
+    except ValueError:
+        return
+    status = data.get('status') if isinstance(data, dict) else None
+    if status in _BAIDU_QUOTA_STATUS:
+        raise limiter.mark_exhausted(_BAIDU_QUOTA_STATUS[status], _next_midnight())
+    if status in _BAIDU_CONCURRENCY_STATUS:
+        raise limiter.mark_exhausted(_BAIDU_CONCURRENCY_STATUS[status], datetime.now() + timedelta(seconds=1))
+
+
+def check_open_meteo_response(limiter, response):
+    """Open-Meteo 超限时返回 HTTP 429，reason 说明是分钟/小时/日限额"""
+    if response.status_code != 429:
+        return
+    try:
+        reason = response.json().get('reason', '')
+    except ValueError:
+        reason = ''
+    now = datetime.now()
+    if 'Daily' in reason:
+        until = _next_midnight(now)
+    elif 'Hourly' in reason:
+        until = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    else:
+        until = now + timedelta(minutes=1)
+    raise limiter.mark_exhausted(reason or 'rate limit exceeded', until)
@@ -0,0 +1,430 @@
+"""
+跟踪城市的后台定时刷新
+
+对配置的城市（WEATHER_TRACKED_CITIES）每天在低峰时段（WEATHER_REFRESH_AT）执行
+（数据、模型与预报都按城市所在的网格单元保存，同一单元内的城市共用）:
+    1. 增量拉取上次之后的归档数据（与已有数据重叠几天，覆盖上游对近期数据的修正），
+       合并进该城市的本地数据；开启 HOURLY_INGEST 时按月分块采集逐小时数据写入
+       HourlyStore，日数据由逐小时数据汇总得到
+    2. ARIMA 用 results.append 接上新观测，每隔 REFRESH_REFIT_DAYS 天才完整重新拟合；
+       分类器在新的数据窗口上调参（CLASSIFIER_TUNING）并重新训练，两者都作为新版本存入模型仓库
+    3. 增量更新按年内日序的气候态索引（开启 HOURLY_INGEST 时覆盖逐小时存储中的全部年份），
+       模型缺失或预测失败时用常年值作为基准预报
+    4. 预先计算未来 7 天的官方预报、AI 温度与天气预测以及生活建议，并记入预报检验；
+       新到达的观测数据同时用于检验之前的预报；刷新进度与新预报通过 /api/events 推送
+
+每轮所有城市刷新完后，用逐小时存储中新增的日期增量更新跨城市的全局天气分类器。
+
+各城市的开始时间在抖动窗口内随机错开，上游请求以 BATCH 优先级发出。
+接口收到跟踪城市的请求时直接读取这里保存的结果，不再访问上游或训练模型。
+多 worker 部署时通过状态目录下的文件锁保证只有一个进程执行定时任务。
+"""
+import copy
+import os
+import random
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from src import config, events, metrics, skill_store
+from src.arima_model import TemperatureARIMA
+from src.climatology import Climatology
+from src.data_collector import (WeatherDataCollector, FEATURE_COLUMNS, add_anomaly_features,
+                                build_features, strip_features)
+from src.global_classifier import update_global_classifier
+from src.hourly_store import HourlyStore
+from src.model_registry import ARIMA, CLASSIFIER, get_registry
+from src.rate_limit import BATCH, priority
+from src.rule_engine import WeatherAdviceEngine
+from src.state_store import SharedState
+from src.weather_classifier import WeatherClassifier
+
+FORECAST_DAYS = 7
+ARIMA_ORDER = (1, 1, 1)
+
+_states = {}
+_states_lock = threading.Lock()
+_leader_lock_file = None
+
+
+def city_key(city):
+    """城市所在的网格单元键：同一单元内的城市共用本地数据、模型与预报"""
+    return WeatherDataCollector().cell_key(city)
+
+
+def is_tracked(city):
+    if not config.TRACKED_CITIES:
+        return False
+    return city_key(city) in {city_key(c) for c in config.TRACKED_CITIES}
+
+
+def city_state(city):
+    """城市所在网格单元的本地存储（每个单元一个状态目录）"""
+    key = city_key(city)
+    with _states_lock:
+        state = _states.get(key)
+        if state is None:
+            dirname = re.sub(r'[\\/:*?"<>|\s]+', '_', key)
+            state = _states[key] = SharedState(os.path.join(config.CITY_STATE_DIR, dirname), defaults={
+                'historical_data': None,
+                'climatology': None,
+                'forecast': None,
+                'refreshed_at': None
+            })
+        return state
+
+
+def stored_history(city, days):
+    """跟踪城市最近 days 天的数据；本地数据不够长时返回 None"""
+    frame = city_state(city)['historical_data']
+    if frame is None:
+        return None
+    start = pd.Timestamp(datetime.now().date() - timedelta(days=days))
+    if frame['date'].iloc[0] > start:
+        return None
+    return frame[frame['date'] >= start].reset_index(drop=True)
+
+
+def stored_forecast(city):
+    """跟踪城市当天预计算的预报，没有或已过期时返回 None"""
+    forecast = city_state(city)['forecast']
+    if forecast is None or forecast['generated_at'].date() != datetime.now().date():
+        return None
+    return forecast
+
+
+def stored_climatology(city):
+    """跟踪城市的气候态索引，尚未建立时返回 None"""
+    return city_state(city)['climatology']
+
+
+def arima_forecast(key, steps=FORECAST_DAYS):
+    """
+    模型仓库中 key 最新 ARIMA 模型的温度预测
+
+    预测从模型最后一天观测（meta['last_date']）的下一天开始，不一定与官方预报的日期相同。
+
+    返回:
+        (温度列表, 目标日期, 版本)；没有模型时返回 ([], None, None)，
+        元数据中没有最后观测日期时目标日期为 None
+    """
+    registry = get_registry()
+    arima, version = registry.load(key, ARIMA)
+    if arima is None:
+        return [], None, None
+    temperatures = [round(float(t), 1) for t in arima.forecast(steps=steps)]
+    meta = registry.metadata(key, ARIMA, version) or {}
+    dates = None
+    if meta.get('last_date'):
+        dates = pd.date_range(pd.Timestamp(meta['last_date']) + pd.Timedelta(days=1), periods=steps)
+    return temperatures, dates, version
+
+
+def _temperature_series(frame):
+    """按天连续的温度序列，缺失日期用插值补齐"""
+    series = frame.set_index('date')['temperature'].astype('float64').asfreq('D')
+    return series.interpolate(limit_direction='both')
+
+
+class CityRefresher:
+    """刷新单个城市的数据、模型与预报"""
+
+    def __init__(self, collector=None):
+        self.collector = collector or WeatherDataCollector()
+        self.advice_engine = WeatherAdviceEngine()
+        self.hourly_store = HourlyStore(config.HOURLY_STORE_DIR) if config.HOURLY_INGEST else None
+
+    def refresh(self, city):
+        """执行一次完整刷新，成功返回 True"""
+        key = city_key(city)
+        state = city_state(city)
+        start = time.perf_counter()
+        with priority(BATCH), events.training_progress(events.new_job_id(), city, 'refresh'), \
+                metrics.phase('refresh'):
+            frame = self._update_frame(city, key, state)
+            if frame is None:
+                print(f'{city} 刷新失败：没有可用数据')
+                return False
+            climatology = self._update_climatology(key, state, frame)
+            self._update_arima(key, frame)
+            self._update_classifier(key, frame, climatology)
+            self._precompute_forecast(city, key, state, frame, climatology)
+            state['refreshed_at'] = datetime.now()
+        print(f'{city} 刷新完成，用时 {time.perf_counter() - start:.1f}s')
+        return True
+
+    def update_global(self):
+        """增量更新全局天气分类器（需要开启逐小时采集）"""
+        if self.hourly_store is None:
+            return 0
+        with priority(BATCH):
+            return update_global_classifier(self.hourly_store)
+
+    def _update_frame(self, city, key, state):
+        """增量拉取归档数据并合并，只保留最近 REFRESH_HISTORY_DAYS 天"""
+        today = datetime.now().date()
+        stored = state['historical_data']
+        if self.hourly_store is not None:
+            new = self._daily_from_hourly(city, key, today)
+        else:
+            new = self._merge_daily(city, stored, today)
+        if new is None:
+            return stored
+        cutoff = pd.Timestamp(today - timedelta(days=config.REFRESH_HISTORY_DAYS))
+        new = new[new['date'] >= cutoff].reset_index(drop=True)
+        if len(new) == 0:
+            return stored
+
+        frame = build_features(new)
+        state['historical_data'] = frame
+        skill_store.verify_observations(key, frame)
+        return frame
+
+    def _merge_daily(self, city, stored, today):
+        """拉取上次之后的日数据并与已有数据合并"""
+        if stored is None:
+            start = today - timedelta(days=config.REFRESH_HISTORY_DAYS)
+        else:
+            start = stored['date'].iloc[-1].date() - timedelta(days=config.REFRESH_OVERLAP_DAYS)
+
+        new = self.collector.fetch_historical_data(city, start.isoformat(), today.isoformat())
+        if new is None:
+            return None
+        # 归档接口对最近几天可能还没有数据，丢掉后下次刷新通过重叠区间重新拉取
+        new = new[new['temperature'].notna()]
+        if stored is not None:
+            new = pd.concat([strip_features(stored), new], ignore_index=True)
+            new = new.drop_duplicates('date', keep='last').sort_values('date')
+        return new
+
+    def _daily_from_hourly(self, city, key, today):
+        """增量采集逐小时数据，再从分区存储汇总出日数据"""
+        last = self.hourly_store.last_timestamp(key)
+        if last is None:
+            start = today - timedelta(days=config.REFRESH_HISTORY_DAYS)
+        else:
+            start = last.date() - timedelta(days=config.REFRESH_OVERLAP_DAYS)
+        self.collector.ingest_hourly(city, start, today, self.hourly_store)
+        with metrics.phase('daily_aggregate'):
+            return self.hourly_store.daily_aggregates(
+                key, today - timedelta(days=config.REFRESH_HISTORY_DAYS), today)
+
+    def _update_climatology(self, key, state, frame):
+        """把新日期累加进气候态索引；开启逐小时采集时逐月读取全部已存储的年份"""
+        climatology = state['climatology'] or Climatology()
+        added = 0
+        with metrics.phase('climatology'):
+            if self.hourly_store is not None:
+                through = climatology.through
+                for year, month in self.hourly_store.months(key):
+                    if through is not None and (year, month) < (through.year, through.month):
+                        continue
+                    start = pd.Timestamp(year=year, month=month, day=1)
+                    added += climatology.add(self.hourly_store.daily_aggregates(
+                        key, start, start + pd.offsets.MonthEnd(0)))
+            else:
+                added = climatology.add(frame)
+        if added:
+            state['climatology'] = climatology
+        return climatology
+
+    def _update_arima(self, key, frame):
+        """新观测接到已有模型上；模型不存在或到期时完整重新拟合"""
+        registry = get_registry()
+        series = _temperature_series(frame)
+        today = datetime.now().date()
+        model, _ = registry.load(key, ARIMA)
+        meta = registry.metadata(key, ARIMA) if model is not None else None
+        results = None
+        fitted_on = None
+        if meta is not None and (today - date.fromisoformat(meta['fitted_on'])).days < config.REFRESH_REFIT_DAYS:
+            new = series[series.index > pd.Timestamp(meta['last_date'])]
+            if len(new) == 0:
+                return
+            try:
+                with metrics.phase('arima_append'):
+                    results = model.append(new, refit=False)
+                fitted_on = date.fromisoformat(meta['fitted_on'])
+            except Exception as e:
+                print(f'ARIMA 增量更新失败: {e}，重新拟合')
+
+        if results is None:
+            with metrics.phase('arima_fit'):
+                results = TemperatureARIMA().train(series, order=ARIMA_ORDER)
+            if results is None:
+                return
+            fitted_on = today
+
+        registry.save(key, ARIMA, results, meta={
+            'source': 'refresh',
+            'order': list(ARIMA_ORDER),
+            'fitted_on': fitted_on.isoformat(),
+            'last_date': series.index[-1].strftime('%Y-%m-%d')
+        })
+
+    def _update_classifier(self, key, frame, climatology):
+        """
+        在当前数据窗口上重新训练天气分类器，开启 CLASSIFIER_TUNING 时先调参
+
+        温度距平相对于该网格单元保存的气候态计算，模型保存同一份气候态供预测使用。
+        """
+        classifier = WeatherClassifier()
+        classifier.climatology = copy.deepcopy(climatology)  # 共享状态中的气候态之后还会增量更新
+        X = add_anomaly_features(frame.copy(), climatology)[FEATURE_COLUMNS]
+        tuning = None
+        if config.CLASSIFIER_TUNING:
+            with metrics.phase('classifier_tune'):
+                tuning = classifier.tune(X, frame['weather_type'])
+        with metrics.phase('classifier_fit'):
+            classifier.train(X, frame['weather_type'])
+        if classifier.fitted_models:
+            get_registry().save(key, CLASSIFIER, classifier, meta={
+                'source': 'refresh',
+                'feature_columns': FEATURE_COLUMNS,
+                'rows': len(frame),
+                'last_date': frame['date'].iloc[-1].strftime('%Y-%m-%d'),
+                'tuning': tuning
+            })
+
+    def _precompute_forecast(self, city, key, state, frame, climatology):
+        """预计算官方预报、AI 温度与天气预测以及每日建议，模型缺失时用气候态基准补齐"""
+        registry = get_registry()
+        official = self.collector.fetch_forecast_data(city, days=FORECAST_DAYS)
+        ai_temperature, ai_temperature_dates, _ = arima_forecast(key)
+        classifier, _ = registry.load(key, CLASSIFIER)
+        ai_weather = []
+        if classifier is not None and official is not None:
+            ai_weather = classifier.predict_frame(official, history=frame) or []
+
+        skill_store.log_forecasts(key, official, ai_temperature, ai_weather, ai_temperature_dates)
+        dates = official['date'] if official is not None else \
+            pd.date_range(frame['date'].iloc[-1] + pd.Timedelta(days=1), periods=FORECAST_DAYS)
+        baseline = climatology.baseline(dates)
+        fallbacks = []
+        if baseline is not None:
+            if len(ai_temperature) < FORECAST_DAYS:
+                ai_temperature = baseline['temperature']
+                fallbacks.append('ai_temperature')
+            if len(ai_weather) < FORECAST_DAYS:
+                ai_weather = baseline['weather_type']
+                fallbacks.append('ai_weather')
+            flagged = climatology.check(dates, ai_temperature)
+            if flagged:
+                print(f'{city} 的 AI 温度预测偏离常年值过多: 第 {flagged} 天')
+
+        advice = []
+        if official is not None:
+            advice = self.advice_engine.generate_advice({
+                row.date.strftime('%Y-%m-%d'): {
+                    'temperature': float(row.temperature),
+                    'weather_type': str(row.weather_type)
+                }
+                for row in official.itertuples()
+            })
+
+        generated_at = datetime.now()
+        state['forecast'] = {
+            'generated_at': generated_at,
+            'official': official,
+            'ai_temperature': ai_temperature,
+            'ai_temperature_dates': ai_temperature_dates if 'ai_temperature' not in fallbacks else None,
+            'ai_weather': ai_weather,
+            'climatology_fallbacks': fallbacks,
+            'advice': advice
+        }
+        events.publish(events.FORECAST, {
+            'city': city,
+            'cell': key,
+            'generated_at': generated_at.isoformat(timespec='seconds'),
+            'dates': [d.strftime('%Y-%m-%d') for d in official['date']] if official is not None else [],
+            'ai_temperature': ai_temperature,
+            'ai_weather': ai_weather
+        })
+
+
+class RefreshScheduler(threading.Thread):
+    """每天在 refresh_at 刷新所有跟踪城市，各城市开始时间随机错开"""
+
+    def __init__(self, cities, refresher=None, refresh_at='03:00', jitter=1800.0):
+        super().__init__(name='city-refresh', daemon=True)
+        self.cities = list(cities)
+        self.refresher = refresher or CityRefresher()
+        self.refresh_at = datetime.strptime(refresh_at, '%H:%M').time()
+        self.jitter = jitter
+        self._stop_event = threading.Event()
+
+    def _last_scheduled(self, now):
+        scheduled = datetime.combine(now.date(), self.refresh_at)
+        return scheduled if scheduled <= now else scheduled - timedelta(days=1)
+
+    def run(self):
+        # 启动时先补齐从未刷新或错过了上一次定时刷新的城市
+        last = self._last_scheduled(datetime.now())
+        stale = [c for c in self.cities
+                 if city_state(c)['refreshed_at'] is None or city_state(c)['refreshed_at'] < last]
+        self._run_cycle(stale, jitter=min(self.jitter, 60.0))
+
+        while not self._stop_event.is_set():
+            next_run = self._last_scheduled(datetime.now()) + timedelta(days=1)
+            if self._stop_event.wait((next_run - datetime.now()).total_seconds()):
+                break
+            self._run_cycle(self.cities, jitter=self.jitter)
+
+    def _run_cycle(self, cities, jitter):
+        """在 jitter 秒内随机错开地刷新各城市，同一网格单元只刷新一次"""
+        offsets = sorted(random.uniform(0, jitter) for _ in cities)
+        cities = random.sample(cities, len(cities))
+        refreshed = set()
+        elapsed = 0.0
+        for city, offset in zip(cities, offsets):
+            if self._stop_event.wait(max(0.0, offset - elapsed)):
+                return
+            started = time.perf_counter()
+            try:
+                key = city_key(city)
+                if key in refreshed:
+                    continue
+                refreshed.add(key)
+                self.refresher.refresh(city)
+            except Exception as e:
+                print(f'{city} 刷新失败: {e}')
+            elapsed = offset + (time.perf_counter() - started)
+        try:
+            self.refresher.update_global()
+        except Exception as e:
+            print(f'全局天气分类器更新失败: {e}')
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def _acquire_leader_lock():
+    """多进程部署时只让一个进程运行定时任务（Windows 单进程部署无需加锁）"""
+    global _leader_lock_file
+    try:
+        import fcntl
+    except ImportError:
+        return True
+    os.makedirs(config.STATE_DIR, exist_ok=True)
+    lock_file = open(os.path.join(config.STATE_DIR, 'refresh.lock'), 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _leader_lock_file = lock_file  # 进程存活期间一直持有
+    return True
+
+
+def start_refresh_scheduler():
+    """配置了跟踪城市且本进程获得锁时启动定时刷新，返回线程对象或 None"""
+    if not config.TRACKED_CITIES or not _acquire_leader_lock():
+        return None
+    scheduler = RefreshScheduler(config.TRACKED_CITIES, refresh_at=config.REFRESH_AT,
+                                 jitter=config.REFRESH_JITTER)
+    scheduler.start()
+    print(f'定时刷新已启动: {", ".join(config.TRACKED_CITIES)}，每天 {config.REFRESH_AT}')
+    return scheduler
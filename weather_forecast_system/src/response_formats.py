@@ -0,0 +1,193 @@
+"""
+响应格式协商与压缩
+
+支持的表格数据格式:
+    records  - 逐行 JSON（默认，兼容旧前端）
+    columnar - 按列 JSON，列名只出现一次
+    arrow    - Apache Arrow IPC 流
+    parquet  - Apache Parquet 文件
+
+客户端可通过 ?format=<name> 查询参数或 Accept 请求头选择格式。
+"""
+import gzip
+import io
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from flask import Response, jsonify
+
+from src.metrics import SERIALIZATION_SECONDS, record_phase
+
+FORMAT_MIMETYPES = {
+    'records': 'application/json',
+    'columnar': 'application/vnd.weather.columnar+json',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# 已经自带压缩或压缩收益很小的类型，不再做传输压缩
+_PRECOMPRESSED_MIMETYPES = {FORMAT_MIMETYPES['parquet']}
+
+# 小于该字节数的响应不压缩
+MIN_COMPRESS_SIZE = 1024
+
+# 写入 Arrow/Parquet schema 元数据中的键，保存非表格字段（城市、分布等）
+META_KEY = b'weather_meta'
+
+
+def negotiate_format(req, default='records'):
+    """根据查询参数或 Accept 请求头确定响应格式，无法识别时返回 None"""
+    fmt = req.args.get('format')
+    if fmt:
+        fmt = fmt.lower()
+        return fmt if fmt in FORMAT_MIMETYPES else None
+
+    # 浏览器通常发送 */* 或 application/json，此时保持默认格式
+    mimetypes = [FORMAT_MIMETYPES[default]] + [
+        m for k, m in FORMAT_MIMETYPES.items() if k != default
+    ]
+    best = req.accept_mimetypes.best_match(mimetypes, default=FORMAT_MIMETYPES[default])
+    for name, mimetype in FORMAT_MIMETYPES.items():
+        if mimetype == best:
+            return name
+    return default
+
+
+def _column_to_list(series):
+    """将一列转换为可 JSON 序列化的列表（日期格式化为 YYYY-MM-DD，带时刻时为 YYYY-MM-DDTHH:MM，缺失值为 None）"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        has_time = (series.dt.normalize() != series).any()
+        values = series.dt.strftime('%Y-%m-%dT%H:%M' if has_time else '%Y-%m-%d')
+    elif isinstance(series.dtype, pd.CategoricalDtype):
+        values = series.astype(object)
+    elif pd.api.types.is_float_dtype(series) and series.dtype != np.float64:
+        # float32 直接转 Python float 会带出多余的尾数，先按存储精度舍入
+        values = series.astype(np.float64).round(4)
+    else:
+        values = series
+    return values.astype(object).where(series.notna(), None).tolist()
+
+
+def frame_to_columns(df, rename=None):
+    """DataFrame 转为按列字典: {列名: [值, ...]}"""
+    rename = rename or (lambda name: name)
+    return {rename(col): _column_to_list(df[col]) for col in df.columns}
+
+
+def frame_to_records(df, rename=None):
+    """DataFrame 转为逐行字典列表，日期格式与按列格式保持一致"""
+    columns = frame_to_columns(df, rename)
+    names = list(columns.keys())
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+def _frame_to_arrow_table(df, meta):
+    """DataFrame 转为 Arrow Table，并把附加字段写入 schema 元数据"""
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[META_KEY] = json.dumps(meta, ensure_ascii=False, default=str).encode('utf-8')
+    return table.replace_schema_metadata(metadata)
+
+
+def frame_to_arrow(df, meta=None):
+    """序列化为 Arrow IPC 流字节"""
+    import pyarrow as pa
+
+    table = _frame_to_arrow_table(df, meta or {})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def frame_to_parquet(df, meta=None):
+    """序列化为 Parquet 字节"""
+    import pyarrow.parquet as pq
+
+    table = _frame_to_arrow_table(df, meta or {})
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, compression='zstd')
+    return buffer.getvalue()
+
+
+def frame_response(df, fmt, meta, data_key, rename=None, records=None):
+    """
+    按协商格式构建表格数据响应
+
+    参数:
+        df: 要返回的 DataFrame
+        fmt: negotiate_format 的结果
+        meta: 与表格一起返回的其他字段（JSON 格式直接合并，二进制格式写入元数据）
+        data_key: JSON 响应中存放表格数据的字段名
+        rename: 列名转换函数（如转驼峰）
+        records: records 格式下使用的现成数据，缺省时由 df 生成
+    """
+    start = time.perf_counter()
+    response = _build_frame_response(df, fmt, meta, data_key, rename, records)
+    elapsed = time.perf_counter() - start
+    SERIALIZATION_SECONDS.observe(elapsed, format=fmt)
+    record_phase('serialize', elapsed, observe=False)
+    return response
+
+
+def _build_frame_response(df, fmt, meta, data_key, rename, records):
+    if fmt in ('arrow', 'parquet'):
+        if rename is not None:
+            df = df.rename(columns=rename)
+        body = frame_to_arrow(df, meta) if fmt == 'arrow' else frame_to_parquet(df, meta)
+        return Response(body, mimetype=FORMAT_MIMETYPES[fmt])
+
+    if fmt == 'columnar':
+        payload = dict(meta)
+        payload['layout'] = 'columnar'
+        payload[data_key] = frame_to_columns(df, rename)
+        response = jsonify(payload)
+        response.mimetype = FORMAT_MIMETYPES['columnar']
+        return response
+
+    payload = dict(meta)
+    payload[data_key] = records if records is not None else frame_to_records(df, rename)
+    return jsonify(payload)
+
+
+def _brotli():
+    """brotli 为可选依赖，未安装时只提供 gzip"""
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+def compress_response(response, accept_encodings):
+    """根据 Accept-Encoding 对响应体进行 br/gzip 压缩"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code >= 300
+            or 'Content-Encoding' in response.headers
+            or response.mimetype in _PRECOMPRESSED_MIMETYPES):
+        return response
+
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_SIZE:
+        return response
+
+    brotli = _brotli()
+    if brotli is not None and accept_encodings['br']:
+        response.set_data(brotli.compress(body, quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif accept_encodings['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    # 压缩后的字节与原始表示不同，ETag 降为弱校验（If-None-Match 按弱比较匹配）
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
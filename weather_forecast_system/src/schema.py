@@ -0,0 +1,63 @@
+"""
+天气数据表结构
+
+normalize_weather_frame 统一列类型：测量值为 float32，日历字段为 int8/int16，
+weather_type 为 Categorical。所有进入 system_data 或缓存的 DataFrame 都应先经过它。
+"""
+import numpy as np
+import pandas as pd
+
+# 天气类型类别，顺序即分类编码
+WEATHER_TYPES = ['sunny', 'cloudy', 'foggy', 'rain', 'freezing_rain', 'snow', 'thunderstorm', 'unknown']
+
+WEATHER_TYPE_DTYPE = pd.CategoricalDtype(WEATHER_TYPES)
+
+MEASUREMENT_COLUMNS = [
+    'temperature', 'temp_max', 'temp_min', 'humidity', 'rainfall',
+    'rain_probability', 'wind_speed', 'pressure',
+    'temp_lag_1', 'temp_mean_3', 'temp_mean_7', 'temp_anomaly',
+]
+
+CALENDAR_DTYPES = {
+    'year': np.int16,
+    'month': np.int8,
+    'day': np.int8,
+    'weekday': np.int8,
+    'is_weekend': np.int8,
+}
+
+REQUIRED_COLUMNS = ['date']
+
+
+def normalize_weather_frame(df):
+    """
+    按统一表结构转换列类型，返回新的 DataFrame
+
+    缺少必需列时抛出 ValueError；不认识的列保持原样。
+    """
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f'Weather frame missing columns: {missing}')
+
+    dtypes = {}
+    for col in MEASUREMENT_COLUMNS:
+        if col in df.columns:
+            dtypes[col] = np.float32
+    for col, dtype in CALENDAR_DTYPES.items():
+        if col in df.columns:
+            dtypes[col] = dtype
+    if 'weather_code' in df.columns:
+        # 天气代码 0-99，有缺失值时退回 float32
+        dtypes['weather_code'] = np.float32 if df['weather_code'].isna().any() else np.int8
+    if 'weather_type' in df.columns:
+        dtypes['weather_type'] = WEATHER_TYPE_DTYPE
+
+    df = df.astype(dtypes)
+    if not pd.api.types.is_datetime64_any_dtype(df['date']):
+        df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def frame_memory_usage(df):
+    """DataFrame 实际占用的字节数（包含字符串等对象）"""
+    return int(df.memory_usage(deep=True).sum())
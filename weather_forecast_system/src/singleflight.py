@@ -0,0 +1,64 @@
+"""
+请求合并（single-flight）
+
+同一时刻对同一个键的多个调用只真正执行一次，其余调用等待并共享结果（或异常）。
+用于合并相同参数的上游请求，避免同一城市被大量用户同时打开时重复请求百度/Open-Meteo。
+"""
+import threading
+
+from src.metrics import Counter
+
+SINGLEFLIGHT_CALLS = Counter(
+    'weather_singleflight_calls_total', 'Single-flight calls by role (leader executes, follower waits)',
+    ['group', 'role'])
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """按键合并并发调用，只在进程内有效"""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        执行 fn(*args, **kwargs)，同键的并发调用共享同一次执行
+
+        返回:
+            (result, shared): shared 为 True 表示结果来自其他调用者的执行，
+            调用方若会修改结果（如 DataFrame），应先复制
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            SINGLEFLIGHT_CALLS.inc(group=self.name, role='follower')
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        SINGLEFLIGHT_CALLS.inc(group=self.name, role='leader')
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
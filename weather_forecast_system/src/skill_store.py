@@ -0,0 +1,247 @@
+"""
+预报检验：官方预报与 AI 预测的累计误差
+
+每天发出的预报按 (城市, 目标日期, 提前天数, 来源) 记入待检验表；对应日期的归档数据到达后，
+把误差累加到 (城市, 提前天数, 来源) 的累加器中（样本数、误差和、绝对误差和、平方误差和、
+天气类型命中数），并删除已检验的预报。每条预报只处理一次，更新为 O(1)；
+/api/skill 直接由累加器计算 MAE、偏差、RMSE 与天气类型准确率，不需要回看历史。
+
+数据保存在 SQLite（WAL 模式）中，多个 worker 进程可以同时读写。
+"""
+import contextlib
+import math
+import os
+import sqlite3
+import threading
+from datetime import date
+
+import pandas as pd
+
+from src import config
+
+OFFICIAL = 'official'
+AI = 'ai'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending_forecasts (
+    city TEXT NOT NULL,
+    target_date TEXT NOT NULL,
+    lead_days INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    temperature REAL,
+    weather_type TEXT,
+    issued_on TEXT NOT NULL,
+    PRIMARY KEY (city, target_date, lead_days, source)
+);
+CREATE TABLE IF NOT EXISTS skill (
+    city TEXT NOT NULL,
+    lead_days INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    n INTEGER NOT NULL DEFAULT 0,
+    sum_error REAL NOT NULL DEFAULT 0,
+    sum_abs_error REAL NOT NULL DEFAULT 0,
+    sum_sq_error REAL NOT NULL DEFAULT 0,
+    n_type INTEGER NOT NULL DEFAULT 0,
+    n_type_correct INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (city, lead_days, source)
+);
+"""
+
+_UPSERT_SKILL = """
+INSERT INTO skill (city, lead_days, source, n, sum_error, sum_abs_error, sum_sq_error, n_type, n_type_correct)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (city, lead_days, source) DO UPDATE SET
+    n = n + excluded.n,
+    sum_error = sum_error + excluded.sum_error,
+    sum_abs_error = sum_abs_error + excluded.sum_abs_error,
+    sum_sq_error = sum_sq_error + excluded.sum_sq_error,
+    n_type = n_type + excluded.n_type,
+    n_type_correct = n_type_correct + excluded.n_type_correct
+"""
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _city_key(city):
+    return city.strip().lower()
+
+
+def _as_float(value):
+    """有限数值转为 float，缺失或非数值返回 None"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+class SkillStore:
+    """预报检验的待检验表与累加器"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """打开连接，代码块正常结束时提交事务，最后关闭连接"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def log_forecast(self, city, source, dates, temperatures=None, weather_types=None, issued_on=None):
+        """
+        记录一次预报，同一天对同一目标日期的重复预报以最后一次为准
+
+        参数:
+            dates: 目标日期序列
+            temperatures / weather_types: 与 dates 对应的预测值，可缺省
+        """
+        issued_on = issued_on or date.today()
+        n = len(dates)
+        temperatures = list(temperatures)[:n] if temperatures is not None else []
+        weather_types = list(weather_types)[:n] if weather_types is not None else []
+        temperatures += [None] * (n - len(temperatures))
+        weather_types += [None] * (n - len(weather_types))
+        rows = []
+        for target, temperature, weather_type in zip(dates, temperatures, weather_types):
+            target = pd.Timestamp(target).date()
+            lead = (target - issued_on).days
+            temperature = _as_float(temperature)
+            if weather_type is not None and pd.isna(weather_type):
+                weather_type = None
+            if lead < 0 or (temperature is None and weather_type is None):
+                continue
+            rows.append((_city_key(city), target.isoformat(), lead, source, temperature,
+                         str(weather_type) if weather_type is not None else None, issued_on.isoformat()))
+        if not rows:
+            return 0
+        with self._connect() as conn:
+            conn.executemany('INSERT OR REPLACE INTO pending_forecasts VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        return len(rows)
+
+    def verify(self, city, observed):
+        """
+        用到达的观测数据检验待检验的预报，更新累加器并删除已检验的预报
+
+        observed 为包含 date、temperature、weather_type 的日数据，返回检验的预报条数。
+        """
+        if observed is None or len(observed) == 0:
+            return 0
+        key = _city_key(city)
+        frame = observed[observed['temperature'].notna()]
+        actual = {
+            d.strftime('%Y-%m-%d'): (float(t), str(w) if w is not None and not pd.isna(w) else None)
+            for d, t, w in zip(frame['date'], frame['temperature'], frame.get('weather_type', [None] * len(frame)))
+        }
+        if not actual:
+            return 0
+        first, last = min(actual), max(actual)
+        with self._connect() as conn:
+            pending = conn.execute(
+                'SELECT target_date, lead_days, source, temperature, weather_type FROM pending_forecasts '
+                'WHERE city = ? AND target_date BETWEEN ? AND ?', (key, first, last)
+            ).fetchall()
+            verified = []
+            for target, lead, source, temperature, weather_type in pending:
+                if target not in actual:
+                    continue
+                actual_temperature, actual_type = actual[target]
+                n = sum_error = sum_abs = sum_sq = 0
+                if temperature is not None:
+                    error = temperature - actual_temperature
+                    n, sum_error, sum_abs, sum_sq = 1, error, abs(error), error * error
+                n_type = int(weather_type is not None and actual_type is not None)
+                correct = int(n_type and weather_type == actual_type)
+                conn.execute(_UPSERT_SKILL, (key, lead, source, n, sum_error, sum_abs, sum_sq, n_type, correct))
+                verified.append((key, target, lead, source))
+            conn.executemany('DELETE FROM pending_forecasts WHERE city = ? AND target_date = ? '
+                             'AND lead_days = ? AND source = ?', verified)
+        return len(verified)
+
+    def skill(self, city=None, source=None, lead_days=None):
+        """按城市、提前天数、来源汇总的检验指标"""
+        where, params = [], []
+        for column, value in (('city', _city_key(city) if city else None), ('source', source),
+                              ('lead_days', lead_days)):
+            if value is not None:
+                where.append(f'{column} = ?')
+                params.append(value)
+        sql = 'SELECT city, lead_days, source, n, sum_error, sum_abs_error, sum_sq_error, n_type, n_type_correct ' \
+              'FROM skill' + (' WHERE ' + ' AND '.join(where) if where else '') + ' ORDER BY city, source, lead_days'
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [{
+            'city': city_key,
+            'lead_days': lead,
+            'source': src,
+            'samples': n,
+            'mae': round(sum_abs / n, 3) if n else None,
+            'bias': round(sum_error / n, 3) if n else None,
+            'rmse': round(math.sqrt(sum_sq / n), 3) if n else None,
+            'weather_samples': n_type,
+            'weather_accuracy': round(n_correct / n_type, 4) if n_type else None
+        } for city_key, lead, src, n, sum_error, sum_abs, sum_sq, n_type, n_correct in rows]
+
+    def pending_count(self, city=None):
+        with self._connect() as conn:
+            if city:
+                return conn.execute('SELECT COUNT(*) FROM pending_forecasts WHERE city = ?',
+                                    (_city_key(city),)).fetchone()[0]
+            return conn.execute('SELECT COUNT(*) FROM pending_forecasts').fetchone()[0]
+
+
+def get_store():
+    """进程内共享的预报检验存储"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SkillStore(config.SKILL_DB_PATH)
+    return _store
+
+
+def log_forecasts(city, official, ai_temperature=None, ai_weather=None, ai_temperature_dates=None):
+    """
+    记录官方预报（DataFrame）与 AI 温度/天气预测
+
+    AI 天气类型按官方预报的日期排列；ARIMA 温度预测从模型最后一天观测的下一天开始，
+    其目标日期由 ai_temperature_dates 给出，缺省时不记录温度预测。
+    官方预报获取失败（None 或空表）时只跳过官方预报与按其日期排列的 AI 天气，AI 温度照常记录。
+    检验失败不应影响预报接口，出错时只打印日志。
+    """
+    has_official = official is not None and hasattr(official, 'columns') and len(official) > 0
+    try:
+        store = get_store()
+        dates = list(official['date']) if has_official else []
+        if has_official:
+            store.log_forecast(city, OFFICIAL, dates, official.get('temperature'), official.get('weather_type'))
+        # 同一目标日期的 AI 温度与天气合并为一行，分开写入时后一次会覆盖前一次
+        ai = {}
+        if ai_temperature and ai_temperature_dates is not None:
+            for target, temperature in zip(ai_temperature_dates, ai_temperature):
+                ai.setdefault(pd.Timestamp(target).normalize(), [None, None])[0] = temperature
+        if ai_weather:
+            for target, weather_type in zip(dates, ai_weather):
+                ai.setdefault(pd.Timestamp(target).normalize(), [None, None])[1] = weather_type
+        if ai:
+            targets = sorted(ai)
+            store.log_forecast(city, AI, targets, [ai[t][0] for t in targets], [ai[t][1] for t in targets])
+    except (sqlite3.Error, OSError, ValueError) as e:
+        print(f'记录 {city} 的预报失败: {e}')
+
+
+def verify_observations(city, observed):
+    """用新到达的观测数据检验 city 的预报，出错时只打印日志"""
+    try:
+        return get_store().verify(city, observed)
+    except (sqlite3.Error, OSError, ValueError) as e:
+        print(f'检验 {city} 的预报失败: {e}')
+        return 0
@@ -0,0 +1,204 @@
+"""
+跨进程共享的系统状态
+
+多 worker 部署时每个进程各有一份内存，一个 worker 采集的数据另一个 worker 看不到。
+SharedState 把每个键保存为状态目录下的一个 pickle 文件：写入时原子替换，
+读取时按文件的修改时间与大小判断是否需要重新加载，未变化时直接返回进程内缓存。
+
+DataFrame 值单独写成一个带版本号的 Arrow IPC 文件（<键>.<版本>.arrow），pickle 文件里只保存
+指向它的引用。各进程通过内存映射零拷贝地读取，数据页由操作系统页缓存共享，
+worker 数量增加时常驻内存不随之成倍增长。写入新版本不会覆盖旧文件，
+仍在使用旧版本的进程不受影响；只保留最近两个版本。读取时引用指向的版本已被清理，
+说明引用已被替换为更新的版本，重新读取引用即可。
+
+单个键的写入是原子的；读-改-写（如追加版本记录）要放在 locked() 中，
+它在状态目录下的锁文件上加 fcntl.flock，多个 worker 进程之间互斥。
+"""
+import contextlib
+import glob
+import os
+import pickle
+import tempfile
+import threading
+import uuid
+
+import pandas as pd
+
+# 每个键保留的 Arrow 文件版本数（当前版本 + 可能仍被其他进程映射的上一版本）
+KEEP_FRAME_VERSIONS = 2
+
+
+# 读取时引用的文件被并发写入替换、删除的重试次数
+_READ_ATTEMPTS = 5
+
+_LOCK_FILE = '.lock'
+
+
+class _ArrowFrame:
+    """pickle 文件中指向 Arrow 数据文件的引用"""
+
+    def __init__(self, filename):
+        self.filename = filename
+
+
+class SharedState:
+    """类字典接口的共享状态，键为字符串，值需可 pickle"""
+
+    def __init__(self, state_dir, defaults=None):
+        self.state_dir = state_dir
+        self.defaults = dict(defaults or {})
+        self._cache = {}  # key -> (文件签名, 值)
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._lock_file = None
+        os.makedirs(state_dir, exist_ok=True)
+
+    @contextlib.contextmanager
+    def locked(self):
+        """跨进程的独占锁，用于包住读-改-写；同一线程内可重入（Windows 上只在进程内互斥）"""
+        with self._lock:
+            if self._lock_depth == 0:
+                self._lock_file = self._acquire_file_lock()
+            self._lock_depth += 1
+            try:
+                yield self
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and self._lock_file is not None:
+                    self._lock_file.close()  # 关闭文件即释放 flock
+                    self._lock_file = None
+
+    def _acquire_file_lock(self):
+        try:
+            import fcntl
+        except ImportError:
+            return None
+        lock_file = open(os.path.join(self.state_dir, _LOCK_FILE), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        except BaseException:
+            lock_file.close()
+            raise
+        return lock_file
+
+    def _path(self, key):
+        return os.path.join(self.state_dir, f'{key}.pkl')
+
+    def _write_frame(self, key, df):
+        """把 DataFrame 写成新版本的 Arrow 文件，返回文件名"""
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        filename = f'{key}.{uuid.uuid4().hex[:12]}.arrow'
+        fd, tmp_path = tempfile.mkstemp(dir=self.state_dir, prefix=f'.{key}.', suffix='.tmp')
+        os.close(fd)
+        try:
+            with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(tmp_path, os.path.join(self.state_dir, filename))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return filename
+
+    def _map_frame(self, filename):
+        """内存映射 Arrow 文件并零拷贝地转换为 DataFrame"""
+        import pyarrow as pa
+
+        source = pa.memory_map(os.path.join(self.state_dir, filename), 'r')
+        table = pa.ipc.open_file(source).read_all()
+        # split_blocks 避免合并同类型列时复制，数值列直接引用映射的内存
+        return table.to_pandas(split_blocks=True)
+
+    def _remove_old_frames(self, key, keep=KEEP_FRAME_VERSIONS):
+        """删除较旧的 Arrow 版本；Windows 上仍被映射的文件删不掉，留到下次"""
+        paths = sorted(glob.glob(os.path.join(glob.escape(self.state_dir), f'{glob.escape(key)}.*.arrow')),
+                       key=os.path.getmtime)
+        for path in paths[:-keep] if keep else paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _signature(path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def __getitem__(self, key):
+        path = self._path(key)
+        with self._lock:
+            for _ in range(_READ_ATTEMPTS):
+                signature = self._signature(path)
+                if signature is None:
+                    if key in self.defaults:
+                        return self.defaults[key]
+                    raise KeyError(key)
+                cached = self._cache.get(key)
+                if cached is not None and cached[0] == signature:
+                    return cached[1]
+                try:
+                    with open(path, 'rb') as f:
+                        value = pickle.load(f)
+                    if isinstance(value, _ArrowFrame):
+                        value = self._map_frame(value.filename)
+                except FileNotFoundError:
+                    # 读取期间被其他进程删除或替换：指向的 Arrow 版本已被清理时，
+                    # 引用文件也已指向更新的版本，重新读取引用
+                    self._cache.pop(key, None)
+                    continue
+                self._cache[key] = (signature, value)
+                return value
+            return self.defaults.get(key)
+
+    def __setitem__(self, key, value):
+        path = self._path(key)
+        with self._lock:
+            payload = value
+            if isinstance(value, pd.DataFrame):
+                payload = _ArrowFrame(self._write_frame(key, value))
+            fd, tmp_path = tempfile.mkstemp(dir=self.state_dir, prefix=f'.{key}.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            if isinstance(payload, _ArrowFrame):
+                # 写入方也改用映射的版本，不再保留自己的私有副本
+                value = self._map_frame(payload.filename)
+                self._remove_old_frames(key)
+            else:
+                self._remove_old_frames(key, keep=0)
+            self._cache[key] = (self._signature(path), value)
+
+    def __delitem__(self, key):
+        with self._lock:
+            self._cache.pop(key, None)
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                raise KeyError(key)
+            finally:
+                self._remove_old_frames(key, keep=0)
+
+    def __contains__(self, key):
+        return self._signature(self._path(key)) is not None or key in self.defaults
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def update(self, values):
+        """在锁内写入多个键，其他进程的读-改-写不会穿插其中"""
+        with self.locked():
+            for key, value in values.items():
+                self[key] = value
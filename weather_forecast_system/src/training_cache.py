@@ -0,0 +1,145 @@
+"""
+训练结果缓存
+
+以输入数据内容、特征列、模型超参数、ARIMA 阶数、城市以及训练代码/配置版本计算哈希，
+相同输入的重复训练请求直接返回上次的指标、预测与模型仓库版本，不再重新训练和绘图。
+缓存条目引用的模型版本在模型仓库中被固定，条目删除时才取消固定，不会被新版本挤掉。
+缓存保存在状态目录下，服务重启后仍然有效；训练相关源码或 WEATHER_TRAINING_VERSION
+变化时哈希随之改变，旧结果自然失效。
+"""
+import ast
+import functools
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from src import config
+from src.metrics import CACHE_REQUESTS
+from src.model_registry import get_registry
+from src.state_store import SharedState
+
+# 训练路径的入口模块：它们直接或间接导入的 src 模块（特征流水线、气候态、数据结构等）都视为训练相关源码，
+# 任一文件内容变化即视为代码版本变化。多算进来的模块只会让部署后多一次缓存未命中
+TRAINING_ROOTS = ('arima_model', 'weather_classifier', 'data_collector')
+
+_cache = None
+
+
+def _src_imports(path):
+    """源码文件中导入的 src 模块名（包括函数内的延迟导入）"""
+    with open(path, 'rb') as f:
+        tree = ast.parse(f.read(), filename=path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module == 'src':
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and node.module.startswith('src.'):
+            names.add(node.module.split('.')[1])
+        elif isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[1] for alias in node.names if alias.name.startswith('src.'))
+    return names
+
+
+@functools.lru_cache(maxsize=1)
+def training_sources():
+    """从 TRAINING_ROOTS 出发按 import 关系收集的训练相关源码文件名"""
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    seen = set()
+    pending = list(TRAINING_ROOTS)
+    while pending:
+        name = pending.pop()
+        path = os.path.join(src_dir, f'{name}.py')
+        if name in seen or not os.path.isfile(path):
+            continue
+        seen.add(name)
+        pending.extend(_src_imports(path))
+    return tuple(sorted(f'{name}.py' for name in seen))
+
+
+@functools.lru_cache(maxsize=1)
+def code_version():
+    """训练相关源码与配置版本的哈希"""
+    digest = hashlib.sha256(config.TRAINING_CONFIG_VERSION.encode('utf-8'))
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in training_sources():
+        digest.update(name.encode('utf-8'))
+        with open(os.path.join(src_dir, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def training_key(data, city, feature_columns, hyperparameters, arima_order):
+    """训练输入的内容哈希"""
+    digest = hashlib.sha256()
+    # 温度距平等派生特征在训练时由这些列计算，不在输入数据中
+    columns = [c for c in dict.fromkeys(['date', 'temperature', 'weather_type'] + list(feature_columns))
+               if c in data.columns]
+    digest.update(pd.util.hash_pandas_object(data[columns], index=False).to_numpy().tobytes())
+    digest.update(json.dumps({
+        'city': city.strip().lower(),
+        'columns': columns,
+        'hyperparameters': hyperparameters,
+        'arima_order': list(arima_order),
+        'code_version': code_version()
+    }, sort_keys=True, default=repr).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class TrainingCache:
+    """磁盘上的训练结果缓存，条目超过 max_entries 时删除最旧的"""
+
+    def __init__(self, cache_dir, max_entries=200):
+        self.store = SharedState(cache_dir)
+        self.max_entries = max_entries
+
+    def get(self, key):
+        value = self.store.get(key)
+        CACHE_REQUESTS.inc(cache='training', result='hit' if value is not None else 'miss')
+        return value
+
+    def put(self, key, value):
+        """保存训练结果，value 含 cell 与 model_results['model_versions']"""
+        registry = get_registry()
+        for kind, version in value['model_results']['model_versions'].items():
+            registry.pin(value['cell'], kind, version)
+        self.store[key] = value
+        self._prune()
+
+    def _entries(self):
+        state_dir = self.store.state_dir
+        return [os.path.join(state_dir, name) for name in os.listdir(state_dir) if name.endswith('.pkl')]
+
+    def _remove(self, path):
+        key = os.path.basename(path)[:-len('.pkl')]
+        value = self.store.get(key)
+        try:
+            del self.store[key]
+        except KeyError:
+            return
+        if value is not None and 'cell' in value:
+            registry = get_registry()
+            for kind, version in value['model_results']['model_versions'].items():
+                registry.unpin(value['cell'], kind, version)
+
+    def _prune(self):
+        entries = self._entries()
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=os.path.getmtime)
+        for path in entries[:-self.max_entries]:
+            self._remove(path)
+
+    def clear(self):
+        """删除所有条目"""
+        for path in self._entries():
+            self._remove(path)
+
+
+def get_cache():
+    """进程内共享的训练结果缓存"""
+    global _cache
+    if _cache is None:
+        _cache = TrainingCache(config.TRAINING_CACHE_DIR, config.TRAINING_CACHE_SIZE)
+    return _cache
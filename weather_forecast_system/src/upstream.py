@@ -0,0 +1,78 @@
+"""
+上游 HTTP 调用
+
+所有对百度地图与 Open-Meteo 的请求都经过 http_get，统一记录调用次数、响应字节数与耗时，
+并复用每个进程内的连接池（keep-alive），避免每次请求重新建立 TCP/TLS 连接。
+发出请求前经过对应上游的限流器，上游返回配额超限时抛出 QuotaExceededError。
+"""
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src import config
+from src.config import UPSTREAM_POOL_SIZE
+from src.metrics import UPSTREAM_BYTES, UPSTREAM_REQUESTS, UPSTREAM_SECONDS, record_phase
+from src.rate_limit import UpstreamLimiter, check_baidu_response, check_open_meteo_response
+
+BAIDU = 'baidu'
+OPEN_METEO = 'open_meteo'
+
+LIMITERS = {
+    BAIDU: UpstreamLimiter(BAIDU, config.BAIDU_RATE, config.BAIDU_BURST, config.BAIDU_DAILY_QUOTA),
+    OPEN_METEO: UpstreamLimiter(OPEN_METEO, config.OPEN_METEO_RATE, config.OPEN_METEO_BURST,
+                                config.OPEN_METEO_DAILY_QUOTA),
+}
+
+_RESPONSE_CHECKS = {
+    BAIDU: check_baidu_response,
+    OPEN_METEO: check_open_meteo_response,
+}
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """返回当前进程的共享 Session；fork 出的子进程会重新创建，不共用父进程的连接"""
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=8, pool_maxsize=UPSTREAM_POOL_SIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session, _session_pid = session, pid
+    return _session
+
+
+def http_get(upstream, endpoint, url, params=None, timeout=10):
+    """
+    发送 GET 请求并记录指标，异常原样抛出
+
+    参数:
+        upstream: 上游名称（BAIDU / OPEN_METEO）
+        endpoint: 接口名称，如 geocoding、archive
+
+    本地限流或上游配额超限时抛出 UpstreamThrottledError / QuotaExceededError
+    """
+    limiter = LIMITERS[upstream]
+    limiter.acquire()
+    start = time.perf_counter()
+    status = 'error'
+    try:
+        response = get_session().get(url, params=params, timeout=timeout)
+        status = str(response.status_code)
+        UPSTREAM_BYTES.inc(len(response.content), upstream=upstream, endpoint=endpoint)
+        _RESPONSE_CHECKS[upstream](limiter, response)
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        UPSTREAM_REQUESTS.inc(upstream=upstream, endpoint=endpoint, status=status)
+        UPSTREAM_SECONDS.observe(elapsed, upstream=upstream, endpoint=endpoint)
+        record_phase(f'upstream_{upstream}', elapsed, observe=False)
@@ -0,0 +1,141 @@
+"""
+数据集版本与增量同步
+
+保存的历史数据与结果都带有由内容计算的版本号（相同内容版本相同），接口把它作为 ETag 返回。
+客户端带上 If-None-Match 或 since=<版本> 再次请求时:
+
+    - 版本未变化：返回 304，不带响应体
+    - since 为较早的版本：历史数据只返回该版本之后新增或修改的行（从 changed_from 日期起），
+      结果只返回发生变化的字段
+    - 版本未知（过旧或数据已换成另一个城市）：返回完整数据
+
+每个数据集在共享状态中保留最近 MAX_VERSIONS 个版本的变更记录:
+    历史数据: (版本, 与上一版本相比最早变化的日期)，换城市等无法衔接的写入记为 None
+    结果:     (版本, {字段: 字段内容哈希})
+"""
+import hashlib
+import json
+
+import pandas as pd
+
+from src.data_collector import strip_features
+
+MAX_VERSIONS = 32
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+# 滞后特征最多回看 7 天（temp_mean_7）：窗口后移时，新窗口前 7 行的派生值依赖已移出窗口的行，变化属预期
+LAG_WARMUP_ROWS = 7
+
+
+def _hashes(df, dates):
+    return pd.Series(pd.util.hash_pandas_object(df, index=False).to_numpy(), index=pd.DatetimeIndex(dates))
+
+
+def row_hashes(df):
+    """
+    逐行原始字段的内容哈希（uint64），以日期为索引
+
+    只对上游返回的原始字段计算：日期、滞后等派生特征随采集窗口变化（如窗口首行的滞后温度），
+    未修改的行也会不同，用它们确定增量起点会使增量总是整个窗口。
+    """
+    return _hashes(strip_features(df), df['date'])
+
+
+def served_row_hashes(df):
+    """逐行全部列（含派生特征，即接口返回的内容）的哈希，以日期为索引"""
+    return _hashes(df, df['date'])
+
+
+def frame_version(df):
+    """DataFrame 的内容版本：列名与逐行全部列哈希的摘要，特征流水线改变派生列时版本随之变化"""
+    digest = hashlib.sha256(json.dumps([str(c) for c in df.columns]).encode('utf-8'))
+    digest.update(served_row_hashes(df).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def value_version(value):
+    """可 JSON 序列化的值的内容版本"""
+    return _digest(json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+
+
+def changed_from(old, new):
+    """
+    new 相对 old 最早新增、修改或删除的日期
+
+    只比较 new 覆盖的日期范围，old 中早于 new 起始日期的行视为已移出窗口，不算变化；
+    范围内没有变化时返回 new 最后日期的下一天（增量为空）。
+    增量起点按原始字段确定；原始字段未变、派生列却变化的行（窗口开头的 LAG_WARMUP_ROWS 行除外）
+    说明特征流水线或列结构变了，早于增量起点的行也要重发，此时返回 new 的第一天（完整数据）。
+    """
+    old_hashes, new_hashes = row_hashes(old), row_hashes(new)
+    same = (new_hashes == old_hashes.reindex(new_hashes.index)).to_numpy()
+    changed = new_hashes.index[~same]
+    in_window = (old_hashes.index >= new_hashes.index.min()) & (old_hashes.index <= new_hashes.index.max())
+    removed = old_hashes.index[in_window].difference(new_hashes.index)
+    dates = changed.append(removed)
+    first = dates.min() if len(dates) else new_hashes.index.max() + pd.Timedelta(days=1)
+
+    old_served, new_served = served_row_hashes(old), served_row_hashes(new)
+    drifted = same & (new_served != old_served.reindex(new_served.index)).to_numpy()
+    drifted[:LAG_WARMUP_ROWS] = False
+    if (new_served.index[drifted] < first).any():
+        return new_served.index.min()
+    return first
+
+
+class VersionLog:
+    """一个数据集最近若干个版本的变更记录，可直接存入 SharedState"""
+
+    def __init__(self, limit=MAX_VERSIONS):
+        self.limit = limit
+        self.entries = []  # [(版本, 变更信息), ...]，按时间先后
+
+    @property
+    def current(self):
+        return self.entries[-1][0] if self.entries else None
+
+    def record(self, version, change):
+        """记录新版本，与当前版本相同时不记录；返回是否记录"""
+        if version == self.current:
+            return False
+        self.entries.append((version, change))
+        del self.entries[:-self.limit]
+        return True
+
+    def _position(self, version):
+        for i, (v, _) in enumerate(self.entries):
+            if v == version:
+                return i
+        return None
+
+    def changed_since(self, version):
+        """
+        历史数据在 version 之后最早变化的日期
+
+        version 为当前版本时返回 NaT；无法增量（版本未知或中间有不能衔接的写入）时返回 None。
+        """
+        i = self._position(version)
+        if i is None:
+            return None
+        later = [change for _, change in self.entries[i + 1:]]
+        if any(change is None for change in later):
+            return None
+        return min(later) if later else pd.NaT
+
+    def fields_since(self, version):
+        """结果在 version 之后内容变化的字段；版本未知时返回 None"""
+        i = self._position(version)
+        if i is None:
+            return None
+        before, current = self.entries[i][1], self.entries[-1][1]
+        return sorted(k for k in current if before.get(k) != current[k])
+
+
+def field_hashes(payload):
+    """结果各字段的内容哈希"""
+    return {key: value_version(value) for key, value in payload.items()}
+
@@ -0,0 +1,36 @@
+"""
+后台预热
+
+服务开始接受请求后，在后台线程中导入 statsmodels、scikit-learn 和绘图库，
+让第一次训练请求不必承担这部分导入耗时。
+"""
+import threading
+import time
+
+
+def warm_up():
+    """导入训练与绘图所需的重量级依赖"""
+    start = time.perf_counter()
+    import statsmodels.tsa.arima.model  # noqa: F401
+    import sklearn.linear_model  # noqa: F401
+    import sklearn.metrics  # noqa: F401
+    import sklearn.model_selection  # noqa: F401
+    import sklearn.preprocessing  # noqa: F401
+    import sklearn.tree  # noqa: F401
+    from src.plotting import get_seaborn
+    get_seaborn()
+    print(f'后台预热完成，用时 {time.perf_counter() - start:.2f}s')
+
+
+def start_background_warmup(delay=1.0):
+    """延迟 delay 秒后在守护线程中预热，返回线程对象"""
+    def run():
+        time.sleep(delay)
+        try:
+            warm_up()
+        except Exception as e:
+            print(f'后台预热失败: {e}')
+
+    thread = threading.Thread(target=run, name='warmup', daemon=True)
+    thread.start()
+    return thread
@@ -1,22 +1,42 @@
+import functools
+import warnings
+
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
-from sklearn.preprocessing import StandardScaler
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
 
-# 设置中文字体
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial Unicode MS']
-plt.rcParams['axes.unicode_minus'] = False
+from src import config
+from src.config import results_path
+from src.metrics import MODEL_FIT_SECONDS, phase
+from src.plotting import get_pyplot, get_seaborn
+from src.profiling import track_memory
+
+# scikit-learn 与绘图库在首次使用时才导入，避免拖慢服务启动
+
+# 调参时搜索的超参数：逻辑回归的正则化强度，决策树的深度与叶子大小
+PARAM_GRIDS = {
+    'logistic_regression': {'C': [0.01, 0.1, 1.0, 10.0, 100.0]},
+    'decision_tree': {
+        'max_depth': [None, 4, 6, 8, 12],
+        'min_samples_leaf': [1, 2, 5, 10, 20]
+    }
+}
+
+
+@functools.lru_cache(maxsize=64)
+def time_series_folds(n_samples, n_splits):
+    """按时间顺序划分的交叉验证折（训练集总在验证集之前），只与样本数和折数有关，缓存复用"""
+    from sklearn.model_selection import TimeSeriesSplit
+    return tuple(TimeSeriesSplit(n_splits=n_splits).split(np.empty((n_samples, 1))))
+
 
 class WeatherClassifier:
     def __init__(self):
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.tree import DecisionTreeClassifier
+        from sklearn.preprocessing import StandardScaler
+        
         self.scaler = StandardScaler()
+        self.climatology = None  # 计算温度距平特征使用的气候态，由训练方设置，预测时沿用
         self.models = {
             'logistic_regression': LogisticRegression(
                 max_iter=5000, 
@@ -36,8 +56,11 @@ class WeatherClassifier:
     
     def train_test_split(self, X, y, test_size=0.2, random_state=42):
         """划分训练集和测试集，当某些类别样本数量不足时移除 stratify 参数"""
+        from sklearn.model_selection import train_test_split
+        
         # 检查每个类别的样本数量
         class_counts = y.value_counts()
+        class_counts = class_counts[class_counts > 0]  # 分类类型会列出未出现的类别
         min_class_count = class_counts.min()
         
         # 如果最小类别样本数 < 2，不使用 stratify
@@ -62,6 +85,66 @@ class WeatherClassifier:
         self.label_encoder = LabelEncoder()
         return self.label_encoder.fit_transform(y)
     
+    def tune(self, X, y, n_splits=5, n_jobs=None):
+        """
+        用逐次减半网格搜索（HalvingGridSearchCV）调整各模型的超参数
+
+        X、y 按时间顺序使用（索引即时间顺序），交叉验证采用时间序列折，避免用未来数据验证过去。
+        标准化放在 Pipeline 中，每折只用该折训练部分的均值与方差；候选在 n_jobs 个进程中并行评估
+        （默认 TUNING_JOBS，-1 为使用全部核心）。最优参数写回 self.models，之后调用 train 即按新参数训练。
+
+        返回:
+            {模型名: {'best_params': ..., 'best_score': ..., 'candidates': ...}}
+        """
+        from sklearn.base import clone
+        from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+        from sklearn.model_selection import HalvingGridSearchCV
+        from sklearn.pipeline import Pipeline
+        from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+        if hasattr(X, 'sort_index'):
+            X = X.sort_index()
+            y = y.loc[X.index]
+        y_encoded = LabelEncoder().fit_transform(np.asarray(y))
+        if len(np.unique(y_encoded)) < 2:
+            print('调参跳过：数据中只有一个类别')
+            return {}
+        n_splits = min(n_splits, len(y_encoded) // 10)
+        if n_splits < 2:
+            print('调参跳过：样本数太少')
+            return {}
+        X = np.asarray(X, dtype=np.float64)
+        folds = time_series_folds(len(y_encoded), n_splits)
+
+        results = {}
+        for name, model in self.models.items():
+            pipeline = Pipeline([('scaler', StandardScaler()), ('model', clone(model))])
+            grid = {f'model__{param}': values for param, values in PARAM_GRIDS[name].items()}
+            search = HalvingGridSearchCV(
+                pipeline, grid,
+                cv=folds,
+                scoring='balanced_accuracy',
+                factor=3,
+                n_jobs=n_jobs if n_jobs is not None else config.TUNING_JOBS,
+                refit=False,
+                error_score=np.nan,
+                random_state=42
+            )
+            # 早期的时间序列折里常缺少部分类别，评分时的提示是预期内的
+            with MODEL_FIT_SECONDS.time(model=f'{name}_tuning'), warnings.catch_warnings():
+                warnings.filterwarnings('ignore', message='y_pred contains classes not in y_true')
+                search.fit(X, y_encoded)
+            best_params = {param[len('model__'):]: value for param, value in search.best_params_.items()}
+            self.models[name].set_params(**best_params)
+            results[name] = {
+                'best_params': best_params,
+                'best_score': float(search.best_score_),
+                'candidates': len(search.cv_results_['params'])
+            }
+            print(f'{name} 调参完成: {best_params}，平衡准确率 {search.best_score_:.4f}')
+        return results
+
+    @track_memory('classifier_train')
     def train(self, X_train, y_train):
         """训练所有分类模型"""
         # 保存特征名称
@@ -92,7 +175,8 @@ class WeatherClassifier:
             if len(np.unique(y_train_encoded)) < 2:
                 print(f"{name} 模型训练失败：数据中只有一个类别")
                 continue
-            model.fit(X_train_scaled, y_train_encoded)
+            with MODEL_FIT_SECONDS.time(model=name), phase(f'fit_{name}'):
+                model.fit(X_train_scaled, y_train_encoded)
             self.fitted_models[name] = model
             print(f'{name} 模型训练完成')
         
@@ -115,8 +199,19 @@ class WeatherClassifier:
         
         return predictions
     
+    def predict_frame(self, frame, history=None, model_name='decision_tree'):
+        """对原始日数据（如预报）构造特征后预测天气类型，history 用于计算滞后特征"""
+        from src.data_collector import FEATURE_COLUMNS, features_for_prediction
+        features = features_for_prediction(frame, history, getattr(self, 'climatology', None))
+        # 使用训练时的特征列，增加新特征之前保存的模型仍可预测
+        columns = list(getattr(self.scaler, 'feature_names_in_', FEATURE_COLUMNS))
+        predictions = self.predict(features[columns], model_name)
+        return None if predictions is None else [str(p) for p in predictions]
+    
     def evaluate(self, X_test, y_test, model_name='decision_tree'):
         """评估模型性能"""
+        from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+        
         if model_name not in self.fitted_models:
             print(f'请先训练 {model_name} 模型')
             return None
@@ -152,7 +247,8 @@ class WeatherClassifier:
         print(report)
         
         # 绘制混淆矩阵
-        self.plot_confusion_matrix(cm, model_name)
+        with phase('plotting'):
+            self.plot_confusion_matrix(cm, model_name)
         
         return {
             'accuracy': accuracy,
@@ -162,6 +258,8 @@ class WeatherClassifier:
     
     def plot_confusion_matrix(self, cm, model_name):
         """绘制混淆矩阵"""
+        plt = get_pyplot()
+        sns = get_seaborn()
         plt.figure(figsize=(10, 8))
         sns.heatmap(cm, annot=True, fmt='d', cmap='Blues',
                     xticklabels=self.label_encoder.classes_,
@@ -170,7 +268,7 @@ class WeatherClassifier:
         plt.xlabel('预测标签')
         plt.ylabel('真实标签')
         plt.tight_layout()
-        plt.savefig(f'D:/Trae/trae_project/weather_forecast/weather_forecast_system/results/{model_name}_confusion_matrix.png')
+        plt.savefig(results_path(f'{model_name}_confusion_matrix.png'))
         plt.close()
         print(f'混淆矩阵已保存到 results/{model_name}_confusion_matrix.png')
     
@@ -197,11 +295,13 @@ class WeatherClassifier:
         }).sort_values('importance', ascending=False)
         
         # 绘制特征重要性
+        plt = get_pyplot()
+        sns = get_seaborn()
         plt.figure(figsize=(12, 6))
         sns.barplot(x='importance', y='feature', data=feature_importance_df)
         plt.title(f'{model_name} 特征重要性')
         plt.tight_layout()
-        plt.savefig(f'D:/Trae/trae_project/weather_forecast/weather_forecast_system/results/{model_name}_feature_importance.png')
+        plt.savefig(results_path(f'{model_name}_feature_importance.png'))
         plt.close()
         print(f'特征重要性图已保存到 results/{model_name}_feature_importance.png')
         
@@ -213,6 +313,7 @@ class WeatherClassifier:
         if model_name in self.fitted_models:
             joblib.dump({
                 'model': self.fitted_models[model_name],
+                'scaler': self.scaler,
                 'label_encoder': self.label_encoder,
                 'feature_names': self.feature_names
             }, file_path)
@@ -225,6 +326,7 @@ class WeatherClassifier:
         import joblib
         loaded = joblib.load(file_path)
         self.fitted_models[model_name] = loaded['model']
+        self.scaler = loaded.get('scaler', self.scaler)
         self.label_encoder = loaded['label_encoder']
         self.feature_names = loaded['feature_names']
         print(f'{model_name} 模型已从 {file_path} 加载')
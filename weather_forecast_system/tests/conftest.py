@@ -0,0 +1,28 @@
+"""
+测试环境：状态、模型、逐小时存储与图表都放在临时目录，上游请求发往本地模拟服务
+
+环境变量必须在 src.config 首次导入之前设置，因此在本文件导入时完成。
+"""
+import os
+import tempfile
+
+import pytest
+
+from benchmarks.fake_upstream import FakeUpstream
+
+_WORK_DIR = tempfile.mkdtemp(prefix='weather-tests-')
+for _env, _name in (('WEATHER_STATE_DIR', 'state'), ('WEATHER_MODEL_DIR', 'models'),
+                    ('WEATHER_HOURLY_DIR', 'hourly'), ('WEATHER_RESULTS_DIR', 'results'),
+                    ('WEATHER_PROFILES_DIR', 'profiles')):
+    os.environ[_env] = os.path.join(_WORK_DIR, _name)
+os.environ.update({'WEATHER_WARMUP': '0', 'WEATHER_HOURLY_INGEST': '0', 'WEATHER_CLASSIFIER_TUNING': '0'})
+
+_upstream = FakeUpstream().start()
+os.environ.update(_upstream.environ())
+
+
+@pytest.fixture(scope='session')
+def client():
+    """api_server 的 Flask 测试客户端"""
+    import api_server
+    return api_server.app.test_client()
@@ -0,0 +1,102 @@
+"""多城市归档数据的 DuckDB 分析查询"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analytics import ArchiveAnalytics
+from src.hourly_store import HOURLY_VARIABLES, HourlyStore, parse_hourly_csv
+
+
+def hourly_table(start, days, temperature, rainfall=0.0, weather_code=0, hours=24):
+    """days 天的逐小时数据：温度在 temperature ± 2 之间按小时变化；每天只保留前 hours 个小时"""
+    times = pd.date_range(start, periods=days * 24, freq='h')
+    times = times[times.hour < hours]
+    frame = pd.DataFrame({
+        'time': times.strftime('%Y-%m-%dT%H:%M'),
+        'temperature_2m': temperature + 2 * np.sin(np.arange(len(times)) / 24 * 2 * np.pi),
+        'relative_humidity_2m': 60.0,
+        'precipitation': rainfall,
+        'wind_speed_10m': 10.0,
+        'surface_pressure': 1013.0,
+        'weather_code': weather_code,
+    })
+    assert list(frame.columns[1:]) == list(HOURLY_VARIABLES)
+    return parse_hourly_csv(('meta\n\n' + frame.to_csv(index=False)).encode('utf-8'))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HourlyStore(str(tmp_path))
+    store.upsert_month('cell_a', hourly_table('2026-01-01', 31, temperature=0.0))
+    store.upsert_month('cell_a', hourly_table('2026-02-01', 28, temperature=5.0, rainfall=0.5, weather_code=61))
+    store.upsert_month('cell_b', hourly_table('2026-01-01', 31, temperature=20.0))
+    # 只有 10 个小时的日期不计入
+    store.upsert_month('cell_b', hourly_table('2026-02-01', 1, temperature=40.0, hours=10))
+    return store
+
+
+def test_ranking_orders_cells_and_matches_daily_aggregates(store):
+    analytics = ArchiveAnalytics(store)
+    result = analytics.run('ranking', 'mean_temperature')
+    assert result['columns'][:3] == ['city', 'value', 'days']
+    assert [row[0] for row in result['rows']] == ['cell_b', 'cell_a']
+
+    daily = store.daily_aggregates('cell_b')
+    city, value, days, first, last = result['rows'][0]
+    assert days == len(daily) == 31
+    assert value == pytest.approx(daily['temperature'].mean(), abs=0.01)
+    assert (first, last) == ('2026-01-01', '2026-01-31')
+
+    ascending = analytics.run('ranking', 'mean_temperature', order='asc')
+    assert [row[0] for row in ascending['rows']] == ['cell_a', 'cell_b']
+    rainy = analytics.run('ranking', 'rainy_days')
+    assert rainy['rows'][0][:2] == ['cell_a', 28]
+
+
+def test_cells_and_date_range_limit_the_query(store):
+    analytics = ArchiveAnalytics(store)
+    result = analytics.run('ranking', 'max_temperature', cells=['CELL_A'], start='2026-01-10', end='2026-01-20')
+    assert len(result['rows']) == 1
+    city, value, days, first, last = result['rows'][0]
+    assert (city, days, first, last) == ('cell_a', 11, '2026-01-10', '2026-01-20')
+    assert value == pytest.approx(2.0, abs=0.05)
+    assert analytics.run('ranking', cells=['unknown'])['rows'] == []
+
+
+def test_extremes_and_monthly(store):
+    analytics = ArchiveAnalytics(store)
+    hottest = analytics.run('extremes', 'hottest', limit=1)
+    assert hottest['columns'] == ['city', 'date', 'value', 'weather_type']
+    assert hottest['rows'][0][0] == 'cell_b'  # 40℃ 的不完整日期被排除
+
+    monthly = analytics.run('monthly', cells=['cell_a'])
+    columns = monthly['columns']
+    rows = [dict(zip(columns, row)) for row in monthly['rows']]
+    assert [(r['year'], r['month'], r['days']) for r in rows] == [(2026, 1, 31), (2026, 2, 28)]
+    assert rows[0]['sunny'] == 31 and rows[1]['rain'] == 28
+    assert rows[1]['total_rainfall'] == pytest.approx(28 * 24 * 0.5)
+
+
+def test_results_are_cached_until_the_store_changes(store):
+    analytics = ArchiveAnalytics(store)
+    first = analytics.run('ranking', 'mean_temperature')
+    assert not first['cached']
+    assert analytics.run('ranking', 'mean_temperature')['cached']
+
+    store.upsert_month('cell_a', hourly_table('2026-01-01', 31, temperature=40.0))
+    refreshed = analytics.run('ranking', 'mean_temperature')
+    assert not refreshed['cached']
+    assert refreshed['rows'][0][0] == 'cell_a'
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'query': 'drop table'},
+    {'query': 'ranking', 'metric': 'hottest'},
+    {'query': 'extremes', 'metric': 'mean_temperature'},
+    {'query': 'ranking', 'order': 'sideways'},
+    {'query': 'ranking', 'limit': 'ten'},
+    {'query': 'ranking', 'start': 'yesterday-ish'},
+])
+def test_invalid_parameters_are_rejected(store, kwargs):
+    with pytest.raises(ValueError):
+        ArchiveAnalytics(store).run(**kwargs)
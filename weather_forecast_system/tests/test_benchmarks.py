@@ -0,0 +1,43 @@
+"""离线基准测试工具与本地模拟上游"""
+import requests
+
+from benchmarks.fake_upstream import FakeUpstream
+from benchmarks.run_benchmarks import compare, measure
+
+
+def test_measure_statistics():
+    calls = []
+    stats = measure(lambda: calls.append(1), repeat=4, warmup=2)
+    assert len(calls) == 6
+    assert stats['runs'] == 4
+    assert stats['min'] <= stats['median'] <= stats['p95']
+
+
+def test_compare_flags_regressions():
+    baseline = {'results': {'a': {'median': 1.0}, 'b': {'median': 1.0}, 'gone': {'median': 1.0}}}
+    results = {'a': {'median': 1.1}, 'b': {'median': 1.5}, 'new': {'median': 9.0}}
+    assert compare(results, baseline, threshold=0.2) == ['b']
+
+
+def test_fake_upstream_serves_open_meteo_and_baidu_shapes():
+    upstream = FakeUpstream().start()
+    try:
+        env = upstream.environ()
+        daily = requests.get(env['OPEN_METEO_ARCHIVE_URL'], params={
+            'start_date': '2026-01-01', 'end_date': '2026-01-10',
+            'daily': ['temperature_2m_mean', 'weather_code']}, timeout=5).json()['daily']
+        assert len(daily['time']) == 10
+        assert len(daily['temperature_2m_mean']) == 10 and len(daily['weather_code']) == 10
+        again = requests.get(env['OPEN_METEO_ARCHIVE_URL'], params={
+            'start_date': '2026-01-01', 'end_date': '2026-01-10',
+            'daily': ['temperature_2m_mean', 'weather_code']}, timeout=5).json()['daily']
+        assert again == daily  # 确定性数据
+        hourly = requests.get(env['OPEN_METEO_ARCHIVE_URL'], params={
+            'start_date': '2026-01-01', 'end_date': '2026-01-01', 'hourly': 'temperature_2m', 'format': 'csv'},
+            timeout=5)
+        assert hourly.headers['Content-Type'].startswith('text/csv')
+        location = requests.get(env['BAIDU_GEOCODING_URL'], timeout=5).json()
+        assert location['status'] == 0 and 'lat' in location['result']['location']
+        assert requests.get(upstream.base_url + '/nothing', timeout=5).status_code == 404
+    finally:
+        upstream.stop()
@@ -0,0 +1,69 @@
+"""气候态索引"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.climatology import DAYS_IN_YEAR, Climatology, _circular_smooth
+
+
+def daily(start, days, temperature=None, weather_type='sunny', rainfall=0.0):
+    dates = pd.date_range(start, periods=days)
+    if temperature is None:
+        temperature = 10 - 15 * np.cos(2 * np.pi * (dates.dayofyear.to_numpy() - 15) / 365.25)
+    return pd.DataFrame({'date': dates, 'temperature': temperature,
+                         'weather_type': weather_type, 'rainfall': rainfall})
+
+
+def test_circular_smoothing_wraps_around_the_year():
+    values = np.zeros(DAYS_IN_YEAR)
+    values[0] = 1
+    smoothed = _circular_smooth(values, 2)
+    assert smoothed[[0, 1, 2, -1, -2]].tolist() == [1, 1, 1, 1, 1]
+    assert smoothed[3:-2].sum() == 0
+    assert smoothed.sum() == 5
+
+
+def test_normals_follow_the_seasonal_cycle():
+    climatology = Climatology.from_daily(daily('2020-01-01', 4 * 365), window=7)
+    january, july = climatology.normals(['2026-01-15', '2026-07-15'])
+    assert january == pytest.approx(-5, abs=0.5)
+    assert july == pytest.approx(25, abs=0.5)
+    anomaly = climatology.anomaly(['2026-07-15'], [28.0])
+    assert anomaly[0] == pytest.approx(3, abs=0.5)
+
+
+def test_days_without_samples_are_interpolated():
+    # 只有 1 月与 3 月的数据，2 月由两侧插值
+    data = pd.concat([daily('2025-01-01', 31, temperature=0.0), daily('2025-03-01', 31, temperature=10.0)])
+    climatology = Climatology.from_daily(data, window=0)
+    (february,) = climatology.normals(['2026-02-15'])
+    assert 0 < february < 10
+    assert np.isfinite(climatology.temperature).all()
+
+
+def test_add_only_counts_dates_after_through():
+    climatology = Climatology(window=3)
+    assert climatology.add(daily('2025-01-01', 10)) == 10
+    assert climatology.add(daily('2025-01-05', 10)) == 4  # 与已有数据重叠的 6 天被跳过
+    assert climatology.samples == 14
+    assert climatology.through == pd.Timestamp('2025-01-14')
+    assert climatology.add(None) == 0
+
+
+def test_baseline_and_sanity_check():
+    data = daily('2024-01-01', 2 * 365, temperature=20.0, weather_type='rain', rainfall=5.0)
+    climatology = Climatology.from_daily(data, window=5)
+    dates = pd.date_range('2026-06-01', periods=3)
+    baseline = climatology.baseline(dates)
+    assert baseline == {'temperature': [20.0] * 3, 'weather_type': ['rain'] * 3, 'rain_probability': [100] * 3}
+    # 标准差为 0 时取下限 1℃
+    assert climatology.check(dates, [20.5, 30.0, 15.5]) == [1, 2]
+    assert climatology.check(dates, [20.5, 30.0, 15.5], z=20) == []
+
+
+def test_empty_index_gives_no_baseline():
+    climatology = Climatology()
+    assert climatology.baseline(['2026-01-01']) is None
+    assert climatology.normals(['2026-01-01']) is None
+    assert climatology.check(['2026-01-01'], [100.0]) == []
+    assert climatology.anomaly(['2026-01-01'], [5.0]).tolist() == [0.0]
@@ -0,0 +1,84 @@
+"""历史数据降采样与聚合"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.downsampling import decimate, lttb_indices, minmax_indices, parse_max_points, resample_frame
+
+
+def daily(days, start='2026-01-05'):
+    t = np.arange(days)
+    return pd.DataFrame({
+        'date': pd.date_range(start, periods=days),
+        'temperature': 10 + 8 * np.sin(t / 10),
+        'temp_max': 15 + 8 * np.sin(t / 10),
+        'rainfall': np.where(t % 4 == 0, 2.0, 0.0),
+        'weather_type': np.where(t % 4 == 0, 'rain', 'sunny'),
+    })
+
+
+def test_lttb_keeps_endpoints_and_point_count():
+    y = np.sin(np.arange(500) / 15)
+    idx = lttb_indices(y, 50)
+    assert len(idx) == 50
+    assert idx[0] == 0 and idx[-1] == 499
+    assert (np.diff(idx) > 0).all()
+
+
+def test_lttb_keeps_spike():
+    y = np.zeros(1000)
+    y[437] = 100
+    assert 437 in lttb_indices(y, 20)
+
+
+def test_minmax_keeps_extremes():
+    y = np.random.default_rng(0).normal(size=1000)
+    idx = minmax_indices(y, 40)
+    assert len(idx) <= 40
+    assert y.argmax() in idx and y.argmin() in idx
+
+
+def test_decimate_limits_rows():
+    df = daily(400)
+    assert len(decimate(df, 100)) == 100
+    assert len(decimate(df, 100, method='minmax')) <= 100
+    assert decimate(df, None) is df
+
+
+@pytest.mark.parametrize('method, value', [('lttb', 2), ('minmax', 1), ('lttb', 0), ('lttb', -5)])
+def test_too_few_points_is_rejected(method, value):
+    with pytest.raises(ValueError):
+        parse_max_points(str(value), method)
+    with pytest.raises(ValueError):
+        decimate(daily(100), value, method=method)
+
+
+def test_parse_max_points():
+    assert parse_max_points(None) is None
+    assert parse_max_points('3') == 3
+    assert parse_max_points('2', 'minmax') == 2
+    with pytest.raises(ValueError):
+        parse_max_points('abc')
+    with pytest.raises(ValueError):
+        parse_max_points('10', 'nearest')
+
+
+def test_weekly_resample_aggregates():
+    df = daily(14)  # 2026-01-05 为周一，正好两周
+    weekly = resample_frame(df, 'week')
+    assert list(weekly['date']) == [pd.Timestamp('2026-01-05'), pd.Timestamp('2026-01-12')]
+    assert list(weekly['days']) == [7, 7]
+    first = df.iloc[:7]
+    assert weekly['temp_max'].iloc[0] == pytest.approx(first['temp_max'].max(), abs=0.01)
+    assert weekly['rainfall'].iloc[0] == pytest.approx(first['rainfall'].sum())
+    assert weekly['weather_type'].iloc[0] == 'sunny'
+
+
+def test_history_rejects_too_few_points(client):
+    assert client.post('/api/collect-data', json={'city': 'beijing', 'days': 60}).status_code == 200
+    response = client.get('/api/history?max_points=1')
+    assert response.status_code == 400
+    assert 'max_points' in response.get_json()['error']
+    response = client.get('/api/history?max_points=10&method=lttb')
+    assert response.status_code == 200
+    assert response.get_json()['count'] == 10
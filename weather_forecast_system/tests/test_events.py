@@ -0,0 +1,87 @@
+"""服务器推送事件"""
+import json
+import threading
+
+from src import config, events
+from src.events import EventLog
+
+
+def test_read_since_returns_complete_lines_in_bounded_chunks(tmp_path):
+    log = EventLog(str(tmp_path / 'events.ndjson'))
+    position = log.tail_position()
+    for i in range(20):
+        log.publish(events.TRAINING, {'step': i})
+    with open(log.path, 'ab') as f:
+        f.write(b'{"event": "forecast", "data": {"step": 20}')  # 写到一半的行
+
+    received = []
+    reads = 0
+    while True:
+        batch, position = log.read_since(position, max_bytes=200)
+        if not batch:
+            break
+        reads += 1
+        received += [data['step'] for _, _, data in batch]
+    assert received == list(range(20))
+    assert reads > 1
+
+    # 该行写完后从上次的位置继续读到它
+    with open(log.path, 'ab') as f:
+        f.write(b', "time": 0}\n')
+    batch, _ = log.read_since(position)
+    assert [(event, data) for _, event, data in batch] == [(events.FORECAST, {'step': 20})]
+
+
+def test_oversized_line_does_not_stall_the_reader(tmp_path):
+    log = EventLog(str(tmp_path / 'events.ndjson'))
+    position = log.tail_position()
+    log.publish(events.TRAINING, {'blob': 'x' * 500})
+    log.publish(events.TRAINING, {'step': 1})
+    received = []
+    for _ in range(10):
+        batch, position = log.read_since(position, max_bytes=100)
+        received += [data for _, _, data in batch]
+    assert received == [{'step': 1}]
+
+
+def test_reconnect_to_rotated_file_starts_from_new_file(tmp_path):
+    log = EventLog(str(tmp_path / 'events.ndjson'), max_bytes=100)
+    log.publish(events.TRAINING, {'step': 0, 'pad': 'x' * 100})
+    old_position = log.tail_position()
+    log.publish(events.TRAINING, {'step': 1})  # 超过大小，先轮转
+    batch, _ = log.read_since(old_position)
+    assert [data['step'] for _, _, data in batch] == [1]
+
+
+def test_stream_filters_topics_and_stops():
+    stop = threading.Event()
+    body = events.stream(topics={events.FORECAST}, poll_interval=0.01, heartbeat=60, stop=stop)
+    assert next(body) == 'retry: 3000\n\n'
+    events.publish(events.TRAINING, {'job_id': 'skip'})
+    events.publish(events.FORECAST, {'city': 'beijing'})
+    message = next(body)
+    assert 'event: forecast' in message
+    assert json.loads(message.split('data: ', 1)[1]) == {'city': 'beijing'}
+    stop.set()
+    assert list(body) == []
+
+
+def test_streams_beyond_the_cap_get_503(client, monkeypatch):
+    monkeypatch.setattr(config, 'EVENTS_MAX_STREAMS', 1)
+    release = events.open_stream_slot()
+    try:
+        assert events.open_stream_slot() is None
+        response = client.get('/api/events')
+        assert response.status_code == 503
+        assert response.headers['Retry-After']
+    finally:
+        release()
+        release()  # 重复释放不会多还名额
+
+    response = client.get('/api/events', buffered=False)
+    assert response.status_code == 200
+    assert events.open_stream_slot() is None
+    response.close()
+    slot = events.open_stream_slot()
+    assert slot is not None
+    slot()
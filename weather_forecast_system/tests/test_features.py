@@ -0,0 +1,66 @@
+"""特征构造"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.climatology import Climatology
+from src.data_collector import (FEATURE_COLUMNS, add_lag_features, build_features, features_for_prediction,
+                                strip_features, weather_codes_to_types)
+
+
+def raw(days, start='2026-03-02'):
+    t = np.arange(days, dtype=float)
+    return pd.DataFrame({
+        'date': pd.date_range(start, periods=days),
+        'temperature': t,
+        'humidity': 50.0 + t,
+        'rainfall': 0.0,
+        'wind_speed': 3.0,
+        'pressure': 1010.0,
+        'weather_type': weather_codes_to_types(np.zeros(days)),
+    })
+
+
+def test_weather_codes_to_types():
+    types = weather_codes_to_types([0, 3, 61, 95, None, 500, -1])
+    assert list(types) == ['sunny', 'cloudy', 'rain', 'thunderstorm', 'unknown', 'unknown', 'unknown']
+
+
+def test_lag_features_use_only_previous_days():
+    df = add_lag_features(raw(10))
+    assert df['temp_lag_1'].tolist()[:3] == [0.0, 0.0, 1.0]  # 首行用当天温度填充
+    assert df['temp_mean_3'].iloc[5] == pytest.approx((2 + 3 + 4) / 3)
+    assert df['temp_mean_7'].iloc[8] == pytest.approx(np.mean(np.arange(1, 8)))
+
+
+def test_lag_features_by_group():
+    panel = pd.concat([raw(4).assign(city='a'), raw(4).assign(city='b', temperature=100.0)], ignore_index=True)
+    df = add_lag_features(panel, group_col='city')
+    # 第二个城市的首行不使用第一个城市的数据
+    assert df.loc[4, 'temp_lag_1'] == 100.0
+    assert df.loc[3, 'temp_lag_1'] == 2.0
+
+
+def test_build_features_fills_missing_and_adds_calendar():
+    df = raw(7)
+    df.loc[2, 'humidity'] = np.nan
+    features = build_features(df)
+    assert features['humidity'].notna().all()
+    assert features.loc[0, 'weekday'] == 0 and features.loc[5, 'is_weekend'] == 1
+    assert 'temp_anomaly' not in features.columns
+
+
+def test_build_features_anomaly_from_given_climatology():
+    climatology = Climatology.from_daily(raw(30).assign(temperature=5.0))
+    features = build_features(raw(7), climatology)
+    np.testing.assert_allclose(features['temp_anomaly'], np.arange(7) - 5.0, atol=1e-5)
+    assert set(FEATURE_COLUMNS) <= set(features.columns)
+    assert 'temp_lag_1' not in strip_features(features).columns
+
+
+def test_features_for_prediction_uses_history_for_lags():
+    history = build_features(raw(10))
+    future = raw(3, start='2026-03-12').assign(temperature=[20.0, 21.0, 22.0])
+    features = features_for_prediction(future, history)
+    assert len(features) == 3
+    assert features['temp_lag_1'].tolist() == [9.0, 20.0, 21.0]
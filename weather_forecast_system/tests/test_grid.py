@@ -0,0 +1,38 @@
+"""网格单元对齐"""
+import re
+
+from src import grid
+from src.data_collector import WeatherDataCollector
+
+
+def test_nearby_locations_share_a_cell():
+    a = {'latitude': 39.9042, 'longitude': 116.4074}
+    b = {'latitude': 39.8811, 'longitude': 116.4321}
+    assert grid.snap(a, 0.1) == {'latitude': 39.9, 'longitude': 116.4}
+    assert grid.cell_key(a, 0.1) == grid.cell_key(b, 0.1) == 'cell_39.900_116.400'
+
+
+def test_locations_in_different_cells_get_different_keys():
+    a = {'latitude': 39.94, 'longitude': 116.40}
+    b = {'latitude': 39.96, 'longitude': 116.40}
+    assert grid.cell_key(a, 0.1) != grid.cell_key(b, 0.1)
+    # 更粗的网格把它们并到同一单元
+    assert grid.cell_key(a, 0.25) == grid.cell_key(b, 0.25) == 'cell_40.000_116.500'
+
+
+def test_keys_are_stable_and_filename_safe():
+    southern = {'latitude': -33.8688, 'longitude': 151.2093}
+    western = {'latitude': 40.7128, 'longitude': -74.0060}
+    assert grid.cell_key(southern, 0.1) == 'cell_-33.900_151.200'
+    assert grid.cell_key(western, 0.1) == 'cell_40.700_-74.000'
+    # 浮点误差不会产生 39.900000000000006 之类的键
+    assert grid.snap({'latitude': 39.9, 'longitude': 0.3}, 0.1) == {'latitude': 39.9, 'longitude': 0.3}
+    for location in (southern, western):
+        assert re.fullmatch(r'cell_-?\d+\.\d{3}_-?\d+\.\d{3}', grid.cell_key(location))
+
+
+def test_collector_keys_cities_by_their_cell():
+    collector = WeatherDataCollector()
+    location = collector.get_location('北京')
+    assert collector.cell_key('北京') == grid.cell_key(location)
+    assert collector.get_cell_location('北京') == grid.snap(location)
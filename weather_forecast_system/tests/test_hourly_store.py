@@ -0,0 +1,97 @@
+"""逐小时分区存储与按月采集"""
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+import requests
+
+from benchmarks.fake_upstream import synthetic_hourly_csv
+from src import data_collector
+from src.data_collector import WeatherDataCollector
+from src.hourly_store import HOURLY_VARIABLES, HourlyStore, month_chunks, parse_hourly_csv
+
+CELL = '39.9,116.4'
+
+
+def hourly_table(start, end, seed=0):
+    csv = synthetic_hourly_csv(start, end, list(HOURLY_VARIABLES), seed=seed)
+    return parse_hourly_csv(csv.encode('utf-8'))
+
+
+def test_month_chunks_split_on_calendar_months():
+    assert month_chunks(date(2026, 1, 20), date(2026, 3, 5)) == [
+        (date(2026, 1, 20), date(2026, 1, 31)),
+        (date(2026, 2, 1), date(2026, 2, 28)),
+        (date(2026, 3, 1), date(2026, 3, 5)),
+    ]
+    assert month_chunks(date(2026, 3, 5), date(2026, 3, 4)) == []
+
+
+def test_parse_renames_columns_and_drops_missing_temperatures():
+    csv = ('latitude,longitude\n39.9,116.4\n\n'
+           'time,temperature_2m (°C),weather_code (wmo code)\n'
+           '2026-01-01T00:00,1.5,3\n2026-01-01T01:00,,3\n')
+    table = parse_hourly_csv(csv.encode('utf-8'))
+    assert table.num_rows == 1
+    assert table.column_names == ['time'] + list(HOURLY_VARIABLES.values())
+    assert table['temperature'][0].as_py() == 1.5
+    assert table['humidity'][0].as_py() is None
+
+
+def test_upsert_replaces_only_the_overlapping_hours(tmp_path):
+    store = HourlyStore(str(tmp_path))
+    assert store.upsert_month(CELL, hourly_table('2026-01-01', '2026-01-20', seed=0)) == 20 * 24
+    generation = store.generation()
+
+    # 重叠区间 1 月 15 日起被新数据替换，之前的小时保留
+    store.upsert_month(CELL, hourly_table('2026-01-15', '2026-01-31', seed=1))
+    assert store.generation() != generation
+    assert store.months(CELL) == [(2026, 1)]
+    table = next(store.scan(CELL))
+    times = table['time'].to_pandas()
+    assert len(table) == 31 * 24 and times.is_unique and times.is_monotonic_increasing
+
+    replaced = next(store.scan(CELL, '2026-01-15', '2026-01-15'))
+    expected = hourly_table('2026-01-15', '2026-01-31', seed=1).slice(0, 24)
+    assert replaced['temperature'].equals(expected['temperature'])
+    kept = next(store.scan(CELL, '2026-01-01', '2026-01-01'))
+    assert kept['temperature'].equals(hourly_table('2026-01-01', '2026-01-20', seed=0).slice(0, 24)['temperature'])
+    assert store.last_timestamp(CELL) == pd.Timestamp('2026-01-31 23:00')
+
+
+def test_daily_aggregates_skip_incomplete_days(tmp_path):
+    store = HourlyStore(str(tmp_path))
+    table = hourly_table('2026-02-01', '2026-02-03')
+    store.upsert_month(CELL, table.slice(0, 2 * 24 + 10))
+
+    daily = store.daily_aggregates(CELL)
+    assert daily['date'].tolist() == [pd.Timestamp('2026-02-01'), pd.Timestamp('2026-02-02')]
+    first = table.slice(0, 24).to_pandas()
+    assert daily['temp_max'].iloc[0] == pytest.approx(first['temperature'].max(), abs=0.01)
+    assert store.daily_aggregates(CELL, '2026-03-01', '2026-03-31') is None
+
+
+def test_failed_month_is_refilled_by_the_next_ingest(tmp_path, monkeypatch):
+    store = HourlyStore(str(tmp_path))
+    collector = WeatherDataCollector()
+    cell = collector.cell_key('北京')
+    start, end = date(2026, 1, 1), date(2026, 4, 30)
+    real_http_get = data_collector.http_get
+
+    def failing_february(upstream, endpoint, url, params=None, **kwargs):
+        if endpoint == 'archive_hourly' and params['start_date'] == '2026-02-01':
+            raise requests.exceptions.ConnectionError('archive unavailable')
+        return real_http_get(upstream, endpoint, url, params=params, **kwargs)
+
+    monkeypatch.setattr(data_collector, 'http_get', failing_february)
+    collector.ingest_hourly('北京', start, end, store)
+    # 失败的月份之后不再写入，最后时间停在缺口之前
+    assert store.months(cell) == [(2026, 1)]
+    assert store.last_timestamp(cell) == pd.Timestamp('2026-01-31 23:00')
+
+    monkeypatch.setattr(data_collector, 'http_get', real_http_get)
+    resume = store.last_timestamp(cell).date() - timedelta(days=7)
+    collector.ingest_hourly('北京', resume, end, store)
+    assert store.months(cell) == [(2026, m) for m in range(1, 5)]
+    daily = store.daily_aggregates(cell)
+    assert daily['date'].tolist() == list(pd.date_range('2026-01-01', '2026-04-30'))
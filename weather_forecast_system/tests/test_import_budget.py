@@ -0,0 +1,41 @@
+"""
+启动导入耗时
+
+在干净的子进程中导入 api_server，检查导入耗时不超过预算（取多次运行的最小值），
+且 statsmodels / scikit-learn / matplotlib / seaborn 没有在导入阶段被加载。
+"""
+import json
+import os
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_BUDGET_SECONDS = float(os.environ.get('WEATHER_IMPORT_BUDGET', '1.0'))
+RUNS = 3
+
+DEFERRED_MODULES = ['statsmodels', 'sklearn', 'matplotlib', 'seaborn']
+
+_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import api_server
+elapsed = time.perf_counter() - start
+loaded = sorted({name.split('.')[0] for name in sys.modules} & set(%r))
+print(json.dumps({'seconds': elapsed, 'loaded': loaded}))
+''' % (DEFERRED_MODULES,)
+
+
+def probe():
+    """在子进程中导入一次 api_server，返回耗时与已加载的重量级模块"""
+    env = dict(os.environ, WEATHER_WARMUP='0')
+    output = subprocess.check_output([sys.executable, '-c', _PROBE], cwd=PROJECT_DIR, env=env)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def test_import_is_fast_and_defers_heavy_modules():
+    results = [probe() for _ in range(RUNS)]
+    best = min(r['seconds'] for r in results)
+    loaded = sorted(set().union(*(r['loaded'] for r in results)))
+    assert loaded == [], f'以下模块应延迟加载，但在导入阶段被加载: {", ".join(loaded)}'
+    assert best <= IMPORT_BUDGET_SECONDS, f'导入 api_server 用时 {best:.3f}s，超出预算 {IMPORT_BUDGET_SECONDS:.3f}s'
@@ -0,0 +1,72 @@
+"""模型仓库"""
+import numpy as np
+
+from src.model_registry import ARIMA, CLASSIFIER, ModelRegistry
+
+
+def model(value):
+    return {'weights': np.full(1000, value, dtype=np.float64)}
+
+
+def test_save_and_load_latest(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    assert registry.load('beijing', ARIMA) == (None, None)
+
+    first = registry.save('Beijing', ARIMA, model(1), meta={'last_date': '2026-01-01'})
+    second = registry.save('beijing', ARIMA, model(2))
+    assert registry.latest_version('beijing', ARIMA) == second
+    assert registry.versions('beijing', ARIMA) == [first, second]
+    assert registry.metadata('beijing', ARIMA, first)['last_date'] == '2026-01-01'
+    assert registry.load('beijing', CLASSIFIER) == (None, None)
+
+    # 新的仓库实例从磁盘加载（内存映射）
+    loaded, version = ModelRegistry(str(tmp_path)).load('beijing', ARIMA)
+    assert version == second
+    assert loaded['weights'][0] == 2
+    loaded['weights'][0] = 99  # 写时复制，不影响文件
+    assert ModelRegistry(str(tmp_path)).load('beijing', ARIMA)[0]['weights'][0] == 2
+
+
+def test_invalid_version_is_rejected(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    registry.save('beijing', ARIMA, model(1))
+    assert registry.load('beijing', ARIMA, '../../etc') == (None, None)
+    assert registry.metadata('beijing', ARIMA, '../../etc') is None
+
+
+def test_resident_models_are_lru_bounded(tmp_path):
+    registry = ModelRegistry(str(tmp_path), max_resident=2)
+    for city in ('a', 'b', 'c'):
+        registry.save(city, ARIMA, model(1))
+    assert registry.resident_count() == 2
+
+    # 被挤出的模型仍可从磁盘加载
+    loaded, _ = registry.load('a', ARIMA)
+    assert loaded is not None
+    assert registry.resident_count() == 2
+
+
+def test_prune_keeps_recent_and_pinned_versions(tmp_path):
+    registry = ModelRegistry(str(tmp_path), keep_versions=2)
+    pinned = registry.save('beijing', CLASSIFIER, model(0))
+    assert registry.pin('beijing', CLASSIFIER, pinned)
+    saved = [registry.save('beijing', CLASSIFIER, model(i)) for i in range(1, 5)]
+
+    assert registry.versions('beijing', CLASSIFIER) == [pinned] + saved[-2:]
+    assert registry.load('beijing', CLASSIFIER, pinned)[0] is not None
+
+    registry.unpin('beijing', CLASSIFIER, pinned)
+    registry.save('beijing', CLASSIFIER, model(5))
+    assert pinned not in registry.versions('beijing', CLASSIFIER)
+    assert not registry.pin('beijing', CLASSIFIER, pinned)
+
+
+def test_promote_restores_older_version(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    first = registry.save('beijing', ARIMA, model(1))
+    registry.save('beijing', ARIMA, model(2))
+
+    assert registry.promote('beijing', ARIMA, first)
+    assert registry.latest_version('beijing', ARIMA) == first
+    assert registry.load('beijing', ARIMA)[0]['weights'][0] == 1
+    assert not registry.promote('beijing', ARIMA, '20260101T000000000000-abcdef')
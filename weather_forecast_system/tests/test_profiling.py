@@ -0,0 +1,60 @@
+"""剖析会话的内存记录"""
+import threading
+import tracemalloc
+
+from src.profiling import ProfileSession, track_memory
+
+MB = 1024 * 1024
+
+
+def test_track_memory_records_peak_only_inside_session():
+    @track_memory('alloc')
+    def alloc():
+        block = bytearray(8 * MB)
+        return len(block)
+
+    assert alloc() == 8 * MB  # 没有会话时不记录
+    session = ProfileSession('cprofile', 'test').start()
+    alloc()
+    session.stop()
+    assert session.memory['alloc']['peak_bytes'] >= 8 * MB
+    assert session.memory['alloc']['retained_bytes'] < MB
+    assert not tracemalloc.is_tracing()
+
+
+def test_overlapping_sessions_keep_their_peaks():
+    inside_a, b_done = threading.Event(), threading.Event()
+    sessions = {}
+
+    def run_a():
+        session = ProfileSession('sample', 'a').start()
+
+        def work():
+            size = len(bytearray(16 * MB))  # 峰值出现后内存已释放
+            inside_a.set()
+            b_done.wait(10)  # B 在 A 测量期间开始、测量、结束，会重置进程级的峰值
+            return size
+
+        session.record_memory('a', work, (), {})
+        sessions['a'] = session
+        session.stop()
+
+    def run_b():
+        inside_a.wait(10)
+        session = ProfileSession('sample', 'b').start()
+        session.record_memory('b', lambda: len(bytearray(MB)), (), {})
+        session.stop()
+        sessions['b'] = session
+        # A 仍在测量，B 结束不能关闭 tracemalloc
+        assert tracemalloc.is_tracing()
+        b_done.set()
+
+    threads = [threading.Thread(target=run_a), threading.Thread(target=run_b)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sessions['a'].memory['a']['peak_bytes'] >= 16 * MB
+    assert sessions['b'].memory['b']['peak_bytes'] >= MB
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,110 @@
+"""上游限流与配额"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.rate_limit import (BATCH, INTERACTIVE, QuotaExceededError, TokenBucket, UpstreamLimiter,
+                            UpstreamThrottledError, check_baidu_response, check_open_meteo_response,
+                            current_priority, priority)
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+
+    def json(self):
+        if isinstance(self.payload, Exception):
+            raise self.payload
+        return self.payload
+
+
+def test_bucket_allows_burst_then_refills_at_rate():
+    bucket = TokenBucket(rate=20, burst=3)
+    assert all(bucket.acquire(timeout=0) for _ in range(3))
+    assert not bucket.acquire(timeout=0)
+
+    start = time.monotonic()
+    assert bucket.acquire(timeout=1)
+    assert time.monotonic() - start >= 0.03
+
+
+def test_interactive_waiters_go_before_batch():
+    bucket = TokenBucket(rate=10, burst=1)
+    assert bucket.acquire()
+    order = []
+
+    def take(level, label):
+        bucket.acquire(level)
+        order.append(label)
+
+    batch = threading.Thread(target=take, args=(BATCH, 'batch'))
+    batch.start()
+    time.sleep(0.02)
+    interactive = threading.Thread(target=take, args=(INTERACTIVE, 'interactive'))
+    interactive.start()
+    batch.join()
+    interactive.join()
+    assert order == ['interactive', 'batch']
+
+
+def test_priority_context_is_restored():
+    assert current_priority() == INTERACTIVE
+    with priority(BATCH):
+        assert current_priority() == BATCH
+    assert current_priority() == INTERACTIVE
+
+
+def test_daily_budget_rejects_after_limit():
+    limiter = UpstreamLimiter('test', rate=1000, burst=10, daily_limit=2)
+    limiter.acquire()
+    limiter.acquire()
+    with pytest.raises(QuotaExceededError) as info:
+        limiter.acquire()
+    assert info.value.retry_after > 0
+    assert limiter.usage()['used_today'] == 2
+
+
+def test_rate_limit_raises_after_max_wait():
+    limiter = UpstreamLimiter('test', rate=0.1, burst=1, daily_limit=0,
+                              max_wait={INTERACTIVE: 0.05, BATCH: 0.05})
+    limiter.acquire()
+    with pytest.raises(UpstreamThrottledError) as info:
+        limiter.acquire()
+    assert not isinstance(info.value, QuotaExceededError)
+
+
+def test_exhausted_until_blocks_then_clears():
+    limiter = UpstreamLimiter('test', rate=1000, burst=10, daily_limit=0)
+    limiter.mark_exhausted('daily quota exceeded', datetime.now() + timedelta(seconds=0.1))
+    with pytest.raises(QuotaExceededError):
+        limiter.acquire()
+    time.sleep(0.15)
+    limiter.acquire()
+    assert limiter.usage()['exhausted_until'] is None
+
+
+def test_baidu_quota_status_marks_limiter_exhausted():
+    limiter = UpstreamLimiter('baidu', rate=1000, burst=10, daily_limit=0)
+    check_baidu_response(limiter, FakeResponse({'status': 0}))
+    check_baidu_response(limiter, FakeResponse(ValueError('not json')))
+    with pytest.raises(QuotaExceededError):
+        check_baidu_response(limiter, FakeResponse({'status': 302}))
+    with pytest.raises(QuotaExceededError):
+        limiter.acquire()
+
+
+def test_open_meteo_429_reason_sets_reset_time():
+    limiter = UpstreamLimiter('open_meteo', rate=1000, burst=10, daily_limit=0)
+    check_open_meteo_response(limiter, FakeResponse({}, status_code=200))
+
+    with pytest.raises(QuotaExceededError) as info:
+        check_open_meteo_response(limiter, FakeResponse({'reason': 'Minutely API request limit exceeded'}, 429))
+    assert 0 < info.value.retry_after <= 60
+
+    with pytest.raises(QuotaExceededError) as info:
+        check_open_meteo_response(limiter, FakeResponse({'reason': 'Daily API request limit exceeded'}, 429))
+    midnight = datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
+    assert abs(info.value.retry_after - (midnight - datetime.now()).total_seconds()) < 5
@@ -0,0 +1,81 @@
+"""跟踪城市的定时刷新"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from src import refresh
+from src.model_registry import ARIMA, CLASSIFIER, get_registry
+
+CITY = '刷新测试市'
+
+
+def test_temperature_series_fills_missing_days():
+    frame = pd.DataFrame({
+        'date': pd.to_datetime(['2026-01-01', '2026-01-02', '2026-01-05']),
+        'temperature': np.array([1.0, 2.0, 5.0], dtype=np.float32),
+    })
+    series = refresh._temperature_series(frame)
+    assert series.index.freqstr == 'D'
+    assert series.tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+
+
+def test_refresh_stores_history_models_and_forecast():
+    refresher = refresh.CityRefresher()
+    key = refresh.city_key(CITY)
+    assert refresher.refresh(CITY)
+
+    state = refresh.city_state(CITY)
+    frame = state['historical_data']
+    today = pd.Timestamp(datetime.now().date())
+    assert frame['date'].iloc[-1] == today
+    assert frame['date'].is_monotonic_increasing and frame['date'].is_unique
+
+    history = refresh.stored_history(CITY, 30)
+    assert history['date'].iloc[0] == today - pd.Timedelta(days=30)
+    assert refresh.stored_history(CITY, 10 * 365) is None
+
+    forecast = refresh.stored_forecast(CITY)
+    assert len(forecast['official']) == refresh.FORECAST_DAYS
+    assert len(forecast['ai_temperature']) == refresh.FORECAST_DAYS
+    assert forecast['climatology_fallbacks'] == []
+    assert refresh.stored_climatology(CITY) is not None
+
+    registry = get_registry()
+    assert registry.load(key, CLASSIFIER)[0] is not None
+    temperatures, dates, version = refresh.arima_forecast(key)
+    assert len(temperatures) == refresh.FORECAST_DAYS
+    assert dates[0] == today + pd.Timedelta(days=1)
+    assert registry.metadata(key, ARIMA, version)['last_date'] == today.strftime('%Y-%m-%d')
+
+
+def test_new_observations_are_appended_to_arima_without_refit():
+    refresher = refresh.CityRefresher()
+    frame = refresh.city_state(CITY)['historical_data']
+    if frame is None:
+        refresher.refresh(CITY)
+        frame = refresh.city_state(CITY)['historical_data']
+    key = 'arima-append-test'
+    registry = get_registry()
+
+    refresher._update_arima(key, frame.iloc[:-2])
+    fitted = registry.metadata(key, ARIMA)
+    refresher._update_arima(key, frame)
+    appended = registry.metadata(key, ARIMA)
+
+    assert registry.versions(key, ARIMA)[-1] != registry.versions(key, ARIMA)[0]
+    assert appended['fitted_on'] == fitted['fitted_on']
+    assert appended['last_date'] == frame['date'].iloc[-1].strftime('%Y-%m-%d')
+    assert pd.Timestamp(fitted['last_date']) == frame['date'].iloc[-3]
+
+    # 没有新观测时不保存新版本
+    refresher._update_arima(key, frame)
+    assert len(registry.versions(key, ARIMA)) == 2
+
+
+def test_stale_forecast_is_not_served():
+    state = refresh.city_state(CITY)
+    forecast = dict(state['forecast'] or {})
+    forecast['generated_at'] = datetime.now() - timedelta(days=1)
+    state['forecast'] = forecast
+    assert refresh.stored_forecast(CITY) is None
@@ -0,0 +1,91 @@
+"""响应格式协商、序列化与压缩"""
+import gzip
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from flask import Flask, request
+
+from src.response_formats import (META_KEY, compress_response, frame_response, frame_to_arrow, frame_to_columns,
+                                  frame_to_parquet, frame_to_records, negotiate_format)
+
+app = Flask(__name__)
+
+
+def frame():
+    return pd.DataFrame({
+        'date': pd.date_range('2026-03-01', periods=3),
+        'temperature': np.array([1.1, np.nan, 3.3], dtype=np.float32),
+        'weather_type': pd.Categorical(['rain', 'sunny', 'rain']),
+    })
+
+
+def negotiate(path='/', **headers):
+    with app.test_request_context(path, headers=headers):
+        return negotiate_format(request)
+
+
+def test_negotiation():
+    assert negotiate() == 'records'
+    assert negotiate(Accept='*/*') == 'records'
+    assert negotiate('/?format=Arrow') == 'arrow'
+    assert negotiate('/?format=xml') is None
+    assert negotiate(Accept='application/vnd.apache.parquet') == 'parquet'
+    assert negotiate(Accept='application/vnd.weather.columnar+json') == 'columnar'
+
+
+def test_json_layouts():
+    columns = frame_to_columns(frame())
+    assert columns['date'] == ['2026-03-01', '2026-03-02', '2026-03-03']
+    # float32 按存储精度舍入，缺失值为 None
+    assert columns['temperature'] == [1.1, None, 3.3]
+    assert columns['weather_type'] == ['rain', 'sunny', 'rain']
+    records = frame_to_records(frame(), rename=str.upper)
+    assert records[0] == {'DATE': '2026-03-01', 'TEMPERATURE': 1.1, 'WEATHER_TYPE': 'rain'}
+
+
+def test_binary_formats_round_trip_with_meta():
+    meta = {'city': 'beijing', 'count': 3}
+    table = pa.ipc.open_stream(frame_to_arrow(frame(), meta)).read_all()
+    assert table.num_rows == 3
+    assert json.loads(table.schema.metadata[META_KEY]) == meta
+    table = pq.read_table(io.BytesIO(frame_to_parquet(frame(), meta)))
+    assert table.column('weather_type').to_pylist() == ['rain', 'sunny', 'rain']
+    assert json.loads(table.schema.metadata[META_KEY]) == meta
+
+
+def test_frame_response_mimetypes():
+    with app.test_request_context():
+        response = frame_response(frame(), 'columnar', {'count': 3}, 'data')
+        assert response.mimetype == 'application/vnd.weather.columnar+json'
+        assert response.get_json()['layout'] == 'columnar'
+        response = frame_response(frame(), 'records', {'count': 3}, 'data')
+        assert response.get_json()['data'][2]['temperature'] == 3.3
+
+
+def _accept(value):
+    with app.test_request_context(headers={'Accept-Encoding': value}):
+        return request.accept_encodings
+
+
+def test_gzip_compression_and_weak_etag():
+    with app.test_request_context():
+        big = frame_response(pd.concat([frame()] * 200), 'records', {}, 'data')
+        big.set_etag('v1-records')
+        raw = big.get_data()
+        compressed = compress_response(big, _accept('gzip'))
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.get_data()) == raw
+    assert compressed.get_etag() == ('v1-records', True)
+    assert 'Accept-Encoding' in compressed.vary
+
+
+def test_small_and_parquet_responses_are_not_compressed():
+    with app.test_request_context():
+        small = frame_response(frame(), 'records', {}, 'data')
+        assert 'Content-Encoding' not in compress_response(small, _accept('gzip')).headers
+        parquet = frame_response(pd.concat([frame()] * 200), 'parquet', {}, 'data')
+        assert 'Content-Encoding' not in compress_response(parquet, _accept('gzip')).headers
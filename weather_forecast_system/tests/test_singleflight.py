@@ -0,0 +1,67 @@
+"""请求合并"""
+import threading
+import time
+
+import pytest
+
+from src.singleflight import SingleFlight
+
+
+def run_concurrently(n, target):
+    threads = [threading.Thread(target=target) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_calls_with_same_key_execute_once():
+    group = SingleFlight('test')
+    calls = []
+    results = []
+
+    def slow(value):
+        calls.append(value)
+        time.sleep(0.2)
+        return value * 2
+
+    run_concurrently(8, lambda: results.append(group.do('beijing', slow, 21)))
+
+    assert calls == [21]
+    assert [r for r, _ in results] == [42] * 8
+    assert sum(1 for _, shared in results if not shared) == 1
+
+
+def test_different_keys_execute_independently():
+    group = SingleFlight('test')
+    assert group.do('a', lambda: 1) == (1, False)
+    assert group.do('b', lambda: 2) == (2, False)
+    # 上一次调用结束后不再合并
+    assert group.do('a', lambda: 3) == (3, False)
+
+
+def test_error_is_shared_with_followers():
+    group = SingleFlight('test')
+    started = threading.Event()
+    errors = []
+
+    def failing():
+        started.set()
+        time.sleep(0.2)
+        raise ValueError('upstream down')
+
+    def call():
+        try:
+            group.do('beijing', failing)
+        except ValueError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    run_concurrently(3, call)
+    leader.join()
+
+    assert errors == ['upstream down'] * 4
+    with pytest.raises(ValueError):
+        group.do('beijing', failing)
@@ -0,0 +1,68 @@
+"""预报检验"""
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from src import skill_store
+from src.skill_store import AI, OFFICIAL, SkillStore
+
+
+def observed(dates, temperatures, weather_types):
+    return pd.DataFrame({'date': pd.to_datetime(dates), 'temperature': temperatures, 'weather_type': weather_types})
+
+
+def test_verification_accumulates_errors_per_lead(tmp_path):
+    store = SkillStore(str(tmp_path / 'skill.sqlite3'))
+    issued = date(2026, 3, 1)
+    assert store.log_forecast('Beijing', OFFICIAL, ['2026-03-02', '2026-03-03'], [10.0, 12.0], ['sunny', 'rain'],
+                              issued_on=issued) == 2
+    store.log_forecast('beijing', OFFICIAL, ['2026-03-03'], [11.0], ['sunny'], issued_on=date(2026, 3, 2))
+    assert store.pending_count('beijing') == 3
+
+    # 只有 3 月 2 日的观测到达
+    assert store.verify('beijing', observed(['2026-03-02'], [12.0], ['sunny'])) == 1
+    assert store.pending_count('beijing') == 2
+    assert store.verify('beijing', observed(['2026-03-02', '2026-03-03'], [12.0, 13.0], ['sunny', 'rain'])) == 2
+    assert store.pending_count() == 0
+
+    lead1, lead2 = store.skill('beijing', OFFICIAL)
+    assert (lead1['lead_days'], lead1['samples']) == (1, 2)
+    assert lead1['bias'] == pytest.approx(-2.0)  # (10-12 + 11-13) / 2
+    assert lead1['mae'] == pytest.approx(2.0)
+    assert lead1['weather_accuracy'] == pytest.approx(0.5)
+    assert (lead2['lead_days'], lead2['rmse'], lead2['weather_accuracy']) == (2, 1.0, 1.0)
+
+
+def test_repeated_forecast_on_same_day_replaces_previous(tmp_path):
+    store = SkillStore(str(tmp_path / 'skill.sqlite3'))
+    issued = date(2026, 3, 1)
+    store.log_forecast('beijing', AI, ['2026-03-02'], [5.0], issued_on=issued)
+    store.log_forecast('beijing', AI, ['2026-03-02'], [8.0], issued_on=issued)
+    store.verify('beijing', observed(['2026-03-02'], [8.0], [None]))
+    (row,) = store.skill('beijing', AI)
+    assert (row['samples'], row['mae'], row['weather_samples']) == (1, 0.0, 0)
+
+
+def test_past_and_empty_predictions_are_not_logged(tmp_path):
+    store = SkillStore(str(tmp_path / 'skill.sqlite3'))
+    assert store.log_forecast('beijing', AI, ['2026-02-28', '2026-03-02', '2026-03-03'],
+                              [1.0, float('nan'), None], [None, None, None], issued_on=date(2026, 3, 1)) == 0
+    assert store.pending_count() == 0
+
+
+def test_ai_temperature_is_logged_without_official_forecast(tmp_path, monkeypatch):
+    store = SkillStore(str(tmp_path / 'skill.sqlite3'))
+    monkeypatch.setattr(skill_store, '_store', store)
+    dates = pd.date_range(pd.Timestamp(date.today()) + pd.Timedelta(days=1), periods=3)
+
+    skill_store.log_forecasts('beijing', None, [1.0, 2.0, 3.0], None, dates)
+    assert store.pending_count('beijing') == 3
+
+    official = pd.DataFrame({'date': dates, 'temperature': [1.5, 2.5, 3.5], 'weather_type': ['sunny'] * 3})
+    skill_store.log_forecasts('beijing', official, [1.0, 2.0, 3.0], ['rain'] * 3, dates)
+    assert store.pending_count('beijing') == 6
+    store.verify('beijing', observed(dates, [1.0, 2.0, 3.0], ['rain'] * 3))
+    ai = store.skill('beijing', AI)
+    assert [row['weather_accuracy'] for row in ai] == [1.0] * 3
+    assert [row['mae'] for row in store.skill('beijing', OFFICIAL)] == [0.5] * 3
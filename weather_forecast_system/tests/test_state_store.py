@@ -0,0 +1,82 @@
+"""跨进程共享状态"""
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.state_store import SharedState
+
+_fork = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+
+
+def _append_entries(state_dir, worker, count):
+    state = SharedState(state_dir)
+    for i in range(count):
+        with state.locked():
+            entries = state.get('log') or []
+            state['log'] = entries + [(worker, i)]
+
+
+@pytest.mark.skipif(_fork is None, reason='需要 fork 启动方式')
+def test_locked_read_modify_write_across_processes(tmp_path):
+    workers = [_fork.Process(target=_append_entries, args=(str(tmp_path), w, 25)) for w in range(4)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(60)
+        assert p.exitcode == 0
+    assert len(SharedState(str(tmp_path))['log']) == 100
+
+
+def test_locked_is_reentrant(tmp_path):
+    state = SharedState(str(tmp_path))
+    with state.locked():
+        with state.locked():
+            state.update({'a': 1, 'b': 2})
+        state['c'] = 3
+    assert (state['a'], state['b'], state['c']) == (1, 2, 3)
+
+
+def test_defaults_and_missing_keys(tmp_path):
+    state = SharedState(str(tmp_path), defaults={'city': None})
+    assert state['city'] is None and 'city' in state
+    with pytest.raises(KeyError):
+        state['other']
+    state['city'] = 'wuhan'
+    assert SharedState(str(tmp_path))['city'] == 'wuhan'
+    del state['city']
+    assert state['city'] is None
+
+
+def test_frames_are_shared_as_read_only_arrow(tmp_path):
+    writer, reader = SharedState(str(tmp_path)), SharedState(str(tmp_path))
+    frame = pd.DataFrame({'date': pd.date_range('2026-01-01', periods=3), 'temperature': [1.0, 2.0, 3.0]})
+    writer['data'] = frame
+    loaded = reader['data']
+    pd.testing.assert_frame_equal(loaded, frame, check_dtype=False)
+    assert loaded is reader['data']  # 文件未变化时返回进程内缓存
+    writer['data'] = frame.assign(temperature=[4.0, 5.0, 6.0])
+    assert reader['data']['temperature'].tolist() == [4.0, 5.0, 6.0]
+    arrows = [name for name in os.listdir(tmp_path) if name.endswith('.arrow')]
+    assert len(arrows) == 2  # 保留当前与上一版本
+
+
+def test_reader_retries_when_frame_version_is_pruned(tmp_path):
+    writer, reader = SharedState(str(tmp_path)), SharedState(str(tmp_path))
+    writer['data'] = pd.DataFrame({'a': [1]})
+    original = reader._map_frame
+    calls = []
+
+    def racing(filename):
+        calls.append(filename)
+        if len(calls) == 1:
+            # 读取引用之后、映射之前另一个进程连续写入两次，引用的版本已被清理
+            writer['data'] = pd.DataFrame({'a': [2]})
+            writer['data'] = pd.DataFrame({'a': [3]})
+        return original(filename)
+
+    reader._map_frame = racing
+    assert reader['data']['a'].tolist() == [3]
+    assert np.unique(calls).size == 2
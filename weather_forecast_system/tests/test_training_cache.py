@@ -0,0 +1,43 @@
+"""训练结果缓存"""
+import os
+import time
+
+import pandas as pd
+
+from src.model_registry import ARIMA, get_registry
+from src.training_cache import TrainingCache, training_key, training_sources
+
+
+def test_sources_follow_the_feature_pipeline_imports():
+    sources = training_sources()
+    for name in ('weather_classifier.py', 'arima_model.py', 'data_collector.py', 'climatology.py', 'schema.py'):
+        assert name in sources
+    assert 'training_cache.py' not in sources
+    assert 'refresh.py' not in sources
+
+
+def test_key_depends_on_data_and_parameters():
+    data = pd.DataFrame({'date': pd.date_range('2026-01-01', periods=5), 'temperature': [1.0, 2, 3, 4, 5],
+                         'weather_type': ['sunny'] * 5, 'humidity': [50.0] * 5, 'unused': range(5)})
+    key = training_key(data, 'Beijing', ['humidity'], {'C': 1}, (1, 1, 1))
+    assert key == training_key(data.assign(unused=0), ' beijing ', ['humidity'], {'C': 1}, (1, 1, 1))
+    assert key != training_key(data.assign(humidity=51.0), 'beijing', ['humidity'], {'C': 1}, (1, 1, 1))
+    assert key != training_key(data, 'beijing', ['humidity'], {'C': 10}, (1, 1, 1))
+    assert key != training_key(data, 'beijing', ['humidity'], {'C': 1}, (2, 1, 1))
+
+
+def test_entries_pin_their_models_until_evicted(tmp_path):
+    registry = get_registry()
+    cell = 'training-cache-test'
+    version = registry.save(cell, ARIMA, {'order': (1, 1, 1)})
+    pinned = os.path.join(registry._kind_dir(cell, ARIMA), version, 'PINNED')
+    cache = TrainingCache(str(tmp_path), max_entries=1)
+
+    cache.put('first', {'cell': cell, 'model_results': {'model_versions': {ARIMA: version}}})
+    assert cache.get('first')['cell'] == cell
+    assert os.path.exists(pinned)
+
+    time.sleep(0.01)
+    cache.put('second', {'cell': cell, 'model_results': {'model_versions': {}}})
+    assert cache.get('first') is None
+    assert not os.path.exists(pinned)
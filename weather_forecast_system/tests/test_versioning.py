@@ -0,0 +1,106 @@
+"""历史数据版本与增量同步"""
+import numpy as np
+import pandas as pd
+
+from src.data_collector import build_features, weather_codes_to_types
+from src.versioning import VersionLog, changed_from, frame_version
+
+
+def raw_daily(days, start='2026-01-01'):
+    """上游归档接口形式的日数据"""
+    dates = pd.date_range(start, periods=days)
+    t = np.arange(days)
+    codes = np.where(t % 5 == 0, 61, np.where(t % 3 == 0, 3, 0))
+    return pd.DataFrame({
+        'date': dates,
+        'temperature': 10 + 8 * np.sin(t / 20),
+        'temp_max': 15 + 8 * np.sin(t / 20),
+        'temp_min': 5 + 8 * np.sin(t / 20),
+        'humidity': 60 + 10 * np.cos(t / 7),
+        'rainfall': np.where(codes == 61, 3.0, 0.0),
+        'rain_probability': np.where(codes == 61, 80.0, 10.0),
+        'wind_speed': 10 + t % 4,
+        'pressure': 1010 + t % 6,
+        'weather_code': codes,
+        'weather_type': weather_codes_to_types(codes),
+    })
+
+
+def window(raw, start, end):
+    """采集接口保存的数据：原始数据的一个窗口加上派生特征"""
+    return build_features(raw.iloc[start:end].reset_index(drop=True))
+
+
+def test_appending_one_day_gives_one_row_delta():
+    raw = raw_daily(101)
+    old, new = window(raw, 0, 100), window(raw, 0, 101)
+    changed = changed_from(old, new)
+    assert changed == raw['date'].iloc[100]
+    assert (new['date'] >= changed).sum() == 1
+
+
+def test_sliding_window_gives_one_row_delta():
+    # 按天数采集时窗口整体后移一天：首行移出窗口，滞后特征随之变化，但不算修改
+    raw = raw_daily(101)
+    old, new = window(raw, 0, 100), window(raw, 1, 101)
+    changed = changed_from(old, new)
+    assert changed == raw['date'].iloc[100]
+    assert (new['date'] >= changed).sum() == 1
+
+
+def test_revised_measurement_is_reported():
+    raw = raw_daily(100)
+    revised = raw.copy()
+    revised.loc[60, 'rainfall'] = 12.5
+    assert changed_from(window(raw, 0, 100), window(revised, 0, 100)) == raw['date'].iloc[60]
+
+
+def test_unchanged_data_keeps_version():
+    raw = raw_daily(100)
+    old, new = window(raw, 0, 100), window(raw, 0, 100)
+    assert frame_version(old) == frame_version(new)
+    assert changed_from(old, new) == raw['date'].iloc[-1] + pd.Timedelta(days=1)
+
+
+def test_version_log_delta_since_older_version():
+    raw = raw_daily(102)
+    frames = [window(raw, 0, 100), window(raw, 0, 101), window(raw, 1, 102)]
+    log = VersionLog()
+    log.record(frame_version(frames[0]), None)
+    for old, new in zip(frames, frames[1:]):
+        log.record(frame_version(new), changed_from(old, new))
+    first = log.entries[0][0]
+    assert log.changed_since(first) == raw['date'].iloc[100]
+    assert log.changed_since(log.current) is pd.NaT
+    assert log.changed_since('unknown') is None
+
+
+def test_derived_column_change_gives_new_version_and_full_delta():
+    # 特征流水线变化：原始字段相同，派生列不同，整个窗口都要重发
+    raw = raw_daily(100)
+    old = window(raw, 0, 100)
+    new = old.assign(temp_mean_7=old['temp_mean_7'] + 0.5)
+    assert frame_version(new) != frame_version(old)
+    assert changed_from(old, new) == raw['date'].iloc[0]
+
+    with_column = old.assign(temp_anomaly=0.0)
+    assert frame_version(with_column) != frame_version(old)
+    assert changed_from(old, with_column) == raw['date'].iloc[0]
+
+
+def test_history_delta_sync(client):
+    response = client.post('/api/collect-data', json={'city': 'beijing', 'days': 60})
+    assert response.status_code == 200
+    version = client.get('/api/history').get_json()['version']
+
+    response = client.get(f'/api/history?since={version}')
+    assert response.status_code == 304
+    response = client.get('/api/history', headers={'If-None-Match': f'"{version}-records"'})
+    assert response.status_code == 304
+
+    # 聚合后的周期会随窗口移动而变化，不支持增量
+    response = client.get('/api/history?since=0000000000000000&resolution=week')
+    assert response.status_code == 400
+    # 未知版本返回完整数据
+    body = client.get('/api/history?since=0000000000000000&limit=1000').get_json()
+    assert 'delta' not in body and body['count'] > 0
@@ -0,0 +1,74 @@
+"""天气分类器调参"""
+import numpy as np
+import pandas as pd
+
+from src.weather_classifier import PARAM_GRIDS, WeatherClassifier, time_series_folds
+
+
+def labelled_samples(n=200, seed=0):
+    """两个特征决定天气类型；第二个特征的量级随时间漂移，整体标准化会泄漏后期的均值"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)
+    X = pd.DataFrame({'humidity': rng.uniform(20, 95, n), 'pressure': rng.normal(1013, 8, n) + t * 0.5})
+    y = pd.Series(np.where(X['humidity'] > 70, 'rain', np.where(X['humidity'] > 45, 'cloudy', 'sunny')))
+    return X, y
+
+
+def test_folds_always_validate_on_later_samples():
+    folds = time_series_folds(100, 4)
+    assert len(folds) == 4
+    for train, test in folds:
+        assert train.max() < test.min()
+    assert time_series_folds(100, 4) is folds
+
+
+def test_tune_writes_unprefixed_best_params_back():
+    X, y = labelled_samples()
+    classifier = WeatherClassifier()
+    results = classifier.tune(X, y, n_splits=3, n_jobs=1)
+
+    assert set(results) == set(PARAM_GRIDS)
+    for name, result in results.items():
+        assert set(result['best_params']) == set(PARAM_GRIDS[name])
+        params = classifier.models[name].get_params()
+        for param, value in result['best_params'].items():
+            assert value in PARAM_GRIDS[name][param]
+            assert params[param] == value
+        assert 0 <= result['best_score'] <= 1
+
+
+def test_tune_scales_inside_each_fold(monkeypatch):
+    """标准化器只在各折的训练部分上拟合，不会看到验证折的数据"""
+    from sklearn.preprocessing import StandardScaler
+
+    X, y = labelled_samples()
+    fitted_sizes = []
+    original_fit = StandardScaler.fit
+
+    def recording_fit(self, data, *args, **kwargs):
+        fitted_sizes.append(len(data))
+        return original_fit(self, data, *args, **kwargs)
+
+    monkeypatch.setattr(StandardScaler, 'fit', recording_fit)
+    WeatherClassifier().tune(X, y, n_splits=3, n_jobs=1)
+
+    train_sizes = {len(train) for train, _ in time_series_folds(len(X), 3)}
+    assert fitted_sizes
+    assert len(X) not in fitted_sizes
+    assert max(fitted_sizes) <= max(train_sizes)
+
+
+def test_tune_skips_single_class():
+    X, _ = labelled_samples()
+    y = pd.Series(['sunny'] * len(X))
+    assert WeatherClassifier().tune(X, y, n_jobs=1) == {}
+
+
+def test_parallel_search_matches_serial_search():
+    X, y = labelled_samples()
+    serial = WeatherClassifier().tune(X, y, n_splits=3, n_jobs=1)
+    parallel = WeatherClassifier().tune(X, y, n_splits=3, n_jobs=2)
+    assert parallel == serial
+    # 逐次减半：后几轮只评估前一轮最好的候选，评估次数多于网格大小但远少于每轮全量评估
+    grid_size = len(PARAM_GRIDS['decision_tree']['max_depth']) * len(PARAM_GRIDS['decision_tree']['min_samples_leaf'])
+    assert grid_size < serial['decision_tree']['candidates'] < 2 * grid_size